@@ -5,23 +5,61 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
+from typing import Dict, Optional
+
 from flask import Flask
-from database import init_database, add_sample_data
+import database
+from database import init_database, add_sample_data, configure_pool, configure_book_cache, revalidate_book_cache
 from routes import register_blueprints
+from routes.fragments import DEFAULT_FRAGMENT_CACHE_SIZE, FragmentCache
+from routes.json_provider import RecordJSONProvider
 
 
-def create_app(testing: bool = False):
+def create_app(testing: bool = False, config: Optional[Dict] = None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        testing: Put the app in testing mode
+        config: Extra config values (e.g. DATABASE, DB_POOL_SIZE, DB_PRAGMA_PROFILE, BOOK_CACHE_SIZE) applied last
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
-    app.config.update(TESTING=testing)
+    # Book and Loan records from the database serialize as JSON objects
+    app.json = RecordJSONProvider(app)
+    app.config.update(
+        TESTING=testing,
+        DATABASE=os.environ.get('LIBRARY_DATABASE', database.DATABASE),
+        DB_POOL_SIZE=database.DEFAULT_POOL_SIZE,
+        DB_POOL_MAX_IDLE_SECONDS=database.DEFAULT_POOL_MAX_IDLE_SECONDS,
+        BOOK_CACHE_SIZE=database.DEFAULT_BOOK_CACHE_SIZE,  # 0 turns the in-process book cache off
+        BOOK_CACHE_MAX_STALENESS=database.DEFAULT_BOOK_CACHE_MAX_STALENESS,
+        CATALOG_ROW_CACHE_SIZE=DEFAULT_FRAGMENT_CACHE_SIZE,  # rendered catalog rows kept; 0 turns it off
+        # Part of every ETag; unset = a digest of the source files (see routes.conditional.app_version)
+        APP_VERSION=os.environ.get('LIBRARY_APP_VERSION'),
+        # Per-environment SQLite tuning, see database.PRAGMA_PROFILES
+        DB_PRAGMA_PROFILE=os.environ.get('LIBRARY_DB_PRAGMA_PROFILE', database.DEFAULT_PRAGMA_PROFILE),
+    )
+    if config:
+        app.config.update(config)
+    
+    # Point the shared connection pool at the configured database
+    configure_pool(
+        app.config['DATABASE'],
+        max_size=app.config['DB_POOL_SIZE'],
+        max_idle_seconds=app.config['DB_POOL_MAX_IDLE_SECONDS'],
+        pragma_profile=app.config['DB_PRAGMA_PROFILE'],
+    )
+    configure_book_cache(app.config['BOOK_CACHE_SIZE'], app.config['BOOK_CACHE_MAX_STALENESS'])
+    # Rendered catalog rows, shared by every request to this app (see routes.catalog_routes.row_renderer)
+    if app.config['CATALOG_ROW_CACHE_SIZE']:
+        app.extensions['catalog_row_fragments'] = FragmentCache(app.config['CATALOG_ROW_CACHE_SIZE'])
     
-    # Initialize the database
+    # Create or upgrade the schema; a no-op when the database is already current
     init_database()
     
     # Add sample data for testing and demonstration
@@ -30,10 +68,13 @@ def create_app(testing: bool = False):
     # Register all route blueprints
     register_blueprints(app)
     
+    # Drop cached books another worker process has changed since the last request
+    app.before_request(revalidate_book_cache)
+    
     return app
 
 
-app = create_app()
-
+# No module-level app: importing this module must not touch the database.
+# `flask run` finds create_app() on its own; production serves wsgi:app.
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
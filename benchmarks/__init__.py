@@ -0,0 +1,6 @@
+"""
+Benchmark scripts for the Library Management System.
+
+Run them from the repository root, e.g. ``python -m benchmarks.bench_borrow_indexes``.
+They build their own throwaway databases and never touch library.db.
+"""
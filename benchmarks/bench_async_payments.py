@@ -0,0 +1,67 @@
+"""
+Concurrent late fee collection against a local fake gateway.
+
+Every patron has one overdue loan. collect_late_fees() charges them all through
+AsyncPaymentGateway with its simulated 0.5s latency and no network, and the
+elapsed time is compared with the sequential cost (one latency per payment) and
+the ideal (ceil(patrons / concurrency) latencies).
+
+    python -m benchmarks.bench_async_payments --patrons 2000 --concurrency 100 500 2000
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from services.library_service import collect_late_fees
+from services.payment_service import AsyncPaymentGateway
+
+def fill(path: str, patrons: int) -> list:
+    now = datetime.now()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        'INSERT INTO books (id, title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, 1, 0)',
+        ((i + 1, f'Book {i}', 'Author', f'{9780000000000 + i}') for i in range(patrons)),
+    )
+    conn.executemany(
+        'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+        ((f'{100000 + i}', i + 1, (now - timedelta(days=24)).isoformat(),
+          (now - timedelta(days=10)).isoformat()) for i in range(patrons)),
+    )
+    conn.commit()
+    conn.close()
+    return [(f'{100000 + i}', i + 1) for i in range(patrons)]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patrons', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[100, 500, 2000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        database.configure_pool(path)
+        database.init_database()
+        charges = fill(path, args.patrons)
+        gateway = AsyncPaymentGateway()
+        latency = gateway.payment_latency
+
+        print(f'{args.patrons:,} payments at {latency}s each: {args.patrons * latency:,.0f}s sequential')
+        print(f'{"concurrency":>12}{"elapsed s":>11}{"ideal s":>9}{"collected":>11}')
+        for concurrency in args.concurrency:
+            started = time.perf_counter()
+            results = asyncio.run(collect_late_fees(charges, gateway, concurrency))
+            elapsed = time.perf_counter() - started
+            ideal = math.ceil(args.patrons / concurrency) * latency
+            collected = sum(r['success'] for r in results)
+            print(f'{concurrency:>12,}{elapsed:>11.2f}{ideal:>9.1f}{collected:>11,}')
+        database.get_pool().close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Request throughput with and without the in-process book cache.
+
+Builds the app on a throwaway catalog and drives it through Flask's test
+client, once with BOOK_CACHE_SIZE=0 (every lookup goes to SQLite) and once
+with the cache on. The workload is ISBN searches over a hot set of books,
+substring title searches (which load the whole catalog) and fee payments
+(which look the book up), with a borrow every --write-every requests to
+invalidate entries the way real traffic does.
+
+    python -m benchmarks.bench_book_cache --books 10000 --requests 5000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import database
+from app import create_app
+from services.library_service import search_books_in_catalog
+
+def fill_catalog(size: int) -> None:
+    conn = database.get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Volume {i}', f'Author {i % 100}', f'{9780000000000 + i}', 1_000_000, 1_000_000) for i in range(size)),
+    )
+    conn.commit()
+    conn.close()
+
+def run(client, requests: int, books: int, hot: int, write_every: int, rng: random.Random) -> dict:
+    timings = {'isbn search': [], 'book lookup': [], 'title scan': [], 'borrow': []}
+    for i in range(requests):
+        isbn = f'{9780000000000 + rng.randrange(hot)}'
+        if write_every and i % write_every == 0:
+            kind = 'borrow'
+            started = time.perf_counter()
+            client.post('/borrow', data={'patron_id': f'{rng.randrange(10**6):06d}',
+                                         'book_id': rng.randrange(hot) + 1})
+        elif i % 50 == 1:
+            kind = 'title scan'
+            started = time.perf_counter()
+            search_books_in_catalog(f'Volume {rng.randrange(books)}', 'title', mode='substring')
+        elif i % 2:
+            kind = 'isbn search'
+            started = time.perf_counter()
+            client.get(f'/api/search?q={isbn}&type=isbn')
+        else:
+            kind = 'book lookup'
+            started = time.perf_counter()
+            client.get(f'/api/late_fee/123456/{rng.randrange(hot) + 1}')
+        timings[kind].append(time.perf_counter() - started)
+    return timings
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=10_000)
+    parser.add_argument('--hot', type=int, default=1000, help='books that get looked up')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--write-every', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"cache":>8}{"requests/s":>12}' + ''.join(f'{k + " ms":>16}' for k in
+                                                      ('isbn search', 'book lookup', 'title scan', 'borrow'))
+          + f'{"hit rate":>10}')
+    for cache_size in (0, database.DEFAULT_BOOK_CACHE_SIZE):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            database.configure_pool(path)
+            database.init_database()
+            fill_catalog(args.books)
+            app = create_app(config={'DATABASE': path, 'BOOK_CACHE_SIZE': cache_size})
+            client = app.test_client()
+
+            started = time.perf_counter()
+            timings = run(client, args.requests, args.books, args.hot, args.write_every, random.Random(1))
+            elapsed = time.perf_counter() - started
+            stats = database.get_book_cache_stats()
+            means = ''.join(f'{sum(t) / len(t) * 1000 if t else 0:>16.3f}' for t in timings.values())
+            print(f'{cache_size or "off":>8}{args.requests / elapsed:>12.0f}{means}{stats["hit_rate"]:>10.0%}')
+            database.get_pool().close()
+    database.configure_book_cache()
+
+if __name__ == '__main__':
+    main()
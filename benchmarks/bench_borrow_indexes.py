@@ -0,0 +1,131 @@
+"""
+Query cost of the hot borrow_records lookups before and after migration 1.
+
+Builds a throwaway database with --loans rows (1M by default), times the
+active-loan queries used by the service layer on the bare table, applies the
+migrations and times them again.
+
+    python -m benchmarks.bench_borrow_indexes --loans 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from migrations import apply_migrations
+
+QUERIES = {
+    'get_patron_borrow_count': (
+        'SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL',
+        lambda patron, book: (patron,),
+    ),
+    'get_active_loan': (
+        'SELECT * FROM borrow_records WHERE patron_id = ? AND book_id = ? AND return_date IS NULL',
+        lambda patron, book: (patron, book),
+    ),
+    'book_active_loans': (
+        'SELECT COUNT(*) FROM borrow_records WHERE book_id = ? AND return_date IS NULL',
+        lambda patron, book: (book,),
+    ),
+}
+
+def build_database(path: str, loans: int, patrons: int, books: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Title {i}', f'Author {i % 500}', f'{i:013d}', 5, 5) for i in range(1, books + 1)),
+    )
+
+    rng = random.Random(327)
+    start = datetime(2020, 1, 1)
+
+    def rows():
+        for _ in range(loans):
+            borrowed = start + timedelta(minutes=rng.randrange(3_000_000))
+            # Roughly 5% of loans are still open
+            returned = None if rng.random() < 0.05 else (borrowed + timedelta(days=rng.randrange(1, 30))).isoformat()
+            yield (f'{rng.randrange(patrons):06d}', rng.randrange(1, books + 1),
+                   borrowed.isoformat(), (borrowed + timedelta(days=14)).isoformat(), returned)
+
+    conn.executemany(
+        'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, ?)',
+        rows(),
+    )
+    conn.commit()
+    conn.close()
+
+def time_queries(conn: sqlite3.Connection, samples, repeat: int):
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        plan = ' / '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params(*samples[0])))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for patron, book in samples:
+                conn.execute(sql, params(patron, book)).fetchall()
+        elapsed = time.perf_counter() - started
+        results[name] = (elapsed / (repeat * len(samples)) * 1000, plan)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loans', type=int, default=1_000_000)
+    parser.add_argument('--patrons', type=int, default=50_000)
+    parser.add_argument('--books', type=int, default=20_000)
+    parser.add_argument('--samples', type=int, default=20, help='distinct lookups per query')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        print(f'Building {args.loans:,} loans ...')
+        build_database(path, args.loans, args.patrons, args.books)
+
+        rng = random.Random(1)
+        samples = [(f'{rng.randrange(args.patrons):06d}', rng.randrange(1, args.books + 1))
+                   for _ in range(args.samples)]
+
+        conn = sqlite3.connect(path)
+        before = time_queries(conn, samples, args.repeat)
+        started = time.perf_counter()
+        apply_migrations(conn)
+        conn.execute('ANALYZE')
+        migrate_seconds = time.perf_counter() - started
+        after = time_queries(conn, samples, args.repeat)
+        conn.close()
+
+    print(f'Migrations applied in {migrate_seconds:.2f}s\n')
+    print(f'{"query":<26}{"before ms":>12}{"after ms":>12}{"speedup":>10}')
+    for name in QUERIES:
+        b, a = before[name][0], after[name][0]
+        print(f'{name:<26}{b:>12.3f}{a:>12.3f}{b / a if a else float("inf"):>9.0f}x')
+    print()
+    for name in QUERIES:
+        print(f'{name}:\n  before: {before[name][1]}\n  after:  {after[name][1]}')
+
+if __name__ == '__main__':
+    main()
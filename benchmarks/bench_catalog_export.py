@@ -0,0 +1,96 @@
+"""
+Resident memory of the streaming catalog export at 1M books.
+
+Fills a throwaway books table, then streams /api/catalog/export through the
+Flask test client and reports peak RSS growth. With --materialize it also
+measures the old approach (get_all_books() then serialise) for comparison.
+Each measurement runs in a fresh subprocess so peaks do not mask each other.
+
+    python -m benchmarks.bench_catalog_export --books 1000000 --materialize
+"""
+
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+def fill(path: str, count: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Generated Title Number {i}', f'Author {i % 9973}', f'{i:013d}', 3, 3) for i in range(count)),
+    )
+    conn.commit()
+    conn.close()
+
+def measure(path: str, mode: str, export_format: str) -> None:
+    """Runs in the child process: print peak RSS growth (KiB), bytes and seconds as JSON."""
+    import database
+    from flask import Flask
+    from routes import register_blueprints
+
+    database.configure_pool(path)
+    app = Flask(__name__)
+    register_blueprints(app)
+    client = app.test_client()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    if mode == 'stream':
+        resp = client.get(f'/api/catalog/export?format={export_format}', buffered=False)
+        total = sum(len(chunk) for chunk in resp.response)
+        resp.close()
+    else:
+        books = database.get_all_books()
+        total = len(''.join(json.dumps(book.to_dict()) + '\n' for book in books))
+    elapsed = time.perf_counter() - started
+
+    growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(json.dumps({'rss_kib': growth, 'bytes': total, 'seconds': elapsed}))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1_000_000)
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--materialize', action='store_true', help='also measure get_all_books()')
+    parser.add_argument('--child', nargs=2, metavar=('PATH', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args.child[0], args.child[1], args.format)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'export.db')
+        print(f'Filling {args.books:,} books ...')
+        fill(path, args.books)
+
+        modes = ['stream'] + (['materialize'] if args.materialize else [])
+        print(f'{"mode":<14}{"output MB":>12}{"seconds":>10}{"peak RSS growth MB":>22}')
+        for mode in modes:
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_catalog_export', '--format', args.format,
+                 '--child', path, mode],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f'{mode:<14}{result["bytes"] / 1e6:>12.1f}{result["seconds"]:>10.2f}'
+                  f'{result["rss_kib"] / 1024:>22.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+catalog.html render time with and without the per-row fragment cache.
+
+Renders the catalog template over the whole catalog (not one page) so the
+row count is the variable: inline rows (cache off), a cold cache, a warm
+cache, and a warm cache after --changed percent of the books changed
+availability. The cache is sized to hold every row.
+
+    python -m benchmarks.bench_catalog_fragments --sizes 10000 100000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from flask import render_template
+
+import database
+from app import create_app
+from records import Book
+from routes.catalog_routes import row_renderer
+
+def fill_catalog(size: int) -> None:
+    conn = database.get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Book {i:07d}', f'Author {i % 100}', f'{9780000000000 + i}', 3, i % 4) for i in range(size)),
+    )
+    conn.commit()
+    conn.close()
+
+def render_ms(app, books, cached: bool) -> float:
+    with app.test_request_context('/catalog'):
+        started = time.perf_counter()
+        html = render_template('catalog.html', books=books, limit=len(books), next_cursor=None,
+                               prev_cursor=None, render_row=row_renderer() if cached else None)
+        elapsed = time.perf_counter() - started
+    assert html.count('<tr>') == len(books) + 1
+    return elapsed * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10_000, 100_000])
+    parser.add_argument('--changed', type=float, default=1.0, help='percent of rows changed before the last run')
+    args = parser.parse_args()
+
+    print(f'{"books":>9}{"inline ms":>12}{"cold ms":>10}{"warm ms":>10}{"changed ms":>12}')
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            database.configure_pool(path)
+            database.init_database()
+            fill_catalog(size)
+            app = create_app(config={'DATABASE': path, 'CATALOG_ROW_CACHE_SIZE': size + 100})
+            books = database.get_all_books()
+
+            inline = render_ms(app, books, cached=False)
+            cold = render_ms(app, books, cached=True)
+            warm = render_ms(app, books, cached=True)
+            rng = random.Random(size)
+            for i in rng.sample(range(size), int(size * args.changed / 100)):
+                books[i] = Book(**dict(books[i], available_copies=(books[i].available_copies + 1) % 4))
+            changed = render_ms(app, books, cached=True)
+            print(f'{size:>9,}{inline:>12.0f}{cold:>10.0f}{warm:>10.0f}{changed:>12.0f}')
+            database.get_pool().close()
+
+if __name__ == '__main__':
+    main()
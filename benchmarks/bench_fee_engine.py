@@ -0,0 +1,72 @@
+"""
+Library-wide late fee run throughput.
+
+Compares the vectorized fee engine against calling compute_late_fee() once per
+open loan, over synthetic loan sets with a spread of due dates. Both paths
+read the same rows from SQLite; "fetch s" is that shared read on its own, so the
+compute-only speedup is (scalar - fetch) / (engine - fetch).
+
+    python -m benchmarks.bench_fee_engine --loans 10000 100000 1000000 --patrons 50000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import database
+from services.fee_engine import compute_patron_fee_totals
+from services.library_service import compute_late_fee
+
+def fill(path: str, loans: int, patrons: int) -> None:
+    now = datetime.now()
+    conn = sqlite3.connect(path)
+    conn.execute('DELETE FROM borrow_records')
+    conn.executemany(
+        'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+        ((f'{100000 + i % patrons}', i % 1000 + 1,
+          (now - timedelta(days=i % 60 + 14)).isoformat(),
+          (now - timedelta(days=i % 60 - 20)).isoformat()) for i in range(loans)),
+    )
+    conn.commit()
+    conn.close()
+
+def scalar_run(as_of: datetime) -> float:
+    totals = defaultdict(float)
+    for patron_id, _, due_day in database.get_active_loan_due_dates():
+        fee = compute_late_fee(datetime.fromisoformat(due_day), as_of)['fee_amount']
+        if fee:
+            totals[patron_id] += fee
+    return sum(totals.values())
+
+def timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loans', type=int, nargs='*', default=[10000, 100000, 1000000])
+    parser.add_argument('--patrons', type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        database.configure_pool(path)
+        database.init_database()
+        as_of = datetime.now()
+
+        print(f'{"loans":>10}{"fetch s":>10}{"scalar s":>10}{"engine s":>10}{"loans/s":>14}{"speedup":>9}')
+        for loans in args.loans:
+            fill(path, loans, args.patrons)
+            fetch = timed(database.get_active_loan_due_dates)
+            scalar = timed(lambda: scalar_run(as_of))
+            engine = timed(lambda: compute_patron_fee_totals(as_of))
+            print(f'{loans:>10,}{fetch:>10.2f}{scalar:>10.2f}{engine:>10.2f}{loans / engine:>14,.0f}{scalar / engine:>8.1f}x')
+        database.get_pool().close()
+
+if __name__ == '__main__':
+    main()
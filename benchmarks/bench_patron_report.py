@@ -0,0 +1,77 @@
+"""
+Patron status report latency for patrons with long borrowing histories.
+
+Compares the single-query get_patron_status_report() against the previous
+approach (get_patron_borrowed_books, then calculate_late_fee_for_book per loan,
+then get_patron_borrow_count), for patrons with growing numbers of loans.
+
+    python -m benchmarks.bench_patron_report --histories 100 1000 10000 --active 5 25
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from services.library_service import calculate_late_fee_for_book, get_patron_status_report
+
+def legacy_report(patron_id: str) -> float:
+    current = database.get_patron_borrowed_books(patron_id)
+    total = sum(calculate_late_fee_for_book(patron_id, b['book_id'])['fee_amount'] for b in current)
+    database.get_patron_borrow_count(patron_id)
+    return total
+
+def fill(patron_id: str, history: int, active: int) -> None:
+    now = datetime.now()
+    conn = database.get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'{patron_id} book {i}', 'Author', f'{patron_id}{i:07d}', 1, 1) for i in range(history + active)),
+    )
+    first_id = conn.execute('SELECT MIN(id) FROM books WHERE isbn LIKE ?', (f'{patron_id}%',)).fetchone()[0]
+    rows = []
+    for i in range(history + active):
+        borrowed = now - timedelta(days=30 + (history + active - i))
+        returned = (borrowed + timedelta(days=10)).isoformat() if i < history else None
+        rows.append((patron_id, first_id + i, borrowed.isoformat(),
+                     (borrowed + timedelta(days=14)).isoformat(), returned))
+    conn.executemany(
+        'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, ?)',
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--histories', type=int, nargs='*', default=[100, 1000, 10000])
+    parser.add_argument('--active', type=int, nargs='*', default=[5, 25])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure_pool(os.path.join(tmp, 'bench.db'))
+        database.init_database()
+
+        print(f'{"returned":>10}{"active":>8}{"legacy ms":>12}{"report ms":>12}')
+        patron = 100000
+        for history in args.histories:
+            for active in args.active:
+                patron += 1
+                patron_id = str(patron)
+                fill(patron_id, history, active)
+                legacy = timed(lambda: legacy_report(patron_id), args.repeat)
+                report = timed(lambda: get_patron_status_report(patron_id), args.repeat)
+                print(f'{history:>10,}{active:>8}{legacy:>12.2f}{report:>12.2f}')
+        database.get_pool().close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Reconciliation cost with the payment verification cache.
+
+Each simulated day re-verifies every transaction seen so far plus the day's
+new ones against PaymentGateway's simulated 0.3s status check. Without the
+cache every check is a gateway call made one at a time; with PaymentVerifier
+only the new transactions reach the gateway, concurrently.
+
+    python -m benchmarks.bench_payment_verification --days 5 --per-day 200 --concurrency 32
+"""
+
+import argparse
+import time
+
+from services.payment_service import PaymentGateway
+from services.payment_verification import PaymentVerifier
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--per-day', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    gateway = PaymentGateway()
+    verifier = PaymentVerifier(gateway, max_concurrency=args.concurrency)
+    transactions = []
+
+    print(f'{"day":>4}{"checked":>9}{"serial est s":>14}{"cached s":>10}{"gateway calls":>15}{"hit rate":>10}')
+    for day in range(1, args.days + 1):
+        transactions += [f'txn_{day:03d}{i:03d}_{day}' for i in range(args.per_day)]
+        calls_before = verifier.stats()['gateway_calls']
+
+        started = time.perf_counter()
+        verifier.verify_many(transactions)
+        cached = time.perf_counter() - started
+
+        stats = verifier.stats()
+        # One sequential gateway call per transaction, the old way
+        uncached = len(transactions) * 0.3
+        print(f'{day:>4}{len(transactions):>9,}{uncached:>14.1f}{cached:>10.2f}'
+              f'{stats["gateway_calls"] - calls_before:>15,}{stats["hit_rate"]:>10.1%}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Read/write concurrency of each PRAGMA profile in database.PRAGMA_PROFILES.
+
+For every profile, reader threads look up random books while writer threads
+run borrow-shaped transactions (insert a loan, decrement availability) against
+the same throwaway database for a fixed time.
+
+    python -m benchmarks.bench_pragma_profiles --readers 8 --writers 2 --seconds 5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import PRAGMA_PROFILES, ConnectionPool
+from migrations import apply_migrations
+
+BOOKS = 5_000
+
+def build_database(pool: ConnectionPool) -> None:
+    conn = pool.acquire()
+    conn.execute('''
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Title {i}', f'Author {i}', f'{i:013d}', 1_000_000, 1_000_000) for i in range(1, BOOKS + 1)),
+    )
+    conn.commit()
+    apply_migrations(conn)
+    conn.close()
+
+def reader(pool, stop, latencies):
+    rng = random.Random()
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn = pool.acquire()
+        conn.execute('SELECT * FROM books WHERE id = ?', (rng.randrange(1, BOOKS + 1),)).fetchone()
+        conn.close()
+        latencies.append(time.perf_counter() - started)
+
+def writer(pool, stop, counts):
+    rng = random.Random()
+    while not stop.is_set():
+        book_id = rng.randrange(1, BOOKS + 1)
+        now = datetime.now()
+        conn = pool.acquire()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(
+            'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+            (f'{rng.randrange(1_000_000):06d}', book_id, now.isoformat(), (now + timedelta(days=14)).isoformat()),
+        )
+        conn.execute('UPDATE books SET available_copies = available_copies - 1 WHERE id = ?', (book_id,))
+        conn.commit()
+        conn.close()
+        counts.append(1)
+
+def run_profile(profile: str, readers: int, writers: int, seconds: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, 'bench.db'), max_size=readers + writers,
+                              pragma_profile=profile)
+        build_database(pool)
+
+        stop = threading.Event()
+        latencies, writes = [], []
+        threads = [threading.Thread(target=reader, args=(pool, stop, latencies)) for _ in range(readers)]
+        threads += [threading.Thread(target=writer, args=(pool, stop, writes)) for _ in range(writers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        pool.close()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    return len(latencies) / seconds, len(writes) / seconds, statistics.median(latencies or [0.0]), p99
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--profiles', nargs='*', default=list(PRAGMA_PROFILES))
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile\n')
+    print(f'{"profile":<10}{"reads/s":>12}{"writes/s":>12}{"read p50 ms":>14}{"read p99 ms":>14}')
+    for profile in args.profiles:
+        reads, writes, p50, p99 = run_profile(profile, args.readers, args.writers, args.seconds)
+        print(f'{profile:<10}{reads:>12,.0f}{writes:>12,.0f}{p50 * 1000:>14.3f}{p99 * 1000:>14.3f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Memory and build time per row of Book / Loan records against the row dicts
+the read helpers used to return.
+
+Fills a throwaway database with --rows books and as many open loans, reads
+them all back each way and reports the bytes allocated per row (tracemalloc,
+strings included) and the time to build the list. "dict" is the old shape:
+dict(row) per book, and per loan a dict with its dates parsed up front.
+
+    python -m benchmarks.bench_record_memory --rows 100000
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import database
+from database import BOOK_SELECT, LOAN_SELECT, Book, Loan
+
+BOOKS_SQL = f'SELECT {BOOK_SELECT} FROM books ORDER BY title'
+LOANS_SQL = f'''
+    SELECT {LOAN_SELECT}
+    FROM borrow_records br JOIN books b ON br.book_id = b.id
+    WHERE br.return_date IS NULL
+'''
+
+def fill(size: int) -> None:
+    conn = database.get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Great Book {i}', f'Author {i % 100}', f'{9780000000000 + i}', 3, 2) for i in range(size)),
+    )
+    borrowed = datetime(2026, 1, 1, 9, 30)
+    conn.executemany(
+        'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+        ((f'{i % 10**6:06d}', i + 1, (borrowed + timedelta(minutes=i)).isoformat(),
+          (borrowed + timedelta(days=14, minutes=i)).isoformat()) for i in range(size)),
+    )
+    conn.commit()
+    conn.close()
+
+def book_dicts(conn):
+    return [dict(row) for row in conn.execute(BOOKS_SQL)]
+
+def book_rows(conn):
+    return conn.execute(BOOKS_SQL).fetchall()
+
+def book_records(conn):
+    cursor = conn.execute(BOOKS_SQL)
+    cursor.row_factory = Book.from_row
+    return cursor.fetchall()
+
+def loan_dicts(conn):
+    loans = []
+    for row in conn.execute(LOANS_SQL):
+        due_date = datetime.fromisoformat(row['due_date'])
+        loans.append({'book_id': row['book_id'], 'title': row['title'], 'author': row['author'],
+                      'borrow_date': datetime.fromisoformat(row['borrow_date']), 'due_date': due_date,
+                      'is_overdue': datetime.now() > due_date})
+    return loans
+
+def loan_records(conn):
+    cursor = conn.execute(LOANS_SQL)
+    cursor.row_factory = Loan.from_row
+    return cursor.fetchall()
+
+CASES = (
+    ('books', 'dict', book_dicts),
+    ('books', 'sqlite3.Row', book_rows),
+    ('books', 'Book', book_records),
+    ('loans', 'dict', loan_dicts),
+    ('loans', 'Loan', loan_records),
+)
+
+def measure(conn, build):
+    """(bytes per row, build ms) for one way of reading the rows."""
+    gc.collect()
+    tracemalloc.start()
+    rows = build(conn)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(rows)
+    del rows
+
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        build(conn)
+        best = min(best, time.perf_counter() - started)
+    return allocated / count, best * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure_pool(os.path.join(tmp, 'bench.db'))
+        database.init_database()
+        fill(args.rows)
+        conn = database.get_db_connection()
+
+        print(f'{"table":>6}{"as":>13}{"bytes/row":>11}{"build ms":>10}')
+        for table, kind, build in CASES:
+            per_row, ms = measure(conn, build)
+            print(f'{table:>6}{kind:>13}{per_row:>11.0f}{ms:>10.0f}')
+        conn.close()
+        database.get_pool().close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Title/author search latency: full-text index vs. the substring scan.
+
+For each catalog size, fills a throwaway database with generated books, then
+times search_books_in_catalog() in 'substring' mode (load every book, scan in
+Python) and 'fulltext' mode (books_fts trigram index).
+
+    python -m benchmarks.bench_search --sizes 100000 1000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import database
+from services.library_service import search_books_in_catalog
+
+WORDS = ('great shadow river garden winter silent empire glass mountain letter '
+         'night ocean crown secret paper storm island forest golden hidden').split()
+SURNAMES = ('Smith Okafor Tanaka Novak Silva Haddad Larsen Moreau Kowalski Chen '
+            'Ivanova Murphy Rossi Fischer Dubois Singh Hughes Costa Berg Park').split()
+TERMS = [('great', 'title'), ('garden of', 'title'), ('xyzzy', 'title'), ('tanaka', 'author'), ('ova', 'author')]
+
+def fill_catalog(size: int) -> None:
+    rng = random.Random(size)
+    conn = database.get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title() + ' of ' + rng.choice(WORDS),
+          f'{rng.choice(SURNAMES)[0]}. {rng.choice(SURNAMES)}', f'{i:013d}', 2, 2)
+         for i in range(size)),
+    )
+    conn.commit()
+    conn.close()
+
+def time_search(term: str, field: str, mode: str, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = search_books_in_catalog(term, field, mode=mode)
+    return (time.perf_counter() - started) / repeat * 1000, len(results)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='*', default=[100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.configure_pool(os.path.join(tmp, 'bench.db'))
+            database.init_database()
+            started = time.perf_counter()
+            fill_catalog(size)
+            print(f'\n{size:,} books (loaded and indexed in {time.perf_counter() - started:.1f}s)')
+            print(f'{"term":<14}{"field":<8}{"matches":>10}{"substring ms":>15}{"fulltext ms":>14}')
+            for term, field in TERMS:
+                scan_ms, scan_count = time_search(term, field, 'substring', args.repeat)
+                fts_ms, fts_count = time_search(term, field, 'fulltext', args.repeat)
+                assert scan_count == fts_count, (term, scan_count, fts_count)
+                print(f'{term:<14}{field:<8}{fts_count:>10,}{scan_ms:>15.1f}{fts_ms:>14.1f}')
+            database.get_pool().close()
+
+if __name__ == '__main__':
+    main()
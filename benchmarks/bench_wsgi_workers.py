@@ -0,0 +1,157 @@
+"""
+HTTP throughput of the gunicorn deployment as the worker count changes.
+
+For each worker count, starts `gunicorn -c gunicorn.conf.py wsgi:app` on a
+throwaway database of generated books, then drives /catalog, /api/search and
+/borrow in turn from several client processes over keep-alive connections and
+reports requests per second and latency percentiles. Borrow requests use
+random patron IDs against books with plenty of copies, so each one commits a
+loan.
+
+    python -m benchmarks.bench_wsgi_workers --workers 1 2 4 8 --threads 4 --clients 16
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import database
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ('catalog', 'search', 'borrow')
+
+def fill_catalog(size: int) -> None:
+    conn = database.get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+        ((f'Great Book {i}', f'Author {i % 100}', f'{9780000000000 + i}', 1_000_000, 1_000_000)
+         for i in range(size)),
+    )
+    conn.commit()
+    conn.close()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int, workers: int, threads: int, db_path: str) -> subprocess.Popen:
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads), LIBRARY_DATABASE=db_path)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning', 'wsgi:app'],
+        cwd=REPO_ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/catalog')
+            conn.getresponse().read()
+            conn.close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError('gunicorn did not start within 30s')
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+def build_request(endpoint: str, rng: random.Random, books: int):
+    if endpoint == 'catalog':
+        return 'GET', '/catalog', None, {}
+    if endpoint == 'search':
+        return 'GET', f'/api/search?q=book+{rng.randrange(books)}&type=title', None, {}
+    body = urllib.parse.urlencode({'patron_id': f'{rng.randrange(10**6):06d}', 'book_id': rng.randrange(books) + 1})
+    return 'POST', '/borrow', body, {'Content-Type': 'application/x-www-form-urlencoded'}
+
+def run_client(args):
+    """One client process: send requests back to back until the deadline; returns (latencies, errors)."""
+    port, endpoint, books, start_at, deadline, seed = args
+    rng = random.Random(seed)
+    time.sleep(max(0.0, start_at - time.time()))
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        method, path, body, headers = build_request(endpoint, rng, books)
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        if response.status >= 400:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+    conn.close()
+    return latencies, errors
+
+def load(port: int, endpoint: str, books: int, clients: int, duration: float):
+    # Leave the client processes time to start, so all of them load the server for the whole duration
+    start_at = time.time() + 1.0
+    deadline = start_at + duration
+    with multiprocessing.get_context('spawn').Pool(clients) as pool:
+        results = pool.map(run_client, [(port, endpoint, books, start_at, deadline, seed) for seed in range(clients)])
+    latencies = sorted(latency for result, _ in results for latency in result)
+    errors = sum(errors for _, errors in results)
+    return latencies, errors
+
+def percentile_ms(latencies, fraction: float) -> float:
+    if not latencies:
+        return float('nan')
+    return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of load per endpoint')
+    parser.add_argument('--books', type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPUs, {args.threads} threads per worker, {args.clients} clients, '
+          f'{args.duration:g}s per endpoint')
+    print(f'{"workers":>8}{"endpoint":>10}{"req/s":>10}{"p50 ms":>9}{"p99 ms":>9}{"errors":>8}')
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            database.configure_pool(db_path)
+            database.init_database()
+            fill_catalog(args.books)
+            database.get_pool().close()
+
+            port = free_port()
+            server = start_server(port, workers, args.threads, db_path)
+            try:
+                for endpoint in ENDPOINTS:
+                    latencies, errors = load(port, endpoint, args.books, args.clients, args.duration)
+                    print(f'{workers:>8}{endpoint:>10}{len(latencies) / args.duration:>10.0f}'
+                          f'{percentile_ms(latencies, 0.50):>9.1f}{percentile_ms(latencies, 0.99):>9.1f}{errors:>8}')
+            finally:
+                stop_server(server)
+
+if __name__ == '__main__':
+    main()
@@ -13,8 +13,17 @@ def _reset_db():
         conn = sqlite3.connect(DB_PATH)
 
     cur = conn.cursor()
+    cur.execute('DROP TABLE IF EXISTS books_fts')
+    cur.execute('DROP TABLE IF EXISTS fees')
+    cur.execute('DROP TABLE IF EXISTS fee_ledger_state')
+    cur.execute('DROP TABLE IF EXISTS fee_payment_items')
+    cur.execute('DROP TABLE IF EXISTS payment_outbox')
+    cur.execute('DROP TABLE IF EXISTS payments')
+    cur.execute('DROP TABLE IF EXISTS catalog_version')
+    cur.execute('DROP TABLE IF EXISTS loan_version')
     cur.execute('DROP TABLE IF EXISTS borrow_records')
     cur.execute('DROP TABLE IF EXISTS books')
+    cur.execute('PRAGMA user_version = 0')
 
     cur.execute('''
         CREATE TABLE books (
@@ -44,7 +53,11 @@ def _reset_db():
 @pytest.fixture(autouse=True, scope='function')
 def reset_db_per_test(request):
     """Ensure each test starts with a clean database. Optionally seed duplicates for specific tests."""
+    import database
+
     _reset_db()
+    # The tables were rebuilt behind the helpers' back
+    database.clear_book_cache()
 
     # Conditional seed for duplicate ISBN test
     node_name = getattr(request.node, 'name', '') or ''
@@ -58,3 +71,15 @@ def reset_db_per_test(request):
         conn.close()
     yield
 
+
+
+@pytest.fixture()
+def isolated_db(tmp_path):
+    """Point the shared connection pool at a fresh, fully initialised database file."""
+    import database
+
+    path = str(tmp_path / 'isolated.db')
+    database.configure_pool(path)
+    database.init_database()
+    yield path
+    database.configure_pool(DB_PATH)
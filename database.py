@@ -3,22 +3,675 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import base64
+import json
+import os
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from migrations import LATEST_VERSION, apply_migrations, get_schema_version
+from records import Book, Loan
 
 # Database configuration
 DATABASE = 'library.db'
 
+# Connection pool configuration
+DEFAULT_POOL_SIZE = 5                 # idle connections kept open for reuse
+DEFAULT_POOL_MAX_IDLE_SECONDS = 300.0  # idle connections older than this are closed
+
+# PRAGMA profiles applied, in order, to every new connection
+PRAGMA_PROFILES = {
+    # WAL lets catalog reads proceed while a borrow/return commits; NORMAL sync is
+    # crash-safe in WAL mode (a power loss can drop the last commits, never corrupt)
+    'default': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,      # negative = KiB, so ~16 MB of page cache
+        'mmap_size': 134217728,    # 128 MB memory-mapped reads
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,      # ms to wait for a lock before "database is locked"
+    },
+    # WAL concurrency, but fsync on every commit
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16000,
+        'mmap_size': 134217728,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    # SQLite's own defaults: rollback journal, full sync
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+    },
+}
+DEFAULT_PRAGMA_PROFILE = 'default'
+
+# In-process book cache (see BookCache); 0 turns it off
+DEFAULT_BOOK_CACHE_SIZE = 10000
+# Longest a cached read outside a request may go without checking for other processes' writes
+DEFAULT_BOOK_CACHE_MAX_STALENESS = 1.0
+
+# Catalog pagination
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Patron borrowing history
+HISTORY_PAGE_SIZE = 20
+
+# Catalog export
+EXPORT_BATCH_SIZE = 1000
+BOOK_COLUMNS = Book._fields
+
+# Select lists in Book / Loan constructor order, for _fetch_records()
+BOOK_SELECT = ', '.join(BOOK_COLUMNS)
+LOAN_SELECT = 'br.book_id, b.title, b.author, br.borrow_date, br.due_date, br.return_date'
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose close() hands it back to the pool that created it."""
+
+    pool = None
+    txn_depth = 0  # > 0 while inside transaction(); helper commits are deferred
+    written_book_ids = None  # books changed inside transaction(), re-invalidated when it ends
+    catalog_versions = None  # (before, after) catalog_version span of this transaction's book writes
+
+    def rollback(self):
+        # Our book writes are gone, so the catalog_version span is no longer ours
+        self.catalog_versions = None
+        super().rollback()
+
+    def commit(self):
+        if self.txn_depth:
+            return
+        super().commit()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def discard(self):
+        """Really close the underlying SQLite handle."""
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Thread-aware pool of SQLite connections.
+
+    A thread that already holds a connection gets the same one back, so nested
+    calls share one connection. Released connections are kept idle (at most
+    max_size of them) and handed to the next caller after a health check.
+    Idle connections older than max_idle_seconds are closed on the next checkout.
+    Every new connection gets the PRAGMAs of the chosen profile.
+    """
+
+    def __init__(self, database: str, max_size: int = DEFAULT_POOL_SIZE,
+                 max_idle_seconds: float = DEFAULT_POOL_MAX_IDLE_SECONDS,
+                 pragma_profile: str = DEFAULT_PRAGMA_PROFILE):
+        if pragma_profile not in PRAGMA_PROFILES:
+            raise ValueError(f"Unknown PRAGMA profile: {pragma_profile!r}. "
+                             f"Must be one of: {', '.join(PRAGMA_PROFILES)}")
+        self.database = database
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.pragma_profile = pragma_profile
+        self._idle = []  # (connection, released_at) pairs, most recently released last
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'nested': 0,
+            'in_use': 0,
+            'evicted': 0,
+            'health_check_failures': 0,
+        }
+
+    def acquire(self) -> sqlite3.Connection:
+        """Return this thread's connection, checking one out of the pool if needed."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            self._bump('nested')
+            return conn
+
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Give a connection back. The outermost release returns it to the idle list."""
+        if getattr(self._local, 'conn', None) is not conn:
+            # Not checked out by this thread (e.g. pool was reconfigured meanwhile)
+            conn.discard()
+            return
+
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+            if not self._closed and len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.discard()
+
+    def current(self) -> Optional[sqlite3.Connection]:
+        """This thread's checked-out connection, if it holds one."""
+        return getattr(self._local, 'conn', None)
+
+    def stats(self) -> Dict:
+        """Return a snapshot of the pool counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['max_size'] = self.max_size
+        stats['database'] = self.database
+        stats['pragma_profile'] = self.pragma_profile
+        return stats
+
+    def close(self) -> None:
+        """Close every idle connection. Connections still in use are closed on release."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.discard()
+
+    def _checkout(self) -> sqlite3.Connection:
+        while True:
+            with self._lock:
+                self._evict_expired()
+                conn = self._idle.pop()[0] if self._idle else None
+                self._stats['in_use'] += 1
+            if conn is None:
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._stats['in_use'] -= 1
+                    raise
+            if self._is_healthy(conn):
+                self._bump('reused')
+                return conn
+            self._bump('health_check_failures')
+            self._discard(conn)
+
+    def connect_unpooled(self) -> sqlite3.Connection:
+        """
+        Open a connection with this pool's settings that is not shared or pooled.
+        
+        For long-lived readers such as streaming responses, which may be finished
+        or abandoned on another thread. close() really closes it.
+        """
+        conn = sqlite3.connect(self.database, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        for name, value in PRAGMA_PROFILES[self.pragma_profile].items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = self.connect_unpooled()
+        conn.pool = self
+        self._bump('created')
+        return conn
+
+    def _evict_expired(self) -> None:
+        """Close idle connections past max_idle_seconds. Caller holds the lock."""
+        cutoff = time.monotonic() - self.max_idle_seconds
+        keep = []
+        for conn, released_at in self._idle:
+            if released_at <= cutoff:
+                conn.discard()
+                self._stats['evicted'] += 1
+            else:
+                keep.append((conn, released_at))
+        self._idle = keep
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._stats['in_use'] -= 1
+        conn.discard()
+
+    def _bump(self, counter: str) -> None:
+        with self._lock:
+            self._stats[counter] += 1
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+
+class BookCache:
+    """
+    Read-through cache of book rows for one process.
+
+    Holds an LRU of up to max_entries books, found by id or ISBN, plus one
+    snapshot of the whole catalog as get_all_books() returns it. Every book
+    write bumps version and invalidates what it touched: a changed book is
+    dropped from the LRU and its snapshot row is re-read on the next use, and
+    new books drop the snapshot. A row read from SQLite is only stored if
+    version has not moved since the read began, so a read that raced a write
+    cannot put the old row back. Book records are read-only, so callers share
+    the cached ones; only the snapshot list is copied.
+
+    Other processes' writes are caught through the catalog_version counter,
+    which triggers bump on every books change: sync() compares it with the
+    value seen last and empties the cache if someone else moved it, and
+    advance() accounts for this process's own writes so they do not empty it.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_BOOK_CACHE_SIZE,
+                 max_staleness: float = DEFAULT_BOOK_CACHE_MAX_STALENESS):
+        self.max_entries = max_entries
+        self.max_staleness = max_staleness
+        self.version = 0
+        self.catalog_version = None  # catalog_version as of the last sync(); None = unknown
+        self.synced_at = float('-inf')
+        self._by_id = OrderedDict()  # book id -> Book, least recently used first
+        self._id_by_isbn = {}
+        self._snapshot = None  # list of Books in title order
+        self._snapshot_index = {}  # book id -> position in the snapshot
+        self._stale_ids = set()  # books changed since the snapshot was taken
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ('hits', 'misses', 'evictions', 'invalidations', 'snapshot_hits', 'snapshot_patches',
+             'snapshot_misses', 'revalidations', 'foreign_writes'), 0
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get_by_id(self, book_id: int) -> Optional[Book]:
+        """Look a book up by id; None on a miss."""
+        with self._lock:
+            return self._get(book_id)
+
+    def get_by_isbn(self, isbn: str) -> Optional[Book]:
+        """Look a book up by ISBN; None on a miss."""
+        with self._lock:
+            return self._get(self._id_by_isbn.get(isbn))
+
+    def _get(self, book_id: Optional[int]) -> Optional[Book]:
+        """Caller holds the lock."""
+        book = self._by_id.get(book_id)
+        if book is None:
+            self._stats['misses'] += 1
+            return None
+        self._by_id.move_to_end(book_id)
+        self._stats['hits'] += 1
+        return book
+
+    def put(self, book: Book, version: int) -> None:
+        """Store a book read while the cache was at version."""
+        with self._lock:
+            if version != self.version:
+                return
+            self._by_id[book['id']] = book
+            self._by_id.move_to_end(book['id'])
+            self._id_by_isbn[book['isbn']] = book['id']
+            while len(self._by_id) > self.max_entries:
+                _, evicted = self._by_id.popitem(last=False)
+                self._id_by_isbn.pop(evicted['isbn'], None)
+                self._stats['evictions'] += 1
+
+    def get_snapshot(self) -> Tuple[Optional[List[Book]], Set[int], int]:
+        """
+        The whole catalog in title order.
+        
+        Returns:
+            tuple: (a copy of the snapshot list or None if there is no snapshot,
+                    ids of books changed since it was taken, current version)
+        """
+        with self._lock:
+            snapshot, stale, version = self._snapshot, set(self._stale_ids), self.version
+            if snapshot is None:
+                self._stats['snapshot_misses'] += 1
+            else:
+                self._stats['snapshot_patches' if stale else 'snapshot_hits'] += 1
+        if snapshot is None:
+            return None, stale, version
+        return list(snapshot), stale, version
+
+    def put_snapshot(self, books: List[Book], version: int) -> None:
+        """Store the whole catalog as read while the cache was at version."""
+        snapshot = list(books)
+        with self._lock:
+            if version == self.version:
+                self._snapshot = snapshot
+                self._snapshot_index = {book['id']: i for i, book in enumerate(snapshot)}
+                self._stale_ids = set()
+
+    def patch_snapshot(self, book_ids: Set[int], books: List[Book], version: int) -> bool:
+        """
+        Replace the snapshot rows of changed books with rows read while the cache was at version.
+        
+        Returns:
+            bool: False when the changed books no longer line up with the
+                  snapshot's rows, which is then dropped
+        """
+        with self._lock:
+            if version != self.version or self._snapshot is None:
+                return True
+            if len(books) != len(book_ids) or not book_ids <= self._snapshot_index.keys():
+                # A changed book is gone, or was added (e.g. by another process)
+                # after the snapshot was taken; start over
+                self._snapshot = None
+                return False
+            for book in books:
+                self._snapshot[self._snapshot_index[book['id']]] = book
+            self._stale_ids -= book_ids
+            return True
+
+    def invalidate(self, book_id: Optional[int] = None) -> None:
+        """
+        Forget a changed book.
+        
+        Args:
+            book_id: The book that changed; its snapshot row is marked for
+                re-reading. None when new books were added, which drops the
+                snapshot but leaves the other entries valid.
+        """
+        with self._lock:
+            self.version += 1
+            if book_id is None:
+                self._snapshot = None
+            else:
+                book = self._by_id.pop(book_id, None)
+                if book is not None:
+                    self._id_by_isbn.pop(book['isbn'], None)
+                if self._snapshot is not None:
+                    self._stale_ids.add(book_id)
+            self._stats['invalidations'] += 1
+
+    def clear(self) -> None:
+        """Forget everything, e.g. after the database was changed behind our back."""
+        with self._lock:
+            self._clear()
+            self.catalog_version = None
+            self.synced_at = float('-inf')
+
+    def _clear(self) -> None:
+        """Caller holds the lock."""
+        self.version += 1
+        self._by_id.clear()
+        self._id_by_isbn.clear()
+        self._snapshot = None
+        self._stale_ids = set()
+
+    def sync_due(self) -> bool:
+        """Whether max_staleness has passed since the last sync()."""
+        return time.monotonic() - self.synced_at >= self.max_staleness
+
+    def sync(self, catalog_version: int) -> None:
+        """Empty the cache if catalog_version moved since the last sync (another process wrote)."""
+        with self._lock:
+            self._stats['revalidations'] += 1
+            self.synced_at = time.monotonic()
+            if self.catalog_version is not None and catalog_version != self.catalog_version:
+                self._clear()
+                self._stats['foreign_writes'] += 1
+            self.catalog_version = catalog_version
+
+    def advance(self, before: int, after: int) -> None:
+        """Account for this process's committed writes, which moved catalog_version from before to after."""
+        with self._lock:
+            if self.catalog_version == before:
+                self.catalog_version = after
+
+    def stats(self) -> Dict:
+        """Hit, miss, eviction and invalidation counters, hit rate and entry count."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._by_id)
+            stats['snapshot_rows'] = len(self._snapshot) if self._snapshot is not None else 0
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['version'] = self.version
+        return stats
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+_book_cache = BookCache()
+
+def configure_pool(database: Optional[str] = None, max_size: int = DEFAULT_POOL_SIZE,
+                   max_idle_seconds: float = DEFAULT_POOL_MAX_IDLE_SECONDS,
+                   pragma_profile: str = DEFAULT_PRAGMA_PROFILE) -> ConnectionPool:
+    """Replace the shared connection pool, optionally pointing it at another database file."""
+    global _pool, DATABASE
+    with _pool_lock:
+        if database is not None:
+            DATABASE = database
+        old, _pool = _pool, ConnectionPool(DATABASE, max_size, max_idle_seconds, pragma_profile)
+        if old is not None:
+            old.close()
+        _book_cache.clear()
+        return _pool
+
+def get_pool() -> ConnectionPool:
+    """Get the shared connection pool, creating it on first use."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.database == DATABASE:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE)
+        return _pool
+
+_inherited_pools: List[ConnectionPool] = []
+
+def reset_pool_after_fork() -> None:
+    """
+    Give a freshly forked child process its own connection pool.
+
+    SQLite handles must not be used across fork(), and closing them in the
+    child can disturb the parent's locks, so the inherited pool is kept alive
+    but never touched again. The new pool has the same settings. Registered
+    with os.register_at_fork, so pre-fork servers (gunicorn) and
+    multiprocessing get this without calling it themselves.
+    """
+    global _pool, _pool_lock, _book_cache
+    # Another thread may have held a lock at the moment of the fork
+    _pool_lock = threading.Lock()
+    _book_cache = BookCache(_book_cache.max_entries, _book_cache.max_staleness)
+    old = _pool
+    if old is None:
+        return
+    _inherited_pools.append(old)
+    _pool = ConnectionPool(old.database, old.max_size, old.max_idle_seconds, old.pragma_profile)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_pool_after_fork)
+
+def get_pool_stats() -> Dict:
+    """Get counters for the shared connection pool."""
+    return get_pool().stats()
+
+def configure_book_cache(max_entries: int = DEFAULT_BOOK_CACHE_SIZE,
+                         max_staleness: float = DEFAULT_BOOK_CACHE_MAX_STALENESS) -> BookCache:
+    """Replace the book cache with an empty one holding up to max_entries books (0 turns it off)."""
+    global _book_cache
+    _book_cache = BookCache(max_entries, max_staleness)
+    return _book_cache
+
+def get_book_cache_stats() -> Dict:
+    """Get counters for the book cache."""
+    return _book_cache.stats()
+
+def clear_book_cache() -> None:
+    """Empty the book cache, e.g. after writing to the database outside these helpers."""
+    _book_cache.clear()
+
+def revalidate_book_cache() -> None:
+    """
+    Empty the book cache if another process changed the catalog since the last check.
+    
+    One single-row read of catalog_version. create_app() runs this before
+    every request, so a request sees every write committed before it began;
+    other cached reads run it once max_staleness has passed.
+    """
+    cache = _book_cache
+    if not cache.enabled:
+        return
+    catalog_version = get_catalog_version()
+    if catalog_version is not None:
+        cache.sync(catalog_version)
+
+def get_catalog_version() -> Optional[int]:
+    """
+    Get the counter bumped by every change to the books table, in any process.
+    
+    Returns:
+        int: the current value, or None on a schema without the counter
+    """
+    conn = get_db_connection()
+    version = _get_version_counter(conn, 'catalog_version')
+    conn.close()
+    return version
+
+def get_loan_version() -> Optional[int]:
+    """Get the counter bumped by every change to borrow_records; None on a schema without it."""
+    conn = get_db_connection()
+    version = _get_version_counter(conn, 'loan_version')
+    conn.close()
+    return version
+
+def _get_version_counter(conn: sqlite3.Connection, table: str) -> Optional[int]:
+    try:
+        row = conn.execute(f'SELECT version FROM {table} WHERE id = 1').fetchone()
+    except sqlite3.OperationalError:
+        # Schema older than the migration that added the counter
+        return None
+    return row[0] if row else None
+
+def _book_cache_usable() -> bool:
+    """Whether reads may use the cache: it is on and this thread is not inside transaction()."""
+    if not _book_cache.enabled:
+        return False
+    conn = get_pool().current()
+    if conn is not None and conn.txn_depth:
+        return False
+    if _book_cache.sync_due():
+        revalidate_book_cache()
+    return True
+
+def _books_written(conn: sqlite3.Connection, book_id: Optional[int] = None, rows: int = 1) -> None:
+    """
+    Invalidate cached books after a write of rows book rows on conn.
+    
+    The triggers bumped catalog_version once per row; once the write is
+    committed, the cache is told the new value is its own doing. Inside
+    transaction() nothing is committed yet, so both steps are repeated when
+    the transaction ends.
+    """
+    _book_cache.invalidate(book_id)
+    after = _get_version_counter(conn, 'catalog_version')
+    if not conn.txn_depth:
+        if after is not None:
+            _book_cache.advance(after - rows, after)
+        return
+    if conn.written_book_ids is None:
+        conn.written_book_ids = []
+    conn.written_book_ids.append(book_id)
+    if after is not None:
+        before = conn.catalog_versions[0] if conn.catalog_versions else after - rows
+        conn.catalog_versions = (before, after)
+
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    return conn
+    """Get a database connection from the shared pool. close() returns it to the pool."""
+    return get_pool().acquire()
+
+@contextmanager
+def transaction():
+    """
+    Run several helper calls as one write transaction.
+
+    Takes the write lock up front with BEGIN IMMEDIATE on this thread's pooled
+    connection. Helpers called inside the block share that connection, and their
+    own commits are deferred to a single commit when the block exits. An exception
+    rolls everything back; callers can also call rollback() on the yielded
+    connection before leaving the block.
+    """
+    conn = get_db_connection()
+    if conn.txn_depth:
+        # Nested block joins the outer transaction
+        conn.txn_depth += 1
+        try:
+            yield conn
+        finally:
+            conn.txn_depth -= 1
+            conn.close()
+        return
+
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+    except BaseException:
+        # e.g. "database is locked" after busy_timeout; give the checkout back
+        conn.close()
+        raise
+    conn.txn_depth = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.txn_depth = 0
+        conn.commit()
+        if conn.catalog_versions:
+            _book_cache.advance(*conn.catalog_versions)
+    finally:
+        conn.txn_depth = 0
+        conn.catalog_versions = None
+        written, conn.written_book_ids = conn.written_book_ids, None
+        for book_id in written or ():
+            _book_cache.invalidate(book_id)
+        conn.close()
 
 def init_database():
-    """Initialize the database with required tables."""
+    """
+    Initialize the database with required tables.
+    
+    Idempotent and cheap once done: a database already at the latest schema
+    version is left alone. Nothing runs at import time; create_app() and the
+    command line tools call this before first use.
+    """
     conn = get_db_connection()
+    if get_schema_version(conn) >= LATEST_VERSION:
+        conn.close()
+        return
     
     # Create books table
     conn.execute('''
@@ -46,12 +699,11 @@ def init_database():
     ''')
     
     conn.commit()
+    
+    # Bring indexes and later schema changes up to date
+    apply_migrations(conn)
     conn.close()
 
-# Ensure tables exist as soon as this module is imported.
-# This allows service-layer functions to operate in tests without booting the Flask app.
-init_database()
-
 def add_sample_data():
     """Add sample data to the database if it's empty."""
     conn = get_db_connection()
@@ -83,56 +735,403 @@ def add_sample_data():
         conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
         
         conn.commit()
+        _book_cache.clear()
     
     conn.close()
 
 # Helper Functions for Database Operations
 
-def get_all_books() -> List[Dict]:
-    """Get all books from the database."""
+def _fetch_records(cursor: sqlite3.Cursor, record_type) -> List:
+    """
+    Fetch the rest of a query's rows as Book or Loan records.
+    
+    The rows go straight from SQLite's tuples into the records, with no
+    sqlite3.Row or dict in between; the query must select BOOK_SELECT or
+    LOAN_SELECT columns.
+    """
+    cursor.row_factory = record_type.from_row
+    return cursor.fetchall()
+
+def get_all_books() -> List[Book]:
+    """Get all books from the database (served from the catalog snapshot when it is current)."""
+    cache = _book_cache
+    if not _book_cache_usable():
+        conn = get_db_connection()
+        books = _fetch_records(conn.execute(f'SELECT {BOOK_SELECT} FROM books ORDER BY title'), Book)
+        conn.close()
+        return books
+
+    books, stale, version = cache.get_snapshot()
+    if books is not None and not stale:
+        return books
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    if books is not None:
+        # Re-read only the books changed since the snapshot (available copies; titles never change)
+        placeholders = ', '.join('?' * len(stale))
+        fresh = _fetch_records(conn.execute(
+            f'SELECT {BOOK_SELECT} FROM books WHERE id IN ({placeholders})', tuple(stale)
+        ), Book)
+        if cache.patch_snapshot(stale, fresh, version):
+            conn.close()
+            by_id = {book.id: book for book in fresh}
+            return [by_id.get(book.id, book) for book in books]
+        version = cache.version
+
+    books = _fetch_records(conn.execute(f'SELECT {BOOK_SELECT} FROM books ORDER BY title'), Book)
     conn.close()
-    return [dict(book) for book in books]
+    cache.put_snapshot(books, version)
+    return books
 
-def get_book_by_id(book_id: int) -> Optional[Dict]:
-    """Get a specific book by ID."""
+def encode_cursor(book: Book) -> str:
+    """Encode a book's (title, id) sort key as an opaque, URL-safe page cursor."""
+    raw = json.dumps([book['title'], book['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a page cursor back to its (title, id) key. Raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        title, book_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Invalid page cursor.')
+    if not isinstance(title, str) or not isinstance(book_id, int):
+        raise ValueError('Invalid page cursor.')
+    return title, book_id
+
+def get_books_page(limit: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None,
+                   before: Optional[str] = None) -> Tuple[List[Book], Optional[str], Optional[str]]:
+    """
+    Get one page of the catalog in (title, id) order using keyset pagination.
+    
+    Each page is an index range scan that starts at the cursor, so every page
+    costs the same however deep into the catalog it is.
+    
+    Args:
+        limit: Page size, clamped to 1..MAX_PAGE_SIZE
+        after: Cursor of the last book on the previous page (walk forward)
+        before: Cursor of the first book on the next page (walk backward)
+        
+    Returns:
+        tuple: (books, next_cursor, prev_cursor); a cursor is None at either end
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    if before:
+        title, book_id = decode_cursor(before)
+        rows = _fetch_records(conn.execute(f'''
+            SELECT {BOOK_SELECT} FROM books WHERE (title, id) < (?, ?)
+            ORDER BY title DESC, id DESC LIMIT ?
+        ''', (title, book_id, limit + 1)), Book)
+        rows.reverse()
+    elif after:
+        title, book_id = decode_cursor(after)
+        rows = _fetch_records(conn.execute(f'''
+            SELECT {BOOK_SELECT} FROM books WHERE (title, id) > (?, ?)
+            ORDER BY title, id LIMIT ?
+        ''', (title, book_id, limit + 1)), Book)
+    else:
+        rows = _fetch_records(conn.execute(
+            f'SELECT {BOOK_SELECT} FROM books ORDER BY title, id LIMIT ?', (limit + 1,)
+        ), Book)
     conn.close()
-    return dict(book) if book else None
 
-def get_book_by_isbn(isbn: str) -> Optional[Dict]:
+    # The extra row only tells us whether there is more in the walking direction
+    has_more = len(rows) > limit
+    if before:
+        books = rows[-limit:]
+        has_prev, has_next = has_more, True
+    else:
+        books = rows[:limit]
+        has_prev, has_next = bool(after), has_more
+
+    next_cursor = encode_cursor(books[-1]) if books and has_next else None
+    prev_cursor = encode_cursor(books[0]) if books and has_prev else None
+    return books, next_cursor, prev_cursor
+
+def iter_book_batches(batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Tuple]]:
+    """
+    Yield the whole catalog in id order as lists of row tuples (see BOOK_COLUMNS).
+    
+    Rows come from one server-side cursor with fetchmany(), so memory use stays
+    at one batch however large the catalog is.
+    """
+    conn = get_pool().connect_unpooled()
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(BOOK_COLUMNS)} FROM books ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [tuple(row) for row in rows]
+    finally:
+        conn.close()
+
+def get_book_by_id(book_id: int) -> Optional[Book]:
+    """Get a specific book by ID."""
+    return _get_book('id', book_id)
+
+def get_book_by_isbn(isbn: str) -> Optional[Book]:
     """Get a specific book by ISBN."""
+    return _get_book('isbn', isbn)
+
+def _get_book(column: str, value) -> Optional[Book]:
+    """
+    Look a book up by id or isbn, through the book cache.
+    
+    Inside transaction() the cache is bypassed, so checks made under the
+    write lock (e.g. available copies before a borrow) always see the database.
+    """
+    cache = _book_cache
+    use_cache = _book_cache_usable()
+    if use_cache:
+        cached = cache.get_by_id(value) if column == 'id' else cache.get_by_isbn(value)
+        if cached is not None:
+            return cached
+    version = cache.version
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    books = _fetch_records(conn.execute(f'SELECT {BOOK_SELECT} FROM books WHERE {column} = ?', (value,)), Book)
     conn.close()
-    return dict(book) if book else None
+    if not books:
+        return None
+    book = books[0]
+    if use_cache:
+        cache.put(book, version)
+    return book
 
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
+def fulltext_search_available() -> bool:
+    """Check whether the books_fts index exists in the current database."""
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).fetchone()
+    conn.close()
+    return row is not None
+
+def search_books_fulltext(search_term: str, field: str, limit: Optional[int] = None) -> List[Book]:
+    """
+    Search book titles or authors through the books_fts trigram index.
+    
+    Matches are case-insensitive substrings of at least 3 characters. Results
+    starting with the search term come first, then the rest by FTS5 rank.
+    
+    Args:
+        search_term: Text to look for
+        field: 'title' or 'author'
+        limit: Maximum number of rows to return (all matches if None)
+    """
+    if field not in ('title', 'author'):
+        raise ValueError("Full-text search field must be 'title' or 'author'")
+    
+    # Quote the term as an FTS5 phrase so punctuation is matched literally
+    phrase = '"' + search_term.replace('"', '""') + '"'
+    columns = ', '.join('b.' + column for column in BOOK_COLUMNS)
+    conn = get_db_connection()
+    books = _fetch_records(conn.execute(f'''
+        SELECT {columns}
+        FROM books_fts f
+        JOIN books b ON b.id = f.rowid
+        WHERE books_fts MATCH ?
+        ORDER BY instr(lower(b.{field}), lower(?)) != 1, f.rank
+        LIMIT ?
+    ''', (f'{field} : {phrase}', search_term, -1 if limit is None else limit)), Book)
+    conn.close()
+    return books
+
+def get_patron_borrowed_books(patron_id: str) -> List[Loan]:
     """Get currently borrowed books for a patron."""
     conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
+    loans = _fetch_records(conn.execute(f'''
+        SELECT {LOAN_SELECT}
         FROM borrow_records br 
         JOIN books b ON br.book_id = b.id 
         WHERE br.patron_id = ? AND br.return_date IS NULL
         ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
+    ''', (patron_id,)), Loan)
     conn.close()
+    return loans
+
+def get_patron_loans(patron_id: str, history_limit: int = HISTORY_PAGE_SIZE,
+                     history_offset: int = 0) -> Tuple[List[Loan], List[Loan], bool]:
+    """
+    Get a patron's current loans and one page of returned loans in a single query.
     
-    borrowed_books = []
-    for record in records:
-        borrowed_books.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
-        })
+    Args:
+        patron_id: 6-digit library card ID
+        history_limit: Returned loans per page (most recently returned first)
+        history_offset: Returned loans to skip
+        
+    Returns:
+        tuple: (current_loans, history, history_has_more)
+    """
+    conn = get_db_connection()
+    loans = _fetch_records(conn.execute(f'''
+        SELECT {LOAN_SELECT}
+        FROM borrow_records br
+        JOIN books b ON br.book_id = b.id
+        WHERE br.patron_id = ?
+          AND (br.return_date IS NULL OR br.id IN (
+                SELECT id FROM borrow_records
+                WHERE patron_id = ? AND return_date IS NOT NULL
+                ORDER BY return_date DESC, id DESC
+                LIMIT ? OFFSET ?))
+        ORDER BY br.return_date IS NOT NULL, br.borrow_date
+    ''', (patron_id, patron_id, history_limit + 1, history_offset)), Loan)
+    conn.close()
+
+    current, history = [], []
+    for loan in loans:
+        (current if loan.return_date is None else history).append(loan)
+
+    # One extra returned loan was fetched only to tell whether another page exists
+    history.sort(key=lambda loan: loan.return_date, reverse=True)
+    return current, history[:history_limit], len(history) > history_limit
+
+def get_active_loan_due_dates() -> List[Tuple[str, int, str]]:
+    """
+    Get (patron_id, book_id, due day as 'YYYY-MM-DD') for every open loan in one query.
     
-    return borrowed_books
+    Rows are plain tuples so library-wide fee runs over millions of loans
+    do not build a dict per row.
+    """
+    conn = get_db_connection()
+    conn.row_factory = None
+    try:
+        rows = conn.execute('''
+            SELECT patron_id, book_id, substr(due_date, 1, 10)
+            FROM borrow_records
+            WHERE return_date IS NULL
+        ''').fetchall()
+    finally:
+        conn.row_factory = sqlite3.Row
+        conn.close()
+    return rows
+
+def get_fee_ledger_state() -> Optional[Dict]:
+    """
+    Get the fee ledger's last refresh: as_of day ('YYYY-MM-DD') and the highest
+    borrow record id it had seen. None if it was never refreshed (or does not exist).
+    """
+    conn = get_db_connection()
+    try:
+        row = conn.execute('SELECT as_of, last_record_id FROM fee_ledger_state WHERE id = 1').fetchone()
+    except sqlite3.OperationalError:
+        # Database not migrated to the ledger schema yet
+        row = None
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def get_overdue_loans_for_ledger(as_of: str, due_since: Optional[str] = None,
+                                 after_record_id: int = 0) -> List[Tuple[int, str, int, str]]:
+    """
+    Get (id, patron_id, book_id, due_date) of open loans due before the as_of day.
+    
+    With due_since, only loans due on or after that day, or created after
+    after_record_id, are returned: the ones whose fee can have changed since
+    the previous refresh.
+    """
+    conn = get_db_connection()
+    conn.row_factory = None
+    try:
+        if due_since is None:
+            rows = conn.execute('''
+                SELECT id, patron_id, book_id, due_date FROM borrow_records
+                WHERE return_date IS NULL AND due_date < ?
+            ''', (as_of,)).fetchall()
+        else:
+            rows = conn.execute('''
+                SELECT id, patron_id, book_id, due_date FROM borrow_records
+                WHERE return_date IS NULL AND due_date < ? AND due_date >= ?
+                UNION
+                SELECT id, patron_id, book_id, due_date FROM borrow_records
+                WHERE id > ? AND return_date IS NULL AND due_date < ?
+            ''', (as_of, due_since, after_record_id, as_of)).fetchall()
+    finally:
+        conn.row_factory = sqlite3.Row
+        conn.close()
+    return rows
+
+def write_fee_ledger(rows: List[Tuple[int, str, int, int, int]], as_of: str, full: bool = False) -> None:
+    """
+    Upsert (borrow_record_id, patron_id, book_id, days_overdue, fee_cents) ledger
+    rows and record the refresh. A full refresh replaces the whole ledger.
+    """
+    with transaction() as conn:
+        if full:
+            conn.execute('DELETE FROM fees')
+        conn.executemany('''
+            INSERT OR REPLACE INTO fees (borrow_record_id, patron_id, book_id, days_overdue, fee_cents)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.execute('''
+            INSERT OR REPLACE INTO fee_ledger_state (id, as_of, last_record_id)
+            SELECT 1, ?, COALESCE(MAX(id), 0) FROM borrow_records
+        ''', (as_of,))
+
+def get_fee_ledger_rows() -> List[Tuple[str, int, int, int]]:
+    """Get (patron_id, book_id, days_overdue, fee_cents) for every loan in the fee ledger."""
+    conn = get_db_connection()
+    conn.row_factory = None
+    try:
+        rows = conn.execute('SELECT patron_id, book_id, days_overdue, fee_cents FROM fees').fetchall()
+    finally:
+        conn.row_factory = sqlite3.Row
+        conn.close()
+    return rows
+
+def get_ledger_loan_fee(patron_id: str, book_id: int) -> Optional[Dict]:
+    """
+    Get days_overdue and fee_cents for the patron's open loan of a book from the
+    fee ledger (0 for a loan that is not overdue), or None if there is no open loan.
+    
+    Both are None for a loan created since the last refresh, which the ledger
+    has not priced yet; due_date is returned so the caller can price it.
+    """
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT COALESCE(f.days_overdue, 0) AS days_overdue, COALESCE(f.fee_cents, 0) AS fee_cents, br.due_date,
+               br.id <= (SELECT last_record_id FROM fee_ledger_state WHERE id = 1) AS priced
+        FROM borrow_records br
+        LEFT JOIN fees f ON f.borrow_record_id = br.id
+        WHERE br.patron_id = ? AND br.book_id = ? AND br.return_date IS NULL
+    ''', (patron_id, book_id)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    if row['priced']:
+        return {'days_overdue': row['days_overdue'], 'fee_cents': row['fee_cents'], 'due_date': row['due_date']}
+    return {'days_overdue': None, 'fee_cents': None, 'due_date': row['due_date']}
+
+def get_ledger_patron_fees(patron_id: str) -> Dict[int, int]:
+    """
+    Get {book_id: fee_cents} for the patron's open loans from the fee ledger
+    (0 for a loan that is not overdue). Loans created since the last refresh
+    are left out, since the ledger has not priced them yet.
+    """
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT br.book_id, COALESCE(f.fee_cents, 0) AS fee_cents
+        FROM borrow_records br
+        LEFT JOIN fees f ON f.borrow_record_id = br.id
+        WHERE br.patron_id = ? AND br.return_date IS NULL
+          AND br.id <= (SELECT last_record_id FROM fee_ledger_state WHERE id = 1)
+    ''', (patron_id,)).fetchall()
+    conn.close()
+    return {row['book_id']: row['fee_cents'] for row in rows}
+
+def get_active_loan(patron_id: str, book_id: int) -> Optional[Loan]:
+    """Get the patron's open borrow record for one book, or None if there is none."""
+    conn = get_db_connection()
+    loans = _fetch_records(conn.execute(f'''
+        SELECT {LOAN_SELECT}
+        FROM borrow_records br 
+        JOIN books b ON br.book_id = b.id 
+        WHERE br.patron_id = ? AND br.book_id = ? AND br.return_date IS NULL
+        ORDER BY br.borrow_date
+        LIMIT 1
+    ''', (patron_id, book_id)), Loan)
+    conn.close()
+    return loans[0] if loans else None
 
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
@@ -153,12 +1152,38 @@ def insert_book(title: str, author: str, isbn: str, total_copies: int, available
             VALUES (?, ?, ?, ?, ?)
         ''', (title, author, isbn, total_copies, available_copies))
         conn.commit()
+        _books_written(conn)
         conn.close()
         return True
     except Exception as e:
         conn.close()
         return False
 
+def get_all_isbns() -> set:
+    """Get the set of every ISBN in the catalog."""
+    conn = get_db_connection()
+    isbns = {row[0] for row in conn.execute('SELECT isbn FROM books')}
+    conn.close()
+    return isbns
+
+def insert_books(books: List[Tuple[str, str, str, int, int]]) -> int:
+    """
+    Insert many books in one transaction with executemany.
+    
+    Args:
+        books: (title, author, isbn, total_copies, available_copies) tuples
+        
+    Returns:
+        int: number of rows inserted; rows whose ISBN already exists are skipped
+    """
+    with transaction() as conn:
+        cursor = conn.executemany('''
+            INSERT OR IGNORE INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', books)
+        _books_written(conn, rows=cursor.rowcount)
+        return cursor.rowcount
+
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
     conn = get_db_connection()
@@ -175,15 +1200,22 @@ def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, du
         return False
 
 def update_book_availability(book_id: int, change: int) -> bool:
-    """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
+    """
+    Update the available copies of a book by a given amount (+1 for return, -1 for borrow).
+    
+    The update is conditional, so it never takes available copies below zero;
+    returns False if no row was changed.
+    """
     conn = get_db_connection()
     try:
-        conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
+        cursor = conn.execute('''
+            UPDATE books SET available_copies = available_copies + ?
+            WHERE id = ? AND available_copies + ? >= 0
+        ''', (change, book_id, change))
         conn.commit()
+        _books_written(conn, book_id, cursor.rowcount)
         conn.close()
-        return True
+        return cursor.rowcount > 0
     except Exception as e:
         conn.close()
         return False
@@ -203,3 +1235,261 @@ def update_borrow_record_return_date(patron_id: str, book_id: int, return_date:
     except Exception as e:
         conn.close()
         return False
+
+def insert_fee_payment_items(transaction_id: str, patron_id: str, items: List[Tuple[int, int]],
+                             paid_at: datetime) -> None:
+    """Record how a combined late fee payment splits into (book_id, amount_cents) items."""
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO fee_payment_items (transaction_id, patron_id, book_id, amount_cents, paid_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(transaction_id, patron_id, book_id, cents, paid_at.isoformat()) for book_id, cents in items])
+
+def get_fee_payment_items(transaction_id: str) -> List[Dict]:
+    """Get the per-book items of a combined late fee payment."""
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT book_id, amount_cents, refunded_cents FROM fee_payment_items
+        WHERE transaction_id = ? ORDER BY book_id
+    ''', (transaction_id,)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+# Net cents paid per open loan of a patron, through the book's items of combined
+# payments and through per-book payments (minus the refunds of each transaction)
+_PAID_LATE_FEES_QUERIES = (
+    '''
+        SELECT br.book_id, SUM(i.amount_cents - i.refunded_cents) AS paid_cents
+        FROM borrow_records br
+        JOIN fee_payment_items i
+          ON i.patron_id = br.patron_id AND i.book_id = br.book_id AND i.paid_at >= br.borrow_date
+        WHERE br.patron_id = ? AND br.return_date IS NULL
+        GROUP BY br.book_id
+    ''',
+    '''
+        SELECT br.book_id, SUM(p.amount_cents - COALESCE((
+                   SELECT SUM(r.amount_cents) FROM payments r
+                   WHERE r.transaction_id = p.transaction_id AND r.kind = 'refund'
+               ), 0)) AS paid_cents
+        FROM borrow_records br
+        JOIN payments p
+          ON p.patron_id = br.patron_id AND p.book_id = br.book_id AND p.kind = 'payment'
+             AND p.created_at >= br.borrow_date
+        WHERE br.patron_id = ? AND br.return_date IS NULL
+        GROUP BY br.book_id
+    ''',
+)
+
+def get_paid_late_fees(patron_id: str) -> Dict[int, int]:
+    """
+    Get {book_id: cents} already paid, net of refunds, towards the patron's open
+    loans (payments made since each loan began), through both combined and
+    per-book late fee payments.
+    """
+    paid = {}
+    conn = get_db_connection()
+    try:
+        for query in _PAID_LATE_FEES_QUERIES:
+            try:
+                rows = conn.execute(query, (patron_id,)).fetchall()
+            except sqlite3.OperationalError:
+                # Database not migrated to the payment items / payments schema yet
+                continue
+            for row in rows:
+                paid[row['book_id']] = paid.get(row['book_id'], 0) + row['paid_cents']
+    finally:
+        conn.close()
+    return paid
+
+def update_fee_payment_refund(transaction_id: str, book_id: int, change_cents: int) -> bool:
+    """
+    Add to (or, with a negative change, take back from) a payment item's refunded amount.
+    
+    The update is conditional, so refunds never exceed what was paid for the book;
+    returns False if no row was changed.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            UPDATE fee_payment_items SET refunded_cents = refunded_cents + ?
+            WHERE transaction_id = ? AND book_id = ?
+              AND refunded_cents + ? BETWEEN 0 AND amount_cents
+        ''', (change_cents, transaction_id, book_id, change_cents))
+        conn.commit()
+    except sqlite3.Error:
+        if not conn.txn_depth:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return cursor.rowcount > 0
+
+def insert_outbox_entry(idempotency_key: str, kind: str, amount_cents: int, patron_id: Optional[str] = None,
+                        book_id: Optional[int] = None, description: str = '',
+                        original_transaction_id: Optional[str] = None,
+                        payment_id: Optional[int] = None) -> Tuple[Dict, bool]:
+    """
+    Queue a payment gateway call, unless one with the same idempotency key exists.
+    
+    An entry of the same kind that failed (declined, or given up on) is queued
+    again with the new values and a fresh attempt count, so the same request
+    can be retried.
+    
+    Returns:
+        tuple: (outbox entry, created) where created is False for a duplicate key
+               of an entry that is still queued or has succeeded
+    """
+    now = datetime.now().isoformat()
+    with transaction() as conn:
+        cursor = conn.execute('''
+            INSERT INTO payment_outbox
+                (idempotency_key, kind, patron_id, book_id, amount_cents, description,
+                 original_transaction_id, payment_id, next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+            ON CONFLICT (idempotency_key) DO UPDATE SET
+                patron_id = excluded.patron_id, book_id = excluded.book_id,
+                amount_cents = excluded.amount_cents, description = excluded.description,
+                original_transaction_id = excluded.original_transaction_id, payment_id = excluded.payment_id,
+                status = 'pending', attempts = 0, next_attempt_at = 0, transaction_id = NULL, message = NULL,
+                updated_at = excluded.updated_at
+            WHERE payment_outbox.status = 'failed' AND payment_outbox.kind = excluded.kind
+        ''', (idempotency_key, kind, patron_id, book_id, amount_cents, description,
+              original_transaction_id, payment_id, now, now))
+        entry = conn.execute(
+            'SELECT * FROM payment_outbox WHERE idempotency_key = ?', (idempotency_key,)
+        ).fetchone()
+    return dict(entry), cursor.rowcount > 0
+
+def get_outbox_entry(entry_id: int) -> Optional[Dict]:
+    """Get one payment outbox entry by id."""
+    conn = get_db_connection()
+    entry = conn.execute('SELECT * FROM payment_outbox WHERE id = ?', (entry_id,)).fetchone()
+    conn.close()
+    return dict(entry) if entry else None
+
+def get_outbox_entry_by_key(idempotency_key: str) -> Optional[Dict]:
+    """Get the payment outbox entry queued under an idempotency key."""
+    conn = get_db_connection()
+    entry = conn.execute(
+        'SELECT * FROM payment_outbox WHERE idempotency_key = ?', (idempotency_key,)
+    ).fetchone()
+    conn.close()
+    return dict(entry) if entry else None
+
+def claim_outbox_entries(limit: int, now: float, lease_seconds: float) -> List[Dict]:
+    """
+    Claim up to limit due entries for one worker and count the attempt.
+    
+    Claimed entries are leased until now + lease_seconds; an entry whose worker
+    died mid-call becomes due again when its lease runs out.
+    """
+    with transaction() as conn:
+        entries = conn.execute('''
+            SELECT * FROM payment_outbox
+            WHERE status IN ('pending', 'processing') AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        ''', (now, limit)).fetchall()
+        conn.executemany('''
+            UPDATE payment_outbox
+            SET status = 'processing', attempts = attempts + 1, next_attempt_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', [(now + lease_seconds, datetime.now().isoformat(), entry['id']) for entry in entries])
+    claimed = [dict(entry) for entry in entries]
+    for entry in claimed:
+        entry['attempts'] += 1
+    return claimed
+
+def update_outbox_entry(entry_id: int, status: str, message: str, transaction_id: Optional[str] = None,
+                        next_attempt_at: float = 0) -> None:
+    """Record the outcome of an attempt: succeeded / failed, or pending again at next_attempt_at."""
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+            UPDATE payment_outbox
+            SET status = ?, message = ?, transaction_id = ?, next_attempt_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', (status, message, transaction_id, next_attempt_at, datetime.now().isoformat(), entry_id))
+        conn.commit()
+    except sqlite3.Error:
+        if not conn.txn_depth:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def insert_payment(transaction_id: str, kind: str, patron_id: str, amount_cents: int,
+                   book_id: Optional[int] = None, description: str = '') -> Optional[int]:
+    """
+    Record a gateway payment or refund ('payment' / 'refund'); returns the row id,
+    or None on a database without the payments table (nothing is recorded there).
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO payments (transaction_id, kind, patron_id, book_id, amount_cents, description, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (transaction_id, kind, patron_id, book_id, amount_cents, description, datetime.now().isoformat()))
+        conn.commit()
+    except sqlite3.Error as e:
+        if not conn.txn_depth:
+            conn.rollback()
+        if isinstance(e, sqlite3.OperationalError) and 'no such table' in str(e):
+            # Database not migrated to the payments schema yet
+            return None
+        raise
+    finally:
+        conn.close()
+    return cursor.lastrowid
+
+def delete_payment(payment_id: int) -> None:
+    """Remove a recorded payment or refund (a refund the gateway did not carry out)."""
+    conn = get_db_connection()
+    try:
+        conn.execute('DELETE FROM payments WHERE id = ?', (payment_id,))
+        conn.commit()
+    except sqlite3.Error:
+        if not conn.txn_depth:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def get_payment_balance(transaction_id: str) -> Optional[Dict]:
+    """
+    Get patron_id, paid_cents and refunded_cents for a recorded transaction,
+    or None if no payment was recorded under that id.
+    """
+    conn = get_db_connection()
+    try:
+        row = conn.execute('''
+            SELECT MAX(CASE WHEN kind = 'payment' THEN patron_id END) AS patron_id,
+                   COUNT(CASE WHEN kind = 'payment' THEN 1 END) AS payments,
+                   COALESCE(SUM(CASE WHEN kind = 'payment' THEN amount_cents END), 0) AS paid_cents,
+                   COALESCE(SUM(CASE WHEN kind = 'refund' THEN amount_cents END), 0) AS refunded_cents
+            FROM payments WHERE transaction_id = ?
+        ''', (transaction_id,)).fetchone()
+    except sqlite3.OperationalError:
+        # Database not migrated to the payments schema yet
+        row = None
+    finally:
+        conn.close()
+    if not row or not row['payments']:
+        return None
+    return {'patron_id': row['patron_id'], 'paid_cents': row['paid_cents'], 'refunded_cents': row['refunded_cents']}
+
+def get_patron_payments(patron_id: str, limit: int) -> List[Dict]:
+    """Get a patron's most recent payments and refunds, newest first."""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('''
+            SELECT transaction_id, kind, book_id, amount_cents, description, created_at
+            FROM payments WHERE patron_id = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (patron_id, limit)).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
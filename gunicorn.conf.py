@@ -0,0 +1,55 @@
+"""
+Gunicorn settings for serving wsgi:app with several worker processes.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Environment:
+    PORT                 Port to listen on (default 5000)
+    WEB_CONCURRENCY      Worker processes (default: 2 per CPU, plus one)
+    GUNICORN_THREADS     Threads per worker (default 4)
+    GUNICORN_TIMEOUT     Seconds before a silent worker is killed (default 30)
+    LIBRARY_DATABASE     SQLite file (default library.db)
+    LIBRARY_DB_PRAGMA_PROFILE  SQLite tuning, see database.PRAGMA_PROFILES (default 'default')
+
+The master creates the schema and sample data once before forking, so the
+first workers do not race each other to insert them; later schema upgrades
+are safe to run from several workers at once (see apply_migrations). Each
+worker gets its own SQLite connection pool: database.py replaces the pool in
+every forked child (os.register_at_fork).
+
+Graceful reload: `kill -HUP <master pid>` starts workers with freshly loaded
+code, running any new migrations, and lets the old ones finish their
+requests (up to graceful_timeout).
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads let a worker keep serving reads while one request waits on the SQLite write lock
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = 10000
+max_requests_jitter = 1000
+# Load the app in each worker, not the master, so HUP picks up new code
+preload_app = False
+
+
+def on_starting(server):
+    """Bring the schema up to date before any worker starts."""
+    import database
+
+    # Same database and PRAGMA profile as create_app() gives the workers
+    database.configure_pool(
+        os.environ.get('LIBRARY_DATABASE', database.DATABASE),
+        pragma_profile=os.environ.get('LIBRARY_DB_PRAGMA_PROFILE', database.DEFAULT_PRAGMA_PROFILE),
+    )
+    database.init_database()
+    database.add_sample_data()
+    database.get_pool().close()
+
@@ -0,0 +1,260 @@
+"""
+Schema migrations for the Library Management System database.
+
+init_database() creates the base tables; everything added after that lives here
+as a numbered migration so existing databases can be upgraded in place.
+The applied version is stored in SQLite's PRAGMA user_version.
+"""
+
+import sqlite3
+from typing import Callable, List, Tuple, Union
+
+def _create_books_fts(conn: sqlite3.Connection) -> None:
+    """
+    Create the books_fts full-text index and the triggers that keep it in sync.
+    
+    The trigram tokenizer matches any substring of 3+ characters case-insensitively,
+    the same results as the old substring scan. SQLite builds without FTS5 or the
+    trigram tokenizer (before 3.34) skip this step, and search keeps scanning.
+    """
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                title, author, content='books', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_after_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_after_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_after_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    # Index the books that already exist
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+# (version, description, statements) -- append only, never edit an applied migration.
+# Statements are SQL strings, or a function taking the connection for steps that
+# need to inspect the database first.
+MIGRATIONS: List[Tuple[int, str, Union[List[str], Callable[[sqlite3.Connection], None]]]] = [
+    (1, 'Index borrow_records for active-loan and per-book lookups', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_active_patron
+        ON borrow_records (patron_id, book_id)
+        WHERE return_date IS NULL
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_book_return
+        ON borrow_records (book_id, return_date)
+        ''',
+    ]),
+    (2, 'Full-text index over book titles and authors', _create_books_fts),
+    (3, 'Index books by (title, id) for keyset pagination', [
+        'CREATE INDEX IF NOT EXISTS idx_books_title_id ON books (title, id)',
+    ]),
+    (4, 'Index returned loans by patron for borrowing history', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_history
+        ON borrow_records (patron_id, return_date)
+        WHERE return_date IS NOT NULL
+        ''',
+    ]),
+    (5, 'Materialized late fee ledger for overdue loans', [
+        '''
+        CREATE TABLE IF NOT EXISTS fees (
+            borrow_record_id INTEGER PRIMARY KEY REFERENCES borrow_records (id),
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            days_overdue INTEGER NOT NULL,
+            fee_cents INTEGER NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_fees_patron ON fees (patron_id, book_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS fee_ledger_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            as_of TEXT NOT NULL,
+            last_record_id INTEGER NOT NULL
+        )
+        ''',
+        # Open loans by due date, for picking the loans whose fee moved since the last refresh
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_active_due
+        ON borrow_records (due_date)
+        WHERE return_date IS NULL
+        ''',
+        # A returned (or deleted) loan no longer owes a running fee
+        '''
+        CREATE TRIGGER IF NOT EXISTS fees_after_return
+        AFTER UPDATE OF return_date ON borrow_records
+        WHEN new.return_date IS NOT NULL BEGIN
+            DELETE FROM fees WHERE borrow_record_id = new.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS fees_after_loan_delete AFTER DELETE ON borrow_records BEGIN
+            DELETE FROM fees WHERE borrow_record_id = old.id;
+        END
+        ''',
+    ]),
+    (6, 'Per-book allocation of combined late fee payments', [
+        '''
+        CREATE TABLE IF NOT EXISTS fee_payment_items (
+            transaction_id TEXT NOT NULL,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            refunded_cents INTEGER NOT NULL DEFAULT 0,
+            paid_at TEXT NOT NULL,
+            PRIMARY KEY (transaction_id, book_id)
+        )
+        ''',
+    ]),
+    (7, 'Outbox of payment gateway calls for background workers', [
+        '''
+        CREATE TABLE IF NOT EXISTS payment_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT UNIQUE NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('payment', 'refund')),
+            patron_id TEXT,
+            book_id INTEGER,
+            amount_cents INTEGER NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            original_transaction_id TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            transaction_id TEXT,
+            message TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_payment_outbox_due
+        ON payment_outbox (next_attempt_at)
+        WHERE status IN ('pending', 'processing')
+        ''',
+    ]),
+    (8, 'Local record of gateway payments and refunds', [
+        '''
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('payment', 'refund')),
+            patron_id TEXT NOT NULL,
+            book_id INTEGER,
+            amount_cents INTEGER NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_payments_transaction ON payments (transaction_id, kind)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_patron ON payments (patron_id, created_at)',
+        # Refund row a queued refund holds until the gateway answers
+        'ALTER TABLE payment_outbox ADD COLUMN payment_id INTEGER REFERENCES payments (id)',
+    ]),
+    (9, 'Catalog version counter for cross-process cache invalidation', [
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''',
+        'INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)',
+        # Bumped once per changed row, by every writer in every process
+        '''
+        CREATE TRIGGER IF NOT EXISTS catalog_version_after_insert AFTER INSERT ON books BEGIN
+            UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS catalog_version_after_update AFTER UPDATE ON books BEGIN
+            UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS catalog_version_after_delete AFTER DELETE ON books BEGIN
+            UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+    ]),
+    (10, 'Loan version counter for conditional GETs of late fees', [
+        '''
+        CREATE TABLE IF NOT EXISTS loan_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''',
+        'INSERT OR IGNORE INTO loan_version (id, version) VALUES (1, 0)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loan_version_after_insert AFTER INSERT ON borrow_records BEGIN
+            UPDATE loan_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loan_version_after_update AFTER UPDATE ON borrow_records BEGIN
+            UPDATE loan_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS loan_version_after_delete AFTER DELETE ON borrow_records BEGIN
+            UPDATE loan_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Get the schema version recorded in the database file."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def apply_migrations(conn: sqlite3.Connection) -> List[int]:
+    """
+    Apply every migration newer than the database's schema version.
+    
+    Each migration runs in its own BEGIN IMMEDIATE transaction together with the
+    version bump, so a crash leaves the database at the last fully applied
+    version and a concurrent process never applies the same migration twice.
+    
+    Returns:
+        list: versions applied by this call (empty if already up to date)
+    """
+    applied = []
+    for version, _description, statements in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-check under the write lock in case another process got here first
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            if callable(statements):
+                statements(conn)
+            else:
+                for statement in statements:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
@@ -0,0 +1,119 @@
+"""
+Record types for rows read from the Library Management System database.
+
+Book and Loan hold one row each in __slots__, with no per-row dict, and are
+built straight from SQLite's row tuples (see Record.from_row). Loan keeps its
+dates as the ISO strings stored in the database and parses them on access.
+
+Both are read-only mappings as well, so code written against the row dicts
+the read helpers used to return (book['title'], loan.get('due_date'),
+dict(book), comparing with a dict) keeps working. Records are shared (e.g. by
+the book cache), so assigning to or deleting their attributes raises
+AttributeError; use dict(record) to get a mutable copy.
+"""
+
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+def _slot_setters(cls) -> Tuple[Callable, ...]:
+    """The __set__ of each of cls's slots, in __slots__ order; __init__ fills a record through these."""
+    return tuple(cls.__dict__[name].__set__ for name in cls.__slots__)
+
+class Record(Mapping):
+    """Read-only mapping view over a record's _fields."""
+
+    __slots__ = ()
+    _fields = ()
+
+    @classmethod
+    def from_row(cls, cursor, row: tuple) -> 'Record':
+        """sqlite3 row factory: build a record from a row selected in constructor argument order."""
+        return cls(*row)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only; use dict(record) for a mutable copy")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{key}={self[key]!r}' for key in self._fields)})"
+
+    def to_dict(self) -> Dict:
+        """A plain dict of the record's fields, e.g. for JSON."""
+        return {key: getattr(self, key) for key in self._fields}
+
+class Book(Record):
+    """One row of the books table."""
+
+    __slots__ = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+    _fields = __slots__
+
+    def __init__(self, id: int, title: str, author: str, isbn: str, total_copies: int, available_copies: int):
+        set_id, set_title, set_author, set_isbn, set_total, set_available = _BOOK_SETTERS
+        set_id(self, id)
+        set_title(self, title)
+        set_author(self, author)
+        set_isbn(self, isbn)
+        set_total(self, total_copies)
+        set_available(self, available_copies)
+
+_BOOK_SETTERS = _slot_setters(Book)
+
+class Loan(Record):
+    """
+    One borrow_records row joined with its book's title and author.
+
+    Args:
+        borrow_date, due_date, return_date: ISO timestamps as stored;
+            return_date is None while the book is still out
+    """
+
+    __slots__ = ('book_id', 'title', 'author', '_borrow_date', '_due_date', '_return_date')
+    _fields = ('book_id', 'title', 'author', 'borrow_date', 'due_date', 'return_date', 'is_overdue')
+
+    def __init__(self, book_id: int, title: str, author: str, borrow_date: str, due_date: str,
+                 return_date: Optional[str] = None):
+        set_book_id, set_title, set_author, set_borrow, set_due, set_return = _LOAN_SETTERS
+        set_book_id(self, book_id)
+        set_title(self, title)
+        set_author(self, author)
+        set_borrow(self, borrow_date)
+        set_due(self, due_date)
+        set_return(self, return_date)
+
+    @property
+    def borrow_date(self) -> datetime:
+        return datetime.fromisoformat(self._borrow_date)
+
+    @property
+    def due_date(self) -> datetime:
+        return datetime.fromisoformat(self._due_date)
+
+    @property
+    def return_date(self) -> Optional[datetime]:
+        return None if self._return_date is None else datetime.fromisoformat(self._return_date)
+
+    @property
+    def is_overdue(self) -> bool:
+        """Past due now for a current loan; returned after the due date for a returned one."""
+        if self._return_date is None:
+            return datetime.now() > self.due_date
+        return self.return_date.date() > self.due_date.date()
+
+_LOAN_SETTERS = _slot_setters(Loan)
@@ -2,12 +2,81 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from library_service import calculate_late_fee_for_book, search_books_in_catalog
+import csv
+import io
+import json
+
+from flask import Blueprint, Response, jsonify, request, url_for
+from database import (
+    get_books_page, iter_book_batches, get_fee_payment_items, BOOK_COLUMNS, DEFAULT_PAGE_SIZE, EXPORT_BATCH_SIZE
+)
+from library_service import calculate_late_fee_for_book, pay_all_late_fees, search_books_in_catalog
+from services.payment_outbox import enqueue_late_fee_payment, enqueue_late_fee_refund, get_payment_status
+from .conditional import conditional_get, catalog_version, loan_version
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+@api_bp.route('/books')
+def list_books_api():
+    """
+    List the catalog one page at a time.
+    Follow next_cursor (as ?after=) until it is null to walk the whole catalog.
+    """
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    
+    try:
+        books, next_cursor, prev_cursor = get_books_page(
+            limit, after=request.args.get('after'), before=request.args.get('before')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'books': books,
+        'count': len(books),
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    })
+
+@api_bp.route('/catalog/export')
+def export_catalog_api():
+    """
+    Stream the whole catalog as NDJSON (default) or CSV.
+    Rows are read and written one batch at a time, so memory use stays flat.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    batch_size = max(1, min(request.args.get('batch_size', EXPORT_BATCH_SIZE, type=int), 10000))
+    
+    if export_format == 'ndjson':
+        def generate():
+            for batch in iter_book_batches(batch_size):
+                yield ''.join(
+                    json.dumps(dict(zip(BOOK_COLUMNS, row)), ensure_ascii=False) + '\n' for row in batch
+                )
+        mimetype = 'application/x-ndjson'
+    elif export_format == 'csv':
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(BOOK_COLUMNS)
+            for batch in iter_book_batches(batch_size):
+                writer.writerows(batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()  # header only, for an empty catalog
+        mimetype = 'text/csv'
+    else:
+        return jsonify({'error': 'Invalid format. Must be one of: ndjson, csv'}), 400
+    
+    return Response(
+        generate(),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=catalog.{export_format}'}
+    )
+
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
+@conditional_get(loan_version)
 def get_late_fee(patron_id, book_id):
     """
     Calculate late fee for a specific book borrowed by a patron.
@@ -16,7 +85,72 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+@api_bp.route('/late_fees/<patron_id>/pay', methods=['POST'])
+def pay_all_late_fees_api(patron_id):
+    """
+    Pay all of a patron's outstanding late fees in one charge.
+    The response lists how the payment splits across books.
+    """
+    success, message, transaction_id = pay_all_late_fees(patron_id)
+    if not success:
+        return jsonify({'success': False, 'message': message}), 400
+    
+    items = get_fee_payment_items(transaction_id)
+    return jsonify({
+        'success': True,
+        'message': message,
+        'transaction_id': transaction_id,
+        'total': sum(item['amount_cents'] for item in items) / 100,
+        'items': [{'book_id': item['book_id'], 'amount': item['amount_cents'] / 100} for item in items]
+    })
+
+@api_bp.route('/late_fees/<patron_id>/<int:book_id>/pay', methods=['POST'])
+def queue_late_fee_payment_api(patron_id, book_id):
+    """
+    Queue the late fee payment for one book and return at once.
+    Poll the Location URL until the status is succeeded, failed or review (outcome unknown).
+    An Idempotency-Key header makes retries of the same request queue one payment.
+    """
+    success, message, payment_id = enqueue_late_fee_payment(
+        patron_id, book_id, request.headers.get('Idempotency-Key')
+    )
+    return _queued_response(success, message, payment_id)
+
+@api_bp.route('/payments/refunds', methods=['POST'])
+def queue_refund_api():
+    """
+    Queue a late fee refund.
+    JSON body: transaction_id, amount and optionally book_id (for a combined payment).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        amount = float(data.get('amount', 0))
+        book_id = int(data['book_id']) if data.get('book_id') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid amount or book ID.'}), 400
+    
+    success, message, payment_id = enqueue_late_fee_refund(
+        str(data.get('transaction_id', '')), amount, book_id, request.headers.get('Idempotency-Key')
+    )
+    return _queued_response(success, message, payment_id)
+
+def _queued_response(success, message, payment_id):
+    if not success:
+        return jsonify({'success': False, 'message': message}), 400
+    status_url = url_for('api.payment_status_api', payment_id=payment_id)
+    return jsonify({'success': True, 'message': message, 'payment_id': payment_id, 'status_url': status_url}), \
+        202, {'Location': status_url}
+
+@api_bp.route('/payments/<int:payment_id>')
+def payment_status_api(payment_id):
+    """Poll a queued payment or refund."""
+    status = get_payment_status(payment_id)
+    if status is None:
+        return jsonify({'error': 'Payment not found'}), 404
+    return jsonify(status)
+
 @api_bp.route('/search')
+@conditional_get(catalog_version)
 def search_books_api():
     """
     Search for books via API endpoint.
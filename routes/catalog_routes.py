@@ -2,25 +2,60 @@
 Catalog Routes - Book catalog related endpoints
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
+from database import get_books_page, DEFAULT_PAGE_SIZE
 from library_service import add_book_to_catalog
+from .conditional import conditional_get, catalog_version
 
 catalog_bp = Blueprint('catalog', __name__)
 
+# Everything a catalog row shows; a change to any of them re-renders the row
+ROW_FIELDS = ('id', 'title', 'author', 'isbn', 'available_copies', 'total_copies')
+
 @catalog_bp.route('/')
 def index():
     """Home page redirects to catalog."""
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@conditional_get(catalog_version)
 def catalog():
     """
-    Display all books in the catalog.
+    Display the catalog one page at a time.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
+    
+    try:
+        books, next_cursor, prev_cursor = get_books_page(limit, after=after, before=before)
+    except ValueError:
+        flash('Invalid page link. Showing the first page.', 'error')
+        books, next_cursor, prev_cursor = get_books_page(limit)
+    
+    return render_template('catalog.html', books=books, limit=limit,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor, render_row=row_renderer())
+
+def row_renderer():
+    """
+    Get a function that renders one catalog row through the app's fragment cache.
+    
+    Returns:
+        callable: book dict -> row HTML, or None when CATALOG_ROW_CACHE_SIZE
+                  is 0 (catalog.html then renders rows inline)
+    """
+    cache = current_app.extensions.get('catalog_row_fragments')
+    if cache is None:
+        return None
+    catalog_row = current_app.jinja_env.get_template('_catalog_row.html').module.catalog_row
+    # Part of the key: it depends on where the app is mounted
+    borrow_url = url_for('borrowing.borrow_book')
+    
+    def render_row(book):
+        key = (borrow_url,) + tuple(book[field] for field in ROW_FIELDS)
+        return cache.get_or_render(key, lambda: catalog_row(book, borrow_url))
+    return render_row
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
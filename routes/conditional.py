@@ -0,0 +1,93 @@
+"""
+Conditional GET support - ETags derived from the database version counters
+
+A view wrapped with @conditional_get(version) answers a request whose
+If-None-Match matches the current ETag with 304 Not Modified, before the view
+runs any query or renders any template. The ETag is built from the request's
+path and query string, the deployed code (app_version()) and the version
+function's value (e.g. the catalog_version counter), which is read before the
+view runs: a write landing in between makes the body newer than its ETag,
+which only costs the client one extra full response later.
+"""
+
+import hashlib
+import os
+from datetime import date
+from functools import wraps
+from typing import Callable, Optional
+
+from flask import Response, current_app, make_response, request, session
+from database import get_catalog_version, get_loan_version
+
+# Clients may store the response but must revalidate it on every use
+CACHE_CONTROL = 'no-cache'
+
+# Directories (relative to the app root) whose .py and .html files make up app_version()
+SOURCE_DIRS = ('.', 'routes', 'services', 'templates')
+
+def app_version() -> str:
+    """
+    Identify the deployed code and templates, so a deploy changes every ETag.
+    
+    APP_VERSION from the config when set (e.g. a release tag); otherwise a
+    digest of the source files, computed once per app.
+    """
+    app = current_app
+    version = app.config.get('APP_VERSION') or app.extensions.get('app_version')
+    if version is None:
+        digest = hashlib.sha1()
+        for directory in SOURCE_DIRS:
+            path = os.path.join(app.root_path, directory)
+            for name in sorted(os.listdir(path)) if os.path.isdir(path) else ():
+                if name.endswith(('.py', '.html')):
+                    digest.update(f'{directory}/{name}\0'.encode('utf-8'))
+                    with open(os.path.join(path, name), 'rb') as f:
+                        digest.update(f.read())
+        version = app.extensions['app_version'] = digest.hexdigest()[:12]
+    return version
+
+def conditional_get(version: Callable[..., Optional[tuple]]):
+    """
+    Decorate a GET view with ETag / If-None-Match handling.
+
+    Args:
+        version: Called with the view's arguments; returns a tuple that changes
+            whenever the response would, or None to skip conditional handling
+            (e.g. on a schema without the version counters)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # A pending flash message is shown by this response only, so it cannot be cached
+            if session.get('_flashes'):
+                response = make_response(view(*args, **kwargs))
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+
+            current = version(*args, **kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+            key = (app_version(), request.full_path, current)
+            etag = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            return response
+        return wrapper
+    return decorator
+
+def catalog_version(*args, **kwargs) -> Optional[tuple]:
+    """Version of anything computed from the books table alone."""
+    version = get_catalog_version()
+    return None if version is None else ('catalog', version)
+
+def loan_version(*args, **kwargs) -> Optional[tuple]:
+    """Version of anything computed from loans and today's date (late fees grow daily)."""
+    version = get_loan_version()
+    return None if version is None else ('loans', version, date.today().isoformat())
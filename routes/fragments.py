@@ -0,0 +1,64 @@
+"""
+Fragment cache - rendered template snippets reused across requests
+
+Rendering a catalog page runs every row through Jinja, although most rows
+look exactly as they did on the previous request. FragmentCache keeps the
+rendered HTML of each row keyed by everything the row shows, so a row is
+re-rendered only after its data changes; stale keys simply age out of the LRU.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+from markupsafe import Markup
+
+DEFAULT_FRAGMENT_CACHE_SIZE = 10000
+
+class FragmentCache:
+    """
+    Thread-safe LRU of rendered fragments.
+
+    Args:
+        max_entries: Fragments kept; the least recently used goes first
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()  # key -> Markup
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(('hits', 'misses', 'evictions'), 0)
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> Markup:
+        """Return the fragment stored under key, rendering and storing it on a miss."""
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self._stats['hits'] += 1
+                return fragment
+            self._stats['misses'] += 1
+
+        # Render outside the lock; two threads may both render the same row, which is harmless
+        fragment = Markup(render())
+        with self._lock:
+            self._fragments[key] = fragment
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+                self._stats['evictions'] += 1
+        return fragment
+
+    def clear(self) -> None:
+        """Drop every fragment (e.g. after a template change)."""
+        with self._lock:
+            self._fragments.clear()
+
+    def stats(self) -> Dict:
+        """Hits, misses, evictions, hit_rate and entries."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._fragments)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
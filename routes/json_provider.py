@@ -0,0 +1,20 @@
+"""
+JSON provider - serializes Book and Loan records as JSON objects
+
+The read helpers return records.Record objects rather than dicts; jsonify()
+and the tojson template filter only know dicts, lists and a few other types,
+so this provider turns a record into a dict of its fields first.
+"""
+
+from flask.json.provider import DefaultJSONProvider
+from records import Record
+
+def _default(o):
+    if isinstance(o, Record):
+        return o.to_dict()
+    return DefaultJSONProvider.default(o)
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Flask's default JSON provider, plus records."""
+
+    default = staticmethod(_default)
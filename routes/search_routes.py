@@ -4,10 +4,12 @@ Search Routes - Book search functionality
 
 from flask import Blueprint, render_template, request, flash
 from library_service import search_books_in_catalog
+from .conditional import conditional_get, catalog_version
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@conditional_get(catalog_version)
 def search_books():
     """
     Search for books in the catalog.
@@ -0,0 +1,188 @@
+"""
+Catalog Import Module - Bulk loading of books from CSV or NDJSON files
+
+Rows are validated with the same rules as add_book_to_catalog, de-duplicated by
+ISBN against the catalog and the file itself, and inserted in chunked
+transactions. Progress is reported after every committed chunk so an
+interrupted import can be resumed from its checkpoint.
+
+Command line usage (from the repository root):
+    python -m services.catalog_import books.csv [--chunk-size 5000] [--resume] [--database library.db]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from database import get_all_isbns, insert_books
+from services.library_service import validate_book_fields
+
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_FIELDS = ('title', 'author', 'isbn', 'total_copies')
+
+def read_csv_rows(path: str) -> Iterator[Dict]:
+    """Yield rows of a CSV file with a title,author,isbn,total_copies header."""
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+def read_ndjson_rows(path: str) -> Iterator[Dict]:
+    """Yield one dict per line of a newline-delimited JSON file. Blank lines are skipped."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else {}
+
+def read_rows(path: str) -> Iterator[Dict]:
+    """Pick the reader from the file extension (.csv, .ndjson or .jsonl)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return read_csv_rows(path)
+    if extension in ('.ndjson', '.jsonl'):
+        return read_ndjson_rows(path)
+    raise ValueError("Unsupported import file type. Must be .csv, .ndjson or .jsonl")
+
+def _parse_copies(value) -> Optional[int]:
+    """An int, or a string of digits, as an int; None for anything else (floats, bools, '2.5', 'true')."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+def _parse_row(row: Dict):
+    """Turn a raw row into an insert tuple, or return an error message."""
+    if not row:
+        return None, "Row could not be parsed."
+    title = str(row.get('title') or '')
+    author = str(row.get('author') or '')
+    # As in add_book_to_catalog: the ISBN is used as given, so padded values are rejected
+    isbn = row.get('isbn')
+    if not isinstance(isbn, str):
+        return None, "ISBN must be exactly 13 digits."
+    total_copies = _parse_copies(row.get('total_copies'))
+    if total_copies is None:
+        return None, "Total copies must be a positive integer."
+
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return None, error
+    return (title.strip(), author.strip(), isbn, total_copies, total_copies), None
+
+def import_books(rows: Iterable[Dict], chunk_size: int = IMPORT_CHUNK_SIZE, skip_rows: int = 0,
+                 on_chunk: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Bulk insert books, one transaction per chunk.
+    
+    Args:
+        rows: Dicts with title, author, isbn and total_copies
+        chunk_size: Valid rows per executemany/commit
+        skip_rows: Source rows already imported by an earlier run (resume point)
+        on_chunk: Called with the running report after each commit
+        
+    Returns:
+        dict: rows_read, inserted, duplicates, errors [(row_number, message)],
+              last_row (rows committed so far), elapsed_seconds, rows_per_second
+    """
+    report = {
+        'rows_read': 0,
+        'inserted': 0,
+        'duplicates': 0,
+        'errors': [],
+        'last_row': skip_rows,
+        'elapsed_seconds': 0.0,
+        'rows_per_second': 0.0,
+    }
+    seen_isbns = get_all_isbns()
+    pending = []
+    started = time.perf_counter()
+
+    def flush(row_number: int) -> None:
+        if pending:
+            inserted = insert_books(pending)
+            report['inserted'] += inserted
+            # Rows another writer inserted since we loaded the ISBN set
+            report['duplicates'] += len(pending) - inserted
+            pending.clear()
+        report['last_row'] = row_number
+        report['elapsed_seconds'] = time.perf_counter() - started
+        if report['elapsed_seconds'] > 0:
+            report['rows_per_second'] = report['rows_read'] / report['elapsed_seconds']
+        if on_chunk:
+            on_chunk(report)
+
+    row_number = 0
+    for row_number, row in enumerate(rows, start=1):
+        if row_number <= skip_rows:
+            continue
+        report['rows_read'] += 1
+
+        book, error = _parse_row(row)
+        if error:
+            report['errors'].append((row_number, error))
+            continue
+        if book[2] in seen_isbns:
+            report['duplicates'] += 1
+            continue
+        seen_isbns.add(book[2])
+        pending.append(book)
+
+        if len(pending) >= chunk_size:
+            flush(row_number)
+
+    flush(max(row_number, skip_rows))
+    return report
+
+def _checkpoint_path(path: str) -> str:
+    return path + '.checkpoint'
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Bulk import books from a CSV or NDJSON file.')
+    parser.add_argument('path', help='.csv (with header) or .ndjson/.jsonl file')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument('--resume', action='store_true', help='continue after the last checkpoint')
+    parser.add_argument('--database', help='SQLite file to import into (default: library.db)')
+    args = parser.parse_args(argv)
+
+    from database import configure_pool, init_database
+    if args.database:
+        configure_pool(args.database)
+    init_database()
+
+    checkpoint = _checkpoint_path(args.path)
+    skip_rows = 0
+    if args.resume and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            skip_rows = int(f.read().strip() or 0)
+        print(f"Resuming after row {skip_rows:,}")
+
+    def save_progress(report: Dict) -> None:
+        with open(checkpoint, 'w') as f:
+            f.write(str(report['last_row']))
+        print(f"row {report['last_row']:,}: {report['inserted']:,} inserted, "
+              f"{report['rows_per_second']:,.0f} rows/s", file=sys.stderr)
+
+    try:
+        report = import_books(read_rows(args.path), args.chunk_size, skip_rows, save_progress)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    for row_number, message in report['errors']:
+        print(f"row {row_number}: {message}")
+    print(f"Imported {report['inserted']:,} books, skipped {report['duplicates']:,} duplicates, "
+          f"{len(report['errors']):,} errors in {report['elapsed_seconds']:.1f}s "
+          f"({report['rows_per_second']:,.0f} rows/s)")
+    os.remove(checkpoint)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Fee Engine Module - Library-wide late fee runs
+
+Computes the R5 late fee for every open loan at once with NumPy array
+operations, for daily overdue notices and collections. Amounts are worked out
+in integer cents, so every per-loan fee matches compute_late_fee() exactly.
+"""
+
+from datetime import date, datetime
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from database import get_active_loan_due_dates
+from services.library_service import (
+    LATE_FEE_FIRST_TIER_DAYS, LATE_FEE_FIRST_TIER_RATE, LATE_FEE_SECOND_TIER_RATE, LATE_FEE_MAX
+)
+
+FIRST_TIER_CENTS = round(LATE_FEE_FIRST_TIER_RATE * 100)
+SECOND_TIER_CENTS = round(LATE_FEE_SECOND_TIER_RATE * 100)
+MAX_FEE_CENTS = round(LATE_FEE_MAX * 100)
+
+# One record per open loan, built straight from the query's row tuples
+LOAN_DTYPE = np.dtype([('patron_id', 'U16'), ('book_id', np.int64), ('due_date', 'datetime64[D]')])
+
+def fee_cents_for_days(days_overdue: np.ndarray) -> np.ndarray:
+    """Apply the tiered fee rule to an array of days overdue (negative means not due yet)."""
+    days = np.maximum(days_overdue, 0)
+    first_tier = np.minimum(days, LATE_FEE_FIRST_TIER_DAYS)
+    second_tier = np.maximum(days - LATE_FEE_FIRST_TIER_DAYS, 0)
+    return np.minimum(first_tier * FIRST_TIER_CENTS + second_tier * SECOND_TIER_CENTS, MAX_FEE_CENTS)
+
+def compute_loan_fees(as_of: Optional[Union[date, datetime]] = None) -> Dict[str, np.ndarray]:
+    """
+    Compute days overdue and fee for every open loan.
+    
+    Args:
+        as_of: Day to measure lateness at (defaults to today)
+        
+    Returns:
+        dict of equal-length arrays: patron_id, book_id, days_overdue, fee_cents
+    """
+    as_of = as_of or datetime.now()
+    if isinstance(as_of, datetime):
+        as_of = as_of.date()
+
+    rows = get_active_loan_due_dates()
+    loans = np.fromiter(rows, dtype=LOAN_DTYPE, count=len(rows))
+    days_overdue = np.maximum((np.datetime64(as_of, 'D') - loans['due_date']).astype(np.int64), 0)
+    return {
+        'patron_id': loans['patron_id'],
+        'book_id': loans['book_id'],
+        'days_overdue': days_overdue,
+        'fee_cents': fee_cents_for_days(days_overdue),
+    }
+
+def compute_patron_fee_totals(as_of: Optional[Union[date, datetime]] = None) -> Dict:
+    """
+    Run the late fee calculation over the whole library and total it per patron.
+    
+    Returns:
+        dict: loans_scanned, overdue_loans, total_fees, and patrons mapping each
+              patron with an overdue loan to fee_amount, overdue_loans and
+              max_days_overdue
+    """
+    loans = compute_loan_fees(as_of)
+    overdue = loans['days_overdue'] > 0
+
+    patrons, inverse = np.unique(loans['patron_id'][overdue], return_inverse=True)
+    fee_cents = np.bincount(inverse, weights=loans['fee_cents'][overdue], minlength=len(patrons))
+    overdue_counts = np.bincount(inverse, minlength=len(patrons))
+    max_days = np.zeros(len(patrons), dtype=np.int64)
+    np.maximum.at(max_days, inverse, loans['days_overdue'][overdue])
+
+    return {
+        'loans_scanned': int(len(loans['fee_cents'])),
+        'overdue_loans': int(overdue.sum()),
+        'total_fees': int(loans['fee_cents'].sum()) / 100,
+        'patrons': {
+            str(patron_id): {
+                'fee_amount': int(cents) / 100,
+                'overdue_loans': int(count),
+                'max_days_overdue': int(days),
+            }
+            for patron_id, cents, count, days in zip(patrons, fee_cents, overdue_counts, max_days)
+        },
+    }
@@ -0,0 +1,119 @@
+"""
+Fee Ledger Module - Materialized late fees for overdue loans
+
+The fees table holds the current R5 fee of every overdue open loan, as of the
+day of the last refresh. Once refreshed for today, the fee API and the patron
+status report read fees from it instead of recomputing them from borrow_records.
+
+A fee only changes while its loan is open and below the cap, so an incremental
+refresh recomputes just the loans due since (last refresh - FEE_CAP_DAYS) and
+loans created since the last refresh. Returned loans drop out of the ledger via
+a trigger on borrow_records. Run the refresh daily, e.g. from cron:
+    python -m services.fee_ledger [--full] [--check] [--database library.db]
+"""
+
+import argparse
+import math
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from database import (
+    transaction, get_fee_ledger_state, get_overdue_loans_for_ledger, write_fee_ledger,
+    get_fee_ledger_rows, get_active_loan_due_dates
+)
+from services.library_service import (
+    compute_late_fee, calculate_late_fee_for_book,
+    LATE_FEE_FIRST_TIER_DAYS, LATE_FEE_FIRST_TIER_RATE, LATE_FEE_SECOND_TIER_RATE, LATE_FEE_MAX
+)
+
+# Days overdue at which a fee reaches LATE_FEE_MAX and stops changing
+FEE_CAP_DAYS = LATE_FEE_FIRST_TIER_DAYS + math.ceil(
+    (LATE_FEE_MAX - LATE_FEE_FIRST_TIER_DAYS * LATE_FEE_FIRST_TIER_RATE) / LATE_FEE_SECOND_TIER_RATE
+)
+
+def refresh_fee_ledger(as_of: Optional[datetime] = None, full: bool = False) -> Dict:
+    """
+    Bring the fee ledger up to date.
+    
+    Args:
+        as_of: Moment to price fees at (defaults to now)
+        full: Recompute every open loan instead of only those that can have changed
+        
+    Returns:
+        dict: as_of day, mode ('full' or 'incremental'), loans_priced
+    """
+    as_of = as_of or datetime.now()
+    as_of_day = as_of.date().isoformat()
+
+    # Read and write under one write lock so a loan returned meanwhile cannot
+    # be written back into the ledger
+    with transaction():
+        state = get_fee_ledger_state()
+        if full or state is None or state['as_of'] > as_of_day:
+            full = True
+            loans = get_overdue_loans_for_ledger(as_of_day)
+        else:
+            due_since = date.fromisoformat(state['as_of']) - timedelta(days=FEE_CAP_DAYS)
+            loans = get_overdue_loans_for_ledger(as_of_day, due_since.isoformat(), state['last_record_id'])
+
+        rows = []
+        for record_id, patron_id, book_id, due_date in loans:
+            fee = compute_late_fee(datetime.fromisoformat(due_date), as_of)
+            rows.append((record_id, patron_id, book_id, fee['days_overdue'], round(fee['fee_amount'] * 100)))
+        write_fee_ledger(rows, as_of_day, full)
+
+    return {'as_of': as_of_day, 'mode': 'full' if full else 'incremental', 'loans_priced': len(rows)}
+
+def check_fee_ledger() -> List[Dict]:
+    """
+    Compare the ledger against calculate_late_fee_for_book() for every open loan.
+    
+    Returns:
+        list: one dict (patron_id, book_id, ledger_fee, expected_fee) per loan
+              whose ledger fee is wrong, missing or left over; empty if consistent
+    """
+    ledger = {(patron_id, book_id): fee_cents / 100
+              for patron_id, book_id, _days, fee_cents in get_fee_ledger_rows()}
+
+    mismatches = []
+    for patron_id, book_id, _due in get_active_loan_due_dates():
+        expected = calculate_late_fee_for_book(patron_id, book_id, use_ledger=False)['fee_amount']
+        recorded = ledger.pop((patron_id, book_id), 0.0)
+        if recorded != expected:
+            mismatches.append({'patron_id': patron_id, 'book_id': book_id,
+                               'ledger_fee': recorded, 'expected_fee': expected})
+    # Whatever is left has no open loan behind it
+    for (patron_id, book_id), recorded in ledger.items():
+        mismatches.append({'patron_id': patron_id, 'book_id': book_id,
+                           'ledger_fee': recorded, 'expected_fee': 0.0})
+    return mismatches
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Refresh the materialized late fee ledger.')
+    parser.add_argument('--full', action='store_true', help='recompute every open loan')
+    parser.add_argument('--check', action='store_true', help='verify the ledger after refreshing')
+    parser.add_argument('--database', help='SQLite file to refresh (default: library.db)')
+    args = parser.parse_args(argv)
+
+    from database import configure_pool, init_database
+    if args.database:
+        configure_pool(args.database)
+    init_database()
+
+    result = refresh_fee_ledger(full=args.full)
+    print(f"{result['mode'].capitalize()} refresh as of {result['as_of']}: "
+          f"{result['loans_priced']:,} loans priced")
+
+    if args.check:
+        mismatches = check_fee_ledger()
+        for m in mismatches:
+            print(f"patron {m['patron_id']} book {m['book_id']}: "
+                  f"ledger ${m['ledger_fee']:.2f}, expected ${m['expected_fee']:.2f}")
+        if mismatches:
+            return 1
+        print("Ledger consistent")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
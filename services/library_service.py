@@ -3,14 +3,28 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+import sqlite3
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books, get_patron_borrowed_books
+    update_borrow_record_return_date, get_all_books, get_patron_borrowed_books,
+    get_active_loan, transaction, fulltext_search_available, search_books_fulltext,
+    get_patron_loans, HISTORY_PAGE_SIZE, get_fee_ledger_state, get_ledger_loan_fee, get_ledger_patron_fees,
+    insert_fee_payment_items, get_fee_payment_items, update_fee_payment_refund, get_paid_late_fees,
+    insert_payment, delete_payment, get_payment_balance, get_patron_payments, Book
 )
-from services.payment_service import PaymentGateway
+from services.payment_service import PaymentGateway, AsyncPaymentGateway
+
+# Late fee rules (R5)
+LATE_FEE_FIRST_TIER_DAYS = 7      # days charged at the first-tier rate
+LATE_FEE_FIRST_TIER_RATE = 0.50   # $/day for the first 7 days
+LATE_FEE_SECOND_TIER_RATE = 1.00  # $/day after that
+LATE_FEE_MAX = 15.00              # cap per book
+
+# Returned when a write transaction cannot take the lock (e.g. "database is locked" after busy_timeout)
+BUSY_MESSAGE = "The library is busy, please try again."
 
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
@@ -27,23 +41,9 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
         tuple: (success: bool, message: str)
     """
     # Input validation
-    if not title or not title.strip():
-        return False, "Title is required."
-    
-    if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
-    
-    if not author or not author.strip():
-        return False, "Author is required."
-    
-    if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
-    
-    if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
-    
-    if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -57,6 +57,33 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     else:
         return False, "Database error occurred while adding the book."
 
+def validate_book_fields(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    """
+    Check a new book's fields against the R1 rules.
+    
+    Returns:
+        str: the first validation error message, or None if the fields are valid
+    """
+    if not title or not title.strip():
+        return "Title is required."
+    
+    if len(title.strip()) > 200:
+        return "Title must be less than 200 characters."
+    
+    if not author or not author.strip():
+        return "Author is required."
+    
+    if len(author.strip()) > 100:
+        return "Author must be less than 100 characters."
+    
+    if len(isbn) != 13:
+        return "ISBN must be exactly 13 digits."
+    
+    if not isinstance(total_copies, int) or total_copies <= 0:
+        return "Total copies must be a positive integer."
+    
+    return None
+
 def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Allow a patron to borrow a book.
@@ -73,32 +100,40 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-    
-    if book['available_copies'] <= 0:
-        return False, "This book is currently not available."
-    
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed > 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
-    
-    # Create borrow record
-    borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
-    
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
-        return False, "Database error creating borrow record."
-    
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    # Checks and writes run in one write transaction (one connection, one commit),
+    # so two patrons cannot both take the last copy
+    try:
+        with transaction() as conn:
+            # Check if book exists and is available
+            book = get_book_by_id(book_id)
+            if not book:
+                return False, "Book not found."
+            
+            if book['available_copies'] <= 0:
+                return False, "This book is currently not available."
+            
+            # Check patron's current borrowed books count
+            current_borrowed = get_patron_borrow_count(patron_id)
+            
+            if current_borrowed > 5:
+                return False, "You have reached the maximum borrowing limit of 5 books."
+            
+            # Create borrow record
+            borrow_date = datetime.now()
+            due_date = borrow_date + timedelta(days=14)
+            
+            # Insert borrow record and update availability
+            borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
+            if not borrow_success:
+                conn.rollback()
+                return False, "Database error creating borrow record."
+            
+            availability_success = update_book_availability(book_id, -1)
+            if not availability_success:
+                conn.rollback()
+                return False, "Database error occurred while updating book availability."
+    except sqlite3.OperationalError:
+        return False, BUSY_MESSAGE
     
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
@@ -112,43 +147,54 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
 
-    # Check if book exists
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-
-    # Verify the book is currently borrowed by this patron
-    borrowed_books = get_patron_borrowed_books(patron_id)
-    has_active_loan = any(b.get('book_id') == book_id for b in borrowed_books)
-    if not has_active_loan:
-        return False, "This book is not borrowed by this patron."
+    # Read the loan once, then close it and free the copy in one transaction
+    try:
+        with transaction() as conn:
+            loan = get_active_loan(patron_id, book_id)
+            if not loan:
+                if not get_book_by_id(book_id):
+                    return False, "Book not found."
+                return False, "This book is not borrowed by this patron."
 
-    # Update return date
-    now = datetime.now()
-    if not update_borrow_record_return_date(patron_id, book_id, now):
-        return False, "Database error occurred while updating return date."
+            # Update return date
+            now = datetime.now()
+            if not update_borrow_record_return_date(patron_id, book_id, now):
+                conn.rollback()
+                return False, "Database error occurred while updating return date."
 
-    # Increment available copies
-    if not update_book_availability(book_id, 1):
-        return False, "Database error occurred while updating book availability."
+            # Increment available copies
+            if not update_book_availability(book_id, 1):
+                conn.rollback()
+                return False, "Database error occurred while updating book availability."
+    except sqlite3.OperationalError:
+        return False, BUSY_MESSAGE
 
-    # Calculate late fees
-    fee_info = calculate_late_fee_for_book(patron_id, book_id)
+    # Calculate late fees from the loan row we already hold; the loan is closed
+    # now, so looking it up again would find nothing
+    fee_info = compute_late_fee(loan['due_date'], now)
     fee_amount = fee_info.get('fee_amount', 0.0)
     days_overdue = fee_info.get('days_overdue', 0)
 
     message = (
-        f"Returned \"{book['title']}\". "
+        f"Returned \"{loan['title']}\". "
         f"Late fee: ${fee_amount:.2f} for {days_overdue} days overdue."
     )
 
     return True, message
 
-def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
+def fee_ledger_is_current() -> bool:
+    """Whether the materialized fee ledger was refreshed today (see services.fee_ledger)."""
+    state = get_fee_ledger_state()
+    return state is not None and state['as_of'] == datetime.now().date().isoformat()
+
+def calculate_late_fee_for_book(patron_id: str, book_id: int, use_ledger: bool = True) -> Dict:
     """
     Calculate late fees for a specific book.
     
     Implements R5 as per requirements
+    
+    Reads the fee ledger when it is current; otherwise, or for a loan created
+    since the last refresh, computes the fee from the loan's due date.
     """
     # Validate patron ID
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
@@ -158,6 +204,23 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
             'status': 'invalid_patron_id'
         }
 
+    if use_ledger and fee_ledger_is_current():
+        ledger_fee = get_ledger_loan_fee(patron_id, book_id)
+        if not ledger_fee:
+            return {
+                'fee_amount': 0.0,
+                'days_overdue': 0,
+                'status': 'no_active_loan'
+            }
+        if ledger_fee['fee_cents'] is None:
+            # Loan created since the last refresh (e.g. back-dated); the ledger has not priced it
+            return compute_late_fee(datetime.fromisoformat(ledger_fee['due_date']))
+        return {
+            'fee_amount': ledger_fee['fee_cents'] / 100,
+            'days_overdue': ledger_fee['days_overdue'],
+            'status': 'ok'
+        }
+
     # Determine if there is an active loan for this book
     borrowed = get_patron_borrowed_books(patron_id)
     active = next((b for b in borrowed if b.get('book_id') == book_id), None)
@@ -168,8 +231,20 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
             'status': 'no_active_loan'
         }
 
-    due_date = active.get('due_date')
-    now = datetime.now()
+    return compute_late_fee(active.get('due_date'))
+
+def compute_late_fee(due_date: datetime, as_of: Optional[datetime] = None) -> Dict:
+    """
+    Apply the late fee rules to a single due date.
+    
+    Args:
+        due_date: When the book was due
+        as_of: Moment to measure lateness at (defaults to now)
+        
+    Returns:
+        dict: fee_amount, days_overdue and status ('ok')
+    """
+    now = as_of or datetime.now()
     days_overdue = (now.date() - due_date.date()).days
     if days_overdue < 0:
         days_overdue = 0
@@ -178,10 +253,10 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     # - $0.50/day for first 7 days
     # - $1.00/day for each additional day after 7
     # - Max $15.00 per book
-    first_tier_days = min(days_overdue, 7)
-    second_tier_days = max(days_overdue - 7, 0)
-    fee_amount = first_tier_days * 0.50 + second_tier_days * 1.00
-    fee_amount = min(fee_amount, 15.00)
+    first_tier_days = min(days_overdue, LATE_FEE_FIRST_TIER_DAYS)
+    second_tier_days = max(days_overdue - LATE_FEE_FIRST_TIER_DAYS, 0)
+    fee_amount = first_tier_days * LATE_FEE_FIRST_TIER_RATE + second_tier_days * LATE_FEE_SECOND_TIER_RATE
+    fee_amount = min(fee_amount, LATE_FEE_MAX)
 
     return {
         'fee_amount': round(float(fee_amount), 2),
@@ -189,11 +264,20 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
         'status': 'ok'
     }
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+# Shortest term the trigram index can match; shorter terms use the substring scan
+FULLTEXT_MIN_TERM_LENGTH = 3
+
+def search_books_in_catalog(search_term: str, search_type: str, mode: str = "auto") -> List[Book]:
     """
     Search for books in the catalog.
     
     Implements R6 as per requirements
+    
+    Args:
+        search_term: Text to search for
+        search_type: 'title', 'author' or 'isbn'
+        mode: 'auto' uses the full-text index when it exists and the term is long
+              enough, 'fulltext' requires the index, 'substring' always scans
     """
     if not search_term:
         return []
@@ -202,12 +286,23 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     if search_type not in {"title", "author", "isbn"}:
         raise ValueError("Invalid search type. Must be one of: title, author, isbn")
 
+    if mode not in {"auto", "fulltext", "substring"}:
+        raise ValueError("Invalid search mode. Must be one of: auto, fulltext, substring")
+
     if search_type == "isbn":
         # Exact match only
         book = get_book_by_isbn(search_term)
         return [book] if book else []
 
-    # For title/author: partial, case-insensitive against all books
+    # For title/author: ranked index lookup instead of loading the whole catalog
+    if mode == "fulltext" or (
+        mode == "auto"
+        and len(search_term) >= FULLTEXT_MIN_TERM_LENGTH
+        and fulltext_search_available()
+    ):
+        return search_books_fulltext(search_term, search_type)
+
+    # Fallback: partial, case-insensitive against all books
     books = get_all_books()
     needle = search_term.lower()
     if search_type == "title":
@@ -215,34 +310,81 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     else:
         return [b for b in books if b.get("author", "").lower().find(needle) != -1]
 
-def get_patron_status_report(patron_id: str) -> Dict:
+# Most recent payments and refunds shown on the status report
+PAYMENT_HISTORY_LIMIT = 10
+
+def get_patron_status_report(patron_id: str, history_limit: int = HISTORY_PAGE_SIZE,
+                             history_offset: int = 0) -> Dict:
     """
     Get status report for a patron.
     
     Implements R7 as per requirements
+    
+    Current loans and one page of borrowing history come from a single query.
+    Late fees on current loans come from the fee ledger when it is current,
+    otherwise they are computed in one pass over those rows. Recent payments
+    and refunds come from the local payments table.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        history_limit: Returned loans per history page
+        history_offset: Returned loans to skip (for later pages)
     """
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return {"status": "invalid_patron_id"}
 
-    # Current borrows
-    current_borrows = get_patron_borrowed_books(patron_id)
+    current_borrows, history, history_has_more = get_patron_loans(
+        patron_id, history_limit, history_offset
+    )
 
-    # Compute total late fees by summing per-book fees
+    # Compute total late fees by summing per-book fees; the loans are read-only
+    # records, so each report entry is a dict copy with the fee added
+    now = datetime.now()
     total_fees = 0.0
+    ledger_fees = get_ledger_patron_fees(patron_id) if current_borrows and fee_ledger_is_current() else None
+    current_borrows = [dict(loan) for loan in current_borrows]
     for entry in current_borrows:
-        fee_info = calculate_late_fee_for_book(patron_id, entry.get("book_id"))
-        total_fees += float(fee_info.get("fee_amount", 0.0))
+        if ledger_fees is not None and entry["book_id"] in ledger_fees:
+            entry["fee_amount"] = ledger_fees[entry["book_id"]] / 100
+        else:
+            entry["fee_amount"] = compute_late_fee(entry["due_date"], now)["fee_amount"]
+        total_fees += entry["fee_amount"]
+
+    # Fee each returned loan was charged, as of its return date
+    history = [dict(loan) for loan in history]
+    for entry in history:
+        entry["fee_amount"] = compute_late_fee(entry["due_date"], entry["return_date"])["fee_amount"]
+
+    payments = [
+        {
+            "transaction_id": payment["transaction_id"],
+            "kind": payment["kind"],
+            "book_id": payment["book_id"],
+            "amount": payment["amount_cents"] / 100,
+            "description": payment["description"],
+            "created_at": payment["created_at"],
+        }
+        for payment in get_patron_payments(patron_id, PAYMENT_HISTORY_LIMIT)
+    ]
 
     report = {
         "current_borrows": current_borrows,
-        "current_borrow_count": get_patron_borrow_count(patron_id),
+        "current_borrow_count": len(current_borrows),
         "total_late_fees": round(total_fees, 2),
-        "history": [],  # placeholder until a history data source is added
+        "history": history,
+        "history_offset": history_offset,
+        "history_has_more": history_has_more,
+        "payments": payments,
         "status": "ok",
     }
 
     return report
 
+def _unrecorded_payment_message(transaction_id: str, error: Exception) -> str:
+    """Message for a payment the gateway took but the database could not record."""
+    return (f"Payment {transaction_id} went through but could not be recorded: {str(error)}. "
+            f"Quote the transaction ID to the library staff.")
+
 def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
@@ -264,51 +406,230 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         mock_gateway.process_payment.return_value = (True, "txn_123", "Success")
         success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
     """
-    # Validate patron ID
+    error, fee_amount, description = prepare_late_fee_payment(patron_id, book_id)
+    if error:
+        return False, error, None
+    
+    # Use provided gateway or create new one
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+    
+    # Process payment through external gateway
+    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
+    try:
+        success, transaction_id, message = payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=fee_amount,
+            description=description
+        )
+    except Exception as e:
+        # Handle payment gateway errors
+        return False, f"Payment processing error: {str(e)}", None
+    
+    if not success:
+        return False, f"Payment failed: {message}", None
+    
+    try:
+        insert_payment(transaction_id, 'payment', patron_id, round(fee_amount * 100), book_id, description)
+    except sqlite3.Error as e:
+        return False, _unrecorded_payment_message(transaction_id, e), transaction_id
+    return True, f"Payment successful! {message}", transaction_id
+
+def pay_all_late_fees(patron_id: str, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    Pay every outstanding late fee of a patron with one gateway charge.
+    
+    Fees are worked out in one pass over the patron's current loans and charged
+    as a single payment with an itemized description. The per-book split is
+    recorded so refund_late_fee_payment() can refund books individually.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        payment_gateway: Payment gateway instance (injectable for testing)
+        
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str])
+    """
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits.", None
     
+    items = get_outstanding_late_fees(patron_id)
+    if not items:
+        return False, "No late fees to pay.", None
+    
+    total_cents = sum(item['fee_cents'] for item in items)
+    description = f"Late fees for {len(items)} book{'s' if len(items) != 1 else ''}: " + "; ".join(
+        f"'{item['title']}' ${item['fee_cents'] / 100:.2f}" for item in items
+    )
+    
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+    
+    try:
+        success, transaction_id, message = payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=total_cents / 100,
+            description=description
+        )
+    except Exception as e:
+        return False, f"Payment processing error: {str(e)}", None
+    
+    if not success:
+        return False, f"Payment failed: {message}", None
+    
+    try:
+        with transaction():
+            insert_payment(transaction_id, 'payment', patron_id, total_cents, description=description)
+            insert_fee_payment_items(
+                transaction_id, patron_id, [(item['book_id'], item['fee_cents']) for item in items], datetime.now()
+            )
+    except sqlite3.Error as e:
+        return False, _unrecorded_payment_message(transaction_id, e), transaction_id
+    return True, f"Payment successful! {message}", transaction_id
+
+def get_outstanding_late_fees(patron_id: str) -> List[Dict]:
+    """
+    Get the late fee still owed on each of a patron's current loans, in one pass.
+    
+    What earlier pay_all_late_fees() and pay_late_fees() payments covered (net
+    of refunds) is subtracted, so paying twice in a row charges nothing the
+    second time.
+    
+    Returns:
+        list: book_id, title and fee_cents for every loan with a fee, in borrow order
+    """
+    borrowed = get_patron_borrowed_books(patron_id)
+    ledger_fees = get_ledger_patron_fees(patron_id) if borrowed and fee_ledger_is_current() else None
+    paid = get_paid_late_fees(patron_id) if borrowed else {}
+    now = datetime.now()
+    
+    items = []
+    for loan in borrowed:
+        if ledger_fees is not None and loan['book_id'] in ledger_fees:
+            fee_cents = ledger_fees[loan['book_id']]
+        else:
+            fee_cents = round(compute_late_fee(loan['due_date'], now)['fee_amount'] * 100)
+        fee_cents -= paid.get(loan['book_id'], 0)
+        if fee_cents > 0:
+            items.append({'book_id': loan['book_id'], 'title': loan['title'], 'fee_cents': fee_cents})
+    return items
+
+def prepare_late_fee_payment(patron_id: str, book_id: int) -> Tuple[Optional[str], float, str]:
+    """
+    Work out what to charge for a book's late fee.
+    
+    Returns:
+        tuple: (error message or None, fee amount, payment description)
+    """
+    # Validate patron ID
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return "Invalid patron ID. Must be exactly 6 digits.", 0.0, ""
+    
     # Calculate late fee first
     fee_info = calculate_late_fee_for_book(patron_id, book_id)
     
     # Check if there's a fee to pay
     if not fee_info or 'fee_amount' not in fee_info:
-        return False, "Unable to calculate late fees.", None
+        return "Unable to calculate late fees.", 0.0, ""
     
-    fee_amount = fee_info.get('fee_amount', 0.0)
+    # Less what earlier payments already covered (net of refunds)
+    fee_cents = round(fee_info.get('fee_amount', 0.0) * 100)
+    if fee_cents > 0:
+        fee_cents -= get_paid_late_fees(patron_id).get(book_id, 0)
     
-    if fee_amount <= 0:
-        return False, "No late fees to pay for this book.", None
+    if fee_cents <= 0:
+        return "No late fees to pay for this book.", 0.0, ""
+    fee_amount = fee_cents / 100
     
     # Get book details for payment description
     book = get_book_by_id(book_id)
     if not book:
-        return False, "Book not found.", None
+        return "Book not found.", 0.0, ""
+    
+    return None, fee_amount, f"Late fees for '{book['title']}'"
+
+async def pay_late_fees_async(patron_id: str, book_id: int,
+                              payment_gateway: AsyncPaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    pay_late_fees() for asyncio callers: awaits the gateway instead of blocking on it.
+    
+    The fee and book lookups are local SQLite reads and run inline.
+    
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str])
+    """
+    error, fee_amount, description = prepare_late_fee_payment(patron_id, book_id)
+    if error:
+        return False, error, None
     
-    # Use provided gateway or create new one
     if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        payment_gateway = AsyncPaymentGateway()
     
-    # Process payment through external gateway
-    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
     try:
-        success, transaction_id, message = payment_gateway.process_payment(
+        success, transaction_id, message = await payment_gateway.process_payment(
             patron_id=patron_id,
             amount=fee_amount,
-            description=f"Late fees for '{book['title']}'"
+            description=description
         )
-        
-        if success:
-            return True, f"Payment successful! {message}", transaction_id
-        else:
-            return False, f"Payment failed: {message}", None
-            
     except Exception as e:
-        # Handle payment gateway errors
         return False, f"Payment processing error: {str(e)}", None
+    
+    if not success:
+        return False, f"Payment failed: {message}", None
+    
+    try:
+        insert_payment(transaction_id, 'payment', patron_id, round(fee_amount * 100), book_id, description)
+    except sqlite3.Error as e:
+        return False, _unrecorded_payment_message(transaction_id, e), transaction_id
+    return True, f"Payment successful! {message}", transaction_id
+
+# Gateway calls in flight at once during a batch collection
+FEE_COLLECTION_CONCURRENCY = 100
+
+async def collect_late_fees(charges: Iterable[Tuple[str, int]],
+                            payment_gateway: AsyncPaymentGateway = None,
+                            max_concurrency: int = FEE_COLLECTION_CONCURRENCY) -> List[Dict]:
+    """
+    Collect late fees for many (patron_id, book_id) loans concurrently.
+    
+    At most max_concurrency payments wait on the gateway at a time, so the batch
+    takes about len(charges) / max_concurrency gateway round trips rather than
+    one per charge.
+    
+    Args:
+        charges: (patron_id, book_id) pairs to collect
+        payment_gateway: Shared gateway instance (injectable for testing)
+        max_concurrency: Upper bound on concurrent gateway calls
+        
+    Returns:
+        list: one dict per charge, in input order: patron_id, book_id, success,
+              message, transaction_id
+    """
+    # asyncio costs more to import than the rest of this module; only batch collection needs it
+    import asyncio
+
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1.")
+    if payment_gateway is None:
+        payment_gateway = AsyncPaymentGateway()
+    limit = asyncio.Semaphore(max_concurrency)
+
+    async def collect(patron_id: str, book_id: int) -> Dict:
+        async with limit:
+            success, message, transaction_id = await pay_late_fees_async(patron_id, book_id, payment_gateway)
+        return {
+            'patron_id': patron_id,
+            'book_id': book_id,
+            'success': success,
+            'message': message,
+            'transaction_id': transaction_id,
+        }
 
+    return list(await asyncio.gather(*(collect(patron_id, book_id) for patron_id, book_id in charges)))
 
-def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
+
+def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None,
+                            book_id: Optional[int] = None) -> Tuple[bool, str]:
     """
     Refund a late fee payment (e.g., if book was returned on time but fees were charged in error).
     
@@ -318,19 +639,15 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         transaction_id: Original transaction ID to refund
         amount: Amount to refund
         payment_gateway: Payment gateway instance (injectable for testing)
+        book_id: Book to refund within a pay_all_late_fees() payment (required
+            for one); the refund may not exceed what is left of that book's share
         
     Returns:
         tuple: (success: bool, message: str)
     """
-    # Validate inputs
-    if not transaction_id or not transaction_id.startswith("txn_"):
-        return False, "Invalid transaction ID."
-    
-    if amount <= 0:
-        return False, "Refund amount must be greater than 0."
-    
-    if amount > 15.00:  # Maximum late fee per book
-        return False, "Refund amount exceeds maximum late fee."
+    error, refund_payment_id = reserve_refund(transaction_id, amount, book_id)
+    if error:
+        return False, error
     
     # Use provided gateway or create new one
     if payment_gateway is None:
@@ -343,8 +660,65 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         
         if success:
             return True, message
-        else:
-            return False, f"Refund failed: {message}"
+        result = (False, f"Refund failed: {message}")
             
     except Exception as e:
-        return False, f"Refund processing error: {str(e)}"
\ No newline at end of file
+        result = (False, f"Refund processing error: {str(e)}")
+    
+    release_refund(transaction_id, amount, book_id, refund_payment_id)
+    return result
+
+def reserve_refund(transaction_id: str, amount: float,
+                   book_id: Optional[int] = None) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Validate a refund request before the gateway is called.
+    
+    A refund of a payment recorded in the payments table is checked against
+    what is left of it with a local lookup, and recorded right away in the same
+    transaction, so two refunds cannot both pass the check. Payments made before
+    the table existed fall back to the per-book maximum and are not recorded.
+    A pay_all_late_fees() payment is refunded one book at a time, and the
+    book's share is reserved as well. The caller gives everything back with release_refund()
+    if the gateway refund fails.
+    
+    Returns:
+        tuple: (error message or None, id of the recorded refund or None)
+    """
+    # Validate inputs
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return "Invalid transaction ID.", None
+    
+    if amount <= 0:
+        return "Refund amount must be greater than 0.", None
+    
+    refund_cents = round(amount * 100)
+    with transaction() as conn:
+        if book_id is not None and not update_fee_payment_refund(transaction_id, book_id, refund_cents):
+            if not any(item['book_id'] == book_id for item in get_fee_payment_items(transaction_id)):
+                return "No late fee was paid for this book in that transaction.", None
+            return "Refund amount exceeds the late fee paid for this book.", None
+        
+        balance = get_payment_balance(transaction_id)
+        if book_id is None and balance is not None and get_fee_payment_items(transaction_id):
+            # Each book's share must know what was refunded, or it would still count as paid
+            return "This payment covers several books; give the book to refund.", None
+        if balance is None and amount > 15.00:  # Maximum late fee per book
+            conn.rollback()
+            return "Refund amount exceeds maximum late fee.", None
+        if balance is not None and refund_cents > balance['paid_cents'] - balance['refunded_cents']:
+            conn.rollback()
+            return "Refund amount exceeds the amount paid.", None
+        
+        if balance is None:
+            return None, None
+        refund_payment_id = insert_payment(transaction_id, 'refund', balance['patron_id'], refund_cents, book_id)
+    return None, refund_payment_id
+
+def release_refund(transaction_id: str, amount: float, book_id: Optional[int],
+                   refund_payment_id: Optional[int]) -> None:
+    """Undo reserve_refund() for a refund the gateway did not carry out."""
+    with transaction():
+        if refund_payment_id is not None:
+            delete_payment(refund_payment_id)
+        if book_id is not None:
+            update_fee_payment_refund(transaction_id, book_id, -round(amount * 100))
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+Payment Outbox Module - Gateway calls queued in SQLite and run by background workers
+
+enqueue_late_fee_payment() and enqueue_late_fee_refund() validate the request,
+store the gateway call in the payment_outbox table and return at once with the
+entry id to poll (GET /api/payments/<id>). PaymentOutboxWorkers drain the table
+against a PaymentGateway:
+
+- a declined payment or refund is final (status 'failed');
+- a gateway exception is retried with exponential backoff, up to max_attempts;
+- a call that timed out after reaching the gateway (GatewayTimeout) may have
+  gone through, so it is not retried but parked for staff to check with the
+  provider (status 'review');
+- an entry whose worker died mid-call is picked up again once its lease expires;
+- a successful call the database cannot record is still marked 'succeeded',
+  so the lease never runs out into a second charge.
+
+Each entry carries an idempotency key, so enqueueing the same intent twice
+(e.g. a double-submitted form) queues one gateway call; enqueueing it again
+after it failed queues a new attempt. The simulated gateway has no
+idempotency parameter of its own, so a worker that dies between a
+successful call and recording it can still charge twice on retry.
+
+Run the workers as their own process (from the repository root):
+    python -m services.payment_outbox [--workers 4] [--database library.db]
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from database import (
+    insert_outbox_entry, get_outbox_entry, get_outbox_entry_by_key, claim_outbox_entries, update_outbox_entry,
+    insert_payment, transaction
+)
+from services.library_service import prepare_late_fee_payment, reserve_refund, release_refund
+from services.payment_resilience import GatewayTimeout
+from services.payment_service import PaymentGateway
+
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BASE_BACKOFF_SECONDS = 1.0
+OUTBOX_MAX_BACKOFF_SECONDS = 300.0
+OUTBOX_LEASE_SECONDS = 60.0  # longer than any single gateway call
+OUTBOX_POLL_SECONDS = 0.5
+
+def enqueue_late_fee_payment(patron_id: str, book_id: int,
+                             idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[int]]:
+    """
+    Queue the late fee payment for a book instead of calling the gateway inline.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book with late fees
+        idempotency_key: Identifies this intent; defaults to one payment per
+            patron, book and day
+
+    Returns:
+        tuple: (success: bool, message: str, outbox entry id: Optional[int])
+    """
+    error, fee_amount, description = prepare_late_fee_payment(patron_id, book_id)
+    if error:
+        return False, error, None
+
+    key = idempotency_key or f"payment:{patron_id}:{book_id}:{datetime.now().date().isoformat()}"
+    entry, created = insert_outbox_entry(
+        key, 'payment', round(fee_amount * 100), patron_id=patron_id, book_id=book_id, description=description
+    )
+    if not created:
+        return True, "Payment already queued.", entry['id']
+    return True, f"Payment of ${fee_amount:.2f} queued.", entry['id']
+
+def enqueue_late_fee_refund(transaction_id: str, amount: float, book_id: Optional[int] = None,
+                            idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[int]]:
+    """
+    Queue a late fee refund instead of calling the gateway inline.
+
+    Validation (and, with book_id, reserving the book's share) happens now, so
+    a refund accepted here can only fail at the gateway.
+
+    Args:
+        idempotency_key: Identifies this intent; defaults to one refund per
+            transaction, book, amount and day, so two genuine refunds of the
+            same amount on one day need their own keys
+
+    Returns:
+        tuple: (success: bool, message: str, outbox entry id: Optional[int])
+    """
+    amount_cents = round(amount * 100)
+    key = idempotency_key or (
+        f"refund:{transaction_id}:{book_id or ''}:{amount_cents}:{datetime.now().date().isoformat()}"
+    )
+    existing = get_outbox_entry_by_key(key)
+    if existing and existing['status'] != 'failed':
+        return True, "Refund already queued.", existing['id']
+
+    error, refund_payment_id = reserve_refund(transaction_id, amount, book_id)
+    if error:
+        return False, error, None
+
+    entry, created = insert_outbox_entry(
+        key, 'refund', amount_cents, book_id=book_id, original_transaction_id=transaction_id,
+        payment_id=refund_payment_id
+    )
+    if not created:
+        # An identical request got in first; its entry holds the reservation
+        release_refund(transaction_id, amount, book_id, refund_payment_id)
+        return True, "Refund already queued.", entry['id']
+    return True, f"Refund of ${amount:.2f} queued.", entry['id']
+
+def get_payment_status(entry_id: int) -> Optional[Dict]:
+    """
+    Get the state of a queued payment or refund for polling.
+
+    Returns:
+        dict: id, kind, status ('pending', 'processing', 'succeeded', 'failed' or 'review'),
+              attempts, amount, message and transaction_id; None if unknown
+    """
+    entry = get_outbox_entry(entry_id)
+    if not entry:
+        return None
+    return {
+        'id': entry['id'],
+        'kind': entry['kind'],
+        'status': entry['status'],
+        'attempts': entry['attempts'],
+        'amount': entry['amount_cents'] / 100,
+        'message': entry['message'],
+        'transaction_id': entry['transaction_id'] or entry['original_transaction_id'],
+    }
+
+class PaymentOutboxWorkers:
+    """
+    Pool of threads that drain the payment outbox against the payment gateway.
+
+    Each thread has its own gateway client (from gateway_factory) and, through
+    the connection pool, its own SQLite connection.
+    """
+
+    def __init__(self, gateway_factory: Callable[[], PaymentGateway] = PaymentGateway, workers: int = 4,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 base_backoff_seconds: float = OUTBOX_BASE_BACKOFF_SECONDS,
+                 max_backoff_seconds: float = OUTBOX_MAX_BACKOFF_SECONDS,
+                 lease_seconds: float = OUTBOX_LEASE_SECONDS,
+                 poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.gateway_factory = gateway_factory
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._stopping = threading.Event()
+        self._threads = []
+        self._local = threading.local()
+
+    def start(self) -> None:
+        """Start the worker threads."""
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'payment-outbox-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Ask the workers to stop after their current entry and wait for them."""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_once(self, limit: int = 1) -> int:
+        """Claim and process up to limit due entries on the calling thread; returns how many."""
+        entries = claim_outbox_entries(limit, time.time(), self.lease_seconds)
+        for entry in entries:
+            self._process(entry)
+        return len(entries)
+
+    def backoff_seconds(self, attempts: int) -> float:
+        """Delay before retrying after the given number of failed attempts, with jitter."""
+        delay = min(self.base_backoff_seconds * 2 ** (attempts - 1), self.max_backoff_seconds)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            if not self.run_once():
+                self._stopping.wait(self.poll_seconds)
+
+    def _gateway(self) -> PaymentGateway:
+        if not hasattr(self._local, 'gateway'):
+            self._local.gateway = self.gateway_factory()
+        return self._local.gateway
+
+    def _process(self, entry: Dict) -> None:
+        gateway = self._gateway()
+        amount = entry['amount_cents'] / 100
+        try:
+            if entry['kind'] == 'payment':
+                success, transaction_id, message = gateway.process_payment(
+                    patron_id=entry['patron_id'],
+                    amount=amount,
+                    description=entry['description']
+                )
+            else:
+                success, message = gateway.refund_payment(entry['original_transaction_id'], amount)
+                transaction_id = None
+        except GatewayTimeout as e:
+            # The provider may still carry the call out; retrying could charge or refund twice.
+            # A refund keeps its reservation until staff settle it.
+            update_outbox_entry(entry['id'], 'review',
+                                f"Outcome unknown, check with the payment provider: {str(e)}")
+            return
+        except Exception as e:
+            if entry['attempts'] < self.max_attempts:
+                update_outbox_entry(entry['id'], 'pending', f"Attempt {entry['attempts']} failed: {str(e)}",
+                                    next_attempt_at=time.time() + self.backoff_seconds(entry['attempts']))
+                return
+            self._fail(entry, f"Gave up after {entry['attempts']} attempts: {str(e)}")
+            return
+
+        if success:
+            try:
+                with transaction():
+                    if entry['kind'] == 'payment':
+                        insert_payment(transaction_id, 'payment', entry['patron_id'], entry['amount_cents'],
+                                       entry['book_id'], entry['description'])
+                    update_outbox_entry(entry['id'], 'succeeded', message, transaction_id)
+            except sqlite3.Error as e:
+                # The gateway has done it; leaving the entry 'processing' would run it again once the
+                # lease expires
+                update_outbox_entry(entry['id'], 'succeeded',
+                                    f"{message} (could not be recorded: {str(e)})", transaction_id)
+        else:
+            # The gateway said no; retrying would get the same answer
+            self._fail(entry, f"{'Payment' if entry['kind'] == 'payment' else 'Refund'} failed: {message}")
+
+    def _fail(self, entry: Dict, message: str) -> None:
+        with transaction():
+            update_outbox_entry(entry['id'], 'failed', message)
+            if entry['kind'] == 'refund':
+                # Give the reserved refund back
+                release_refund(entry['original_transaction_id'], entry['amount_cents'] / 100,
+                               entry['book_id'], entry['payment_id'])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Run payment outbox workers until interrupted.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--database', help='SQLite file to drain (default: library.db)')
+    args = parser.parse_args(argv)
+
+    from database import configure_pool, init_database
+    if args.database:
+        configure_pool(args.database)
+    init_database()
+
+    workers = PaymentOutboxWorkers(workers=args.workers)
+    workers.start()
+    print(f"{args.workers} payment outbox workers running; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        workers.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
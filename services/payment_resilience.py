@@ -0,0 +1,289 @@
+"""
+Payment Resilience Module - Circuit breaker, deadlines, hedging and rate limiting
+
+ResilientPaymentGateway wraps a PaymentGateway and has the same methods and
+return values, so it can be passed anywhere a gateway is accepted
+(pay_late_fees, refund_late_fee_payment, PaymentOutboxWorkers). When the
+provider degrades, calls fail fast with a GatewayUnavailable exception, raised
+before the provider is called, instead of each one waiting out the full latency:
+
+- per-call deadlines, adapted to recently observed latency;
+- a circuit breaker that stops calling the provider after repeated errors
+  and lets a single trial call through once reset_timeout has passed;
+- hedged verify_payment_status reads: a second request goes out if the first
+  is slower than usual, and the first answer wins;
+- a token bucket capping calls per second to the provider.
+
+Declines are normal answers and do not count against the breaker. A call that
+misses its deadline raises GatewayTimeout instead, which is deliberately not a
+GatewayUnavailable: the provider was called and a charge or refund may still
+complete there, so its outcome is unknown. Do not retry it blindly; check it
+with the provider first (PaymentOutboxWorkers park such entries for review).
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Callable, Dict, Optional, Tuple
+
+from services.payment_service import PaymentGateway
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class GatewayUnavailable(Exception):
+    """The call was not made because the gateway is degraded; safe to retry later."""
+
+
+class CircuitOpenError(GatewayUnavailable):
+    """The circuit breaker is open; the gateway was not called."""
+
+
+class GatewayTimeout(Exception):
+    """The gateway did not answer before the call's deadline; the call may still complete there."""
+
+
+class RateLimitExceeded(GatewayUnavailable):
+    """The token bucket is empty; the gateway was not called."""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker.
+
+    Opens after failure_threshold consecutive failures. After reset_timeout
+    seconds it goes half-open and allows one trial call: success closes it,
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.state_changes = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; a half-open breaker admits one at a time."""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self._change(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back an admission from allow() for a call that was not made after all."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                self._change(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                if self.state != OPEN:
+                    self._change(OPEN)
+
+    def _change(self, state: str) -> None:
+        self.state = state
+        self.state_changes += 1
+
+
+class TokenBucket:
+    """Allows rate calls per second on average, with bursts of up to capacity."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available."""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class LatencyTracker:
+    """Recent successful call latencies for one gateway method."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class ResilientPaymentGateway:
+    """
+    PaymentGateway wrapper that fails fast when the provider degrades.
+
+    Args:
+        gateway: The gateway to protect (default: a new PaymentGateway)
+        max_deadline: Longest a call may take, in seconds
+        min_deadline: Shortest deadline the adaptive timeout will pick
+        deadline_multiplier: Deadline as a multiple of the recent p99 latency
+        min_samples: Latency samples needed before deadlines adapt
+        hedge_after: Fixed delay before a hedged verify read; by default the
+            recent p95 verify latency (max_deadline / 4 before there is one)
+        failure_threshold, reset_timeout: Circuit breaker settings
+        rate, burst: Token bucket settings (calls per second, bucket size)
+        max_workers: Threads for calls in flight, including abandoned ones
+        clock: Monotonic clock for the breaker and bucket (injectable for testing)
+    """
+
+    def __init__(self, gateway: Optional[PaymentGateway] = None, max_deadline: float = 2.0,
+                 min_deadline: float = 0.2, deadline_multiplier: float = 3.0, min_samples: int = 20,
+                 hedge_after: Optional[float] = None, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, rate: float = 50.0, burst: float = 100.0,
+                 max_workers: int = 32, clock: Callable[[], float] = time.monotonic):
+        self.gateway = gateway or PaymentGateway()
+        self.max_deadline = max_deadline
+        self.min_deadline = min_deadline
+        self.deadline_multiplier = deadline_multiplier
+        self.min_samples = min_samples
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock)
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.latency = {name: LatencyTracker() for name in
+                        ('process_payment', 'refund_payment', 'verify_payment_status')}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='payment-gateway')
+        self._counters = dict.fromkeys(
+            ('calls', 'successes', 'failures', 'timeouts', 'rejected_open', 'rate_limited',
+             'hedged', 'hedge_wins'), 0
+        )
+        self._lock = threading.Lock()
+
+    def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+        """Process a payment; see PaymentGateway.process_payment."""
+        return self._call('process_payment', patron_id=patron_id, amount=amount, description=description)
+
+    def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """Refund a previous payment; see PaymentGateway.refund_payment."""
+        return self._call('refund_payment', transaction_id, amount)
+
+    def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Check a transaction's status, hedging the read if the first answer is slow."""
+        return self._call('verify_payment_status', transaction_id, hedge=True)
+
+    def deadline(self, method: str) -> float:
+        """Current deadline for a method: a multiple of its recent p99, within [min_deadline, max_deadline]."""
+        tracker = self.latency[method]
+        if len(tracker.samples) < self.min_samples:
+            return self.max_deadline
+        adaptive = tracker.percentile(0.99) * self.deadline_multiplier
+        return min(self.max_deadline, max(self.min_deadline, adaptive))
+
+    def metrics(self) -> Dict:
+        """Counters, breaker state and recent latency percentiles (seconds)."""
+        with self._lock:
+            metrics = dict(self._counters)
+        metrics['circuit_state'] = self.breaker.state
+        metrics['circuit_state_changes'] = self.breaker.state_changes
+        metrics['tokens_available'] = int(self.bucket.tokens)
+        for method, tracker in self.latency.items():
+            metrics[f'{method}_p50'] = tracker.percentile(0.50)
+            metrics[f'{method}_p95'] = tracker.percentile(0.95)
+            metrics[f'{method}_deadline'] = self.deadline(method)
+        return metrics
+
+    def close(self) -> None:
+        """Stop the call threads (without waiting for abandoned calls)."""
+        self._executor.shutdown(wait=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _call(self, method: str, *args, hedge: bool = False, **kwargs):
+        self._count('calls')
+        if not self.breaker.allow():
+            self._count('rejected_open')
+            raise CircuitOpenError("Payment gateway circuit open")
+        if not self.bucket.try_acquire():
+            self.breaker.release()
+            self._count('rate_limited')
+            raise RateLimitExceeded("Payment gateway rate limit reached")
+
+        deadline = self.deadline(method)
+        started = time.perf_counter()
+        try:
+            if hedge:
+                result = self._hedged(method, deadline, args, kwargs)
+            else:
+                future = self._executor.submit(getattr(self.gateway, method), *args, **kwargs)
+                result = future.result(timeout=deadline)
+        except (FutureTimeout, GatewayTimeout):
+            self._count('timeouts')
+            self._count('failures')
+            self.breaker.record_failure()
+            raise GatewayTimeout(f"Payment gateway did not answer within {deadline:.2f}s")
+        except Exception:
+            self._count('failures')
+            self.breaker.record_failure()
+            raise
+
+        self.latency[method].add(time.perf_counter() - started)
+        self._count('successes')
+        self.breaker.record_success()
+        return result
+
+    def _hedged(self, method: str, deadline: float, args, kwargs):
+        call = getattr(self.gateway, method)
+        started = time.perf_counter()
+        primary = self._executor.submit(call, *args, **kwargs)
+
+        hedge_after = self.hedge_after
+        if hedge_after is None:
+            hedge_after = self.latency[method].percentile(0.95) or self.max_deadline / 4
+        done, _ = wait([primary], timeout=min(hedge_after, deadline))
+        if done:
+            return primary.result()
+
+        self._count('hedged')
+        backup = self._executor.submit(call, *args, **kwargs)
+        remaining = deadline - (time.perf_counter() - started)
+        done, _ = wait([primary, backup], timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+        if not done:
+            raise GatewayTimeout()
+        winner = done.pop()
+        if winner is backup:
+            self._count('hedge_wins')
+        return winner.result()
@@ -10,6 +10,51 @@ from typing import Dict, Tuple
 import time
 
 
+def _payment_result(patron_id: str, amount: float) -> Tuple[bool, str, str]:
+    """Simulated gateway decision for a charge."""
+    # For this template, we simulate different scenarios based on amount
+    # This allows testing without a real API
+    
+    if amount <= 0:
+        return False, "", "Invalid amount: must be greater than 0"
+    
+    if amount > 1000:
+        return False, "", "Payment declined: amount exceeds limit"
+    
+    if len(patron_id) != 6:
+        return False, "", "Invalid patron ID format"
+    
+    # Simulate successful payment
+    transaction_id = f"txn_{patron_id}_{int(time.time())}"
+    return True, transaction_id, f"Payment of ${amount:.2f} processed successfully"
+
+
+def _refund_result(transaction_id: str, amount: float) -> Tuple[bool, str]:
+    """Simulated gateway decision for a refund."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return False, "Invalid transaction ID"
+    
+    if amount <= 0:
+        return False, "Invalid refund amount"
+    
+    refund_id = f"refund_{transaction_id}_{int(time.time())}"
+    return True, f"Refund of ${amount:.2f} processed successfully. Refund ID: {refund_id}"
+
+
+def _status_result(transaction_id: str) -> Dict:
+    """Simulated gateway answer for a status check."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return {"status": "not_found", "message": "Transaction not found"}
+    
+    # Simulate status check
+    return {
+        "transaction_id": transaction_id,
+        "status": "completed",
+        "amount": 10.50,
+        "timestamp": time.time()
+    }
+
+
 class PaymentGateway:
     """
     Simulates an external payment gateway API.
@@ -65,21 +110,7 @@ class PaymentGateway:
         #     }
         # )
         
-        # For this template, we simulate different scenarios based on amount
-        # This allows testing without a real API
-        
-        if amount <= 0:
-            return False, "", "Invalid amount: must be greater than 0"
-        
-        if amount > 1000:
-            return False, "", "Payment declined: amount exceeds limit"
-        
-        if len(patron_id) != 6:
-            return False, "", "Invalid patron ID format"
-        
-        # Simulate successful payment
-        transaction_id = f"txn_{patron_id}_{int(time.time())}"
-        return True, transaction_id, f"Payment of ${amount:.2f} processed successfully"
+        return _payment_result(patron_id, amount)
     
     def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
         """
@@ -96,15 +127,7 @@ class PaymentGateway:
             tuple: (success: bool, message: str)
         """
         time.sleep(0.5)
-        
-        if not transaction_id or not transaction_id.startswith("txn_"):
-            return False, "Invalid transaction ID"
-        
-        if amount <= 0:
-            return False, "Invalid refund amount"
-        
-        refund_id = f"refund_{transaction_id}_{int(time.time())}"
-        return True, f"Refund of ${amount:.2f} processed successfully. Refund ID: {refund_id}"
+        return _refund_result(transaction_id, amount)
     
     def verify_payment_status(self, transaction_id: str) -> Dict:
         """
@@ -120,14 +143,64 @@ class PaymentGateway:
             dict: Payment status information
         """
         time.sleep(0.3)
+        return _status_result(transaction_id)
+
+
+async def _sleep(seconds: float) -> None:
+    # Imported here so synchronous users of this module do not pay for asyncio
+    import asyncio
+    await asyncio.sleep(seconds)
+
+
+class AsyncPaymentGateway:
+    """
+    asyncio version of PaymentGateway with the same methods and return values.
+    
+    Waiting on the gateway yields to the event loop instead of blocking the
+    thread, so many payments can be in flight at once. The simulated latencies
+    are class attributes so a local fake can shorten them.
+    """
+    
+    payment_latency = 0.5
+    refund_latency = 0.5
+    status_latency = 0.3
+    
+    def __init__(self, api_key: str = "test_key_12345"):
+        """
+        Initialize payment gateway with API credentials.
+        
+        Args:
+            api_key: API key for authentication (default is test key)
+        """
+        self.api_key = api_key
+        self.base_url = "https://api.payment-gateway.example.com"
+    
+    async def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+        """
+        Process a payment through the external gateway.
+        
+        Returns:
+            tuple: (success: bool, transaction_id: str, message: str)
+        """
+        await _sleep(self.payment_latency)
+        return _payment_result(patron_id, amount)
+    
+    async def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """
+        Refund a previous payment.
         
-        if not transaction_id or not transaction_id.startswith("txn_"):
-            return {"status": "not_found", "message": "Transaction not found"}
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        await _sleep(self.refund_latency)
+        return _refund_result(transaction_id, amount)
+    
+    async def verify_payment_status(self, transaction_id: str) -> Dict:
+        """
+        Check the status of a payment transaction.
         
-        # Simulate status check
-        return {
-            "transaction_id": transaction_id,
-            "status": "completed",
-            "amount": 10.50,
-            "timestamp": time.time()
-        }
\ No newline at end of file
+        Returns:
+            dict: Payment status information
+        """
+        await _sleep(self.status_latency)
+        return _status_result(transaction_id)
@@ -0,0 +1,133 @@
+"""
+Payment Verification Module - Cached and batched payment status checks
+
+Each verify_payment_status call costs a gateway round trip, and reconciliation
+checks every transaction of a period, most of which were already checked the
+day before. A settled transaction's status never changes, so PaymentVerifier
+keeps settled answers in a TTL + LRU cache and only asks the gateway about
+transactions it has not seen settle. verify_many() checks a batch, fanning the
+cache misses out over a thread pool.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+from services.payment_service import PaymentGateway
+
+# Statuses that are final at the gateway and safe to cache
+SETTLED_STATUSES = frozenset({'completed', 'refunded', 'failed'})
+
+VERIFY_CACHE_TTL_SECONDS = 24 * 3600.0
+VERIFY_CACHE_MAX_ENTRIES = 100000
+VERIFY_MAX_CONCURRENCY = 32
+
+class PaymentVerifier:
+    """
+    verify_payment_status with a cache of settled transactions.
+
+    Args:
+        gateway: Gateway to ask on a cache miss (default: a new PaymentGateway)
+        ttl_seconds: How long a settled status is served from the cache
+        max_entries: Cache size; the least recently used entry goes first
+        max_concurrency: Gateway calls in flight during verify_many()
+        clock: Monotonic clock for expiry (injectable for testing)
+    """
+
+    def __init__(self, gateway: Optional[PaymentGateway] = None,
+                 ttl_seconds: float = VERIFY_CACHE_TTL_SECONDS,
+                 max_entries: int = VERIFY_CACHE_MAX_ENTRIES,
+                 max_concurrency: int = VERIFY_MAX_CONCURRENCY,
+                 clock: Callable[[], float] = time.monotonic):
+        self.gateway = gateway or PaymentGateway()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        self._cache = OrderedDict()  # transaction_id -> (expires_at, status dict)
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(('hits', 'misses', 'gateway_calls', 'evictions', 'expirations'), 0)
+
+    def verify(self, transaction_id: str) -> Dict:
+        """Get a transaction's status, from the cache if it is known to be settled."""
+        cached = self._lookup(transaction_id)
+        if cached is not None:
+            return cached
+        return self._fetch(transaction_id)
+
+    def verify_many(self, transaction_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Get the status of many transactions at once.
+
+        Cache hits are answered immediately; the remaining distinct IDs are
+        checked concurrently, at most max_concurrency at a time. A gateway error
+        for one transaction is reported as its status ('error') rather than
+        failing the batch.
+
+        Returns:
+            dict: transaction_id -> status dict, in first-seen order
+        """
+        results = {}
+        misses = []
+        for transaction_id in transaction_ids:
+            if transaction_id in results:
+                continue
+            cached = self._lookup(transaction_id)
+            results[transaction_id] = cached
+            if cached is None:
+                misses.append(transaction_id)
+
+        if misses:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(misses))) as executor:
+                for transaction_id, status in zip(misses, executor.map(self._fetch_or_error, misses)):
+                    results[transaction_id] = status
+        return results
+
+    def stats(self) -> Dict:
+        """Cache hits, misses, hit_rate, gateway_calls, evictions, expirations and entries."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._cache)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Drop every cached status."""
+        with self._lock:
+            self._cache.clear()
+
+    def _lookup(self, transaction_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._cache.get(transaction_id)
+            if entry is not None and entry[0] <= self.clock():
+                del self._cache[transaction_id]
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._cache.move_to_end(transaction_id)
+            self._stats['hits'] += 1
+            return dict(entry[1])
+
+    def _fetch(self, transaction_id: str) -> Dict:
+        with self._lock:
+            self._stats['gateway_calls'] += 1
+        status = self.gateway.verify_payment_status(transaction_id)
+        if status.get('status') in SETTLED_STATUSES:
+            with self._lock:
+                self._cache[transaction_id] = (self.clock() + self.ttl_seconds, dict(status))
+                self._cache.move_to_end(transaction_id)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+                    self._stats['evictions'] += 1
+        return status
+
+    def _fetch_or_error(self, transaction_id: str) -> Dict:
+        try:
+            return self._fetch(transaction_id)
+        except Exception as e:
+            return {'transaction_id': transaction_id, 'status': 'error', 'message': str(e)}
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from services.library_service import collect_late_fees, pay_late_fees_async
+from services.payment_service import AsyncPaymentGateway
+
+
+class FakeGateway(AsyncPaymentGateway):
+    """Local gateway with short latency that records how many calls overlap."""
+
+    payment_latency = 0.05
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    async def process_payment(self, patron_id, amount, description=""):
+        self.calls.append((patron_id, amount, description))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().process_payment(patron_id, amount, description)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def fee_stubs(mocker):
+    mocker.patch(
+        "services.library_service.calculate_late_fee_for_book",
+        side_effect=lambda patron_id, book_id: {"fee_amount": 2.5 if book_id else 0.0,
+                                                "days_overdue": 5, "status": "ok"},
+    )
+    mocker.patch(
+        "services.library_service.get_book_by_id",
+        side_effect=lambda book_id: {"id": book_id, "title": f"Book {book_id}"},
+    )
+
+
+def test_async_gateway_matches_sync_contract():
+    gateway = AsyncPaymentGateway()
+    gateway.payment_latency = gateway.refund_latency = gateway.status_latency = 0
+
+    success, txn_id, message = asyncio.run(gateway.process_payment("123456", 10.0, "Late fees"))
+    assert success is True
+    assert txn_id.startswith("txn_123456_")
+    assert message == "Payment of $10.00 processed successfully"
+
+    assert asyncio.run(gateway.process_payment("123456", 0)) == (False, "", "Invalid amount: must be greater than 0")
+    assert asyncio.run(gateway.refund_payment("bad", 5.0)) == (False, "Invalid transaction ID")
+    assert asyncio.run(gateway.verify_payment_status(txn_id))["status"] == "completed"
+
+
+def test_pay_late_fees_async_success(fee_stubs):
+    gateway = FakeGateway()
+    success, message, txn_id = asyncio.run(pay_late_fees_async("123456", 7, gateway))
+
+    assert success is True
+    assert "Payment successful" in message
+    assert txn_id.startswith("txn_123456_")
+    assert gateway.calls == [("123456", 2.5, "Late fees for 'Book 7'")]
+
+
+def test_pay_late_fees_async_rejects_before_calling_gateway(fee_stubs):
+    gateway = FakeGateway()
+    assert asyncio.run(pay_late_fees_async("12", 7, gateway)) == (
+        False, "Invalid patron ID. Must be exactly 6 digits.", None)
+    assert asyncio.run(pay_late_fees_async("123456", 0, gateway)) == (
+        False, "No late fees to pay for this book.", None)
+    assert gateway.calls == []
+
+
+def test_pay_late_fees_async_handles_gateway_error(fee_stubs):
+    class BrokenGateway(AsyncPaymentGateway):
+        async def process_payment(self, patron_id, amount, description=""):
+            raise ConnectionError("gateway unreachable")
+
+    success, message, txn_id = asyncio.run(pay_late_fees_async("123456", 7, BrokenGateway()))
+    assert (success, txn_id) == (False, None)
+    assert message == "Payment processing error: gateway unreachable"
+
+
+def test_collect_late_fees_runs_concurrently_within_bound(fee_stubs):
+    gateway = FakeGateway()
+    charges = [(f"{100000 + i}", i + 1) for i in range(1000)]
+
+    started = time.perf_counter()
+    results = asyncio.run(collect_late_fees(charges, gateway, max_concurrency=250))
+    elapsed = time.perf_counter() - started
+
+    assert [(r["patron_id"], r["book_id"]) for r in results] == charges
+    assert all(r["success"] for r in results)
+    assert gateway.max_in_flight == 250
+    # 4 waves of 0.05s instead of 1000 sequential calls (50s)
+    assert elapsed < 2.0
+
+
+def test_collect_late_fees_rejects_bad_concurrency():
+    with pytest.raises(ValueError):
+        asyncio.run(collect_late_fees([], FakeGateway(), max_concurrency=0))
@@ -0,0 +1,204 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+from database import BookCache
+from services.library_service import borrow_book_by_patron, search_books_in_catalog
+
+
+@pytest.fixture
+def cache(isolated_db):
+    cache = database.configure_book_cache(100)
+    database.insert_book("Cached Book", "Author", "1111111111111", 2, 2)
+    yield cache
+    database.configure_book_cache()
+
+
+def book_id(isbn="1111111111111"):
+    conn = database.get_db_connection()
+    row = conn.execute("SELECT id FROM books WHERE isbn = ?", (isbn,)).fetchone()
+    conn.close()
+    return row["id"]
+
+
+def test_second_lookup_is_served_from_cache(cache):
+    first = database.get_book_by_id(book_id())
+    second = database.get_book_by_id(book_id())
+    by_isbn = database.get_book_by_isbn("1111111111111")
+
+    assert first == second == by_isbn
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+    assert stats["entries"] == 1
+
+
+def test_callers_cannot_change_cached_books(cache):
+    with pytest.raises(TypeError):
+        database.get_book_by_id(book_id())["title"] = "Changed"
+    assert database.get_book_by_id(book_id())["title"] == "Cached Book"
+
+    books = database.get_all_books()
+    books[0] = {"title": "Changed"}
+    assert database.get_all_books()[0]["title"] == "Cached Book"
+
+
+def test_callers_cannot_assign_to_cached_book_attributes(cache):
+    book = database.get_book_by_id(book_id())
+    with pytest.raises(AttributeError):
+        book.available_copies = 99
+    with pytest.raises(AttributeError):
+        del book.title
+    with pytest.raises(AttributeError):
+        database.get_all_books()[0].title = "Changed"
+
+    cached = database.get_book_by_id(book_id())
+    assert cached.available_copies == cached["available_copies"] == 2
+    assert cached.title == "Cached Book"
+    assert database.get_all_books()[0].title == "Cached Book"
+
+
+def test_availability_update_invalidates_entry_and_snapshot(cache):
+    database.get_book_by_id(book_id())
+    database.get_all_books()
+
+    assert database.update_book_availability(book_id(), -1)
+
+    assert database.get_book_by_id(book_id())["available_copies"] == 1
+    assert database.get_book_by_isbn("1111111111111")["available_copies"] == 1
+    assert database.get_all_books()[0]["available_copies"] == 1
+    assert database.get_all_books()[0]["available_copies"] == 1
+
+    # The snapshot was patched with the one changed row, not reloaded
+    stats = cache.stats()
+    assert stats["snapshot_misses"] == 1
+    assert stats["snapshot_patches"] == 1
+    assert stats["snapshot_hits"] == 1
+
+
+def test_insert_book_invalidates_snapshot(cache):
+    assert len(database.get_all_books()) == 1
+    assert cache.stats()["snapshot_rows"] == 1
+
+    database.insert_book("Another Book", "Author", "2222222222222", 1, 1)
+
+    assert [b["title"] for b in database.get_all_books()] == ["Another Book", "Cached Book"]
+    assert cache.stats()["snapshot_misses"] == 2
+
+
+def test_book_added_by_another_process_is_not_patched_into_snapshot(cache, isolated_db):
+    database.get_all_books()
+    other = sqlite3.connect(isolated_db)
+    other.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                  "VALUES ('Added Elsewhere', 'Author', '2222222222222', 1, 1)")
+    other.commit()
+    other.close()
+
+    new_id = book_id("2222222222222")
+    assert database.update_book_availability(new_id, -1)
+    books = database.get_all_books()
+
+    assert [book["title"] for book in books] == ["Added Elsewhere", "Cached Book"]
+    assert books[0]["available_copies"] == 0
+    assert database.get_all_books() == books
+
+
+def test_borrow_reads_under_write_lock_and_refreshes_cache(cache):
+    database.get_book_by_id(book_id())
+    cache.put(dict(database.get_book_by_id(book_id()), available_copies=0), cache.version)  # stale entry
+
+    # The availability check inside the borrow transaction ignores the cache
+    success, _ = borrow_book_by_patron("123456", book_id())
+    assert success
+    assert database.get_book_by_id(book_id())["available_copies"] == 1
+    assert search_books_in_catalog("1111111111111", "isbn")[0]["available_copies"] == 1
+
+
+def test_rolled_back_write_leaves_no_stale_entry(cache):
+    database.get_book_by_id(book_id())
+    with database.transaction() as conn:
+        database.update_book_availability(book_id(), -1)
+        conn.rollback()
+
+    assert database.get_book_by_id(book_id())["available_copies"] == 2
+
+
+def test_read_racing_a_write_is_not_stored():
+    cache = BookCache(10)
+    version = cache.version
+    cache.invalidate(1)  # a write committed while the read was in flight
+    cache.put({"id": 1, "isbn": "1111111111111", "available_copies": 2}, version)
+
+    assert cache.get_by_id(1) is None
+    cache.put_snapshot([{"id": 1, "isbn": "1111111111111"}], version)
+    assert cache.get_snapshot()[0] is None
+
+
+def test_snapshot_patch_racing_a_write_keeps_book_stale():
+    cache = BookCache(10)
+    cache.put_snapshot([{"id": 1, "available_copies": 2}], cache.version)
+    cache.invalidate(1)
+    _, stale, version = cache.get_snapshot()
+    cache.invalidate(1)  # changed again while the row was being re-read
+    cache.patch_snapshot(stale, [{"id": 1, "available_copies": 1}], version)
+
+    books, stale, _ = cache.get_snapshot()
+    assert stale == {1}
+
+
+def test_write_in_another_thread_is_not_overwritten_by_a_reader(cache):
+    database.get_book_by_id(book_id())
+    target = book_id()
+    started, release = threading.Event(), threading.Event()
+
+    def writer():
+        with database.transaction():
+            database.update_book_availability(target, -1)
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    started.wait(5)
+    # Uncommitted: readers still see, and may cache, the old row
+    assert database.get_book_by_id(target)["available_copies"] == 2
+    release.set()
+    thread.join()
+
+    assert database.get_book_by_id(target)["available_copies"] == 1
+
+
+def test_least_recently_used_book_is_evicted(isolated_db):
+    cache = database.configure_book_cache(2)
+    try:
+        for i in range(3):
+            database.insert_book(f"Book {i}", "Author", f"{i:013d}", 1, 1)
+        ids = [book_id(f"{i:013d}") for i in range(3)]
+        database.get_book_by_id(ids[0])
+        database.get_book_by_id(ids[1])
+        database.get_book_by_id(ids[0])  # ids[1] is now least recently used
+        database.get_book_by_id(ids[2])
+
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 1
+        assert cache.get_by_id(ids[1]) is None
+        assert cache.get_by_isbn(f"{0:013d}")["id"] == ids[0]
+    finally:
+        database.configure_book_cache()
+
+
+def test_zero_size_turns_cache_off(isolated_db):
+    cache = database.configure_book_cache(0)
+    try:
+        database.insert_book("Uncached", "Author", "3333333333333", 1, 1)
+        database.get_book_by_isbn("3333333333333")
+        database.get_book_by_isbn("3333333333333")
+        database.get_all_books()
+        stats = cache.stats()
+        assert stats["hits"] == stats["misses"] == stats["entries"] == 0
+        assert stats["snapshot_rows"] == 0
+    finally:
+        database.configure_book_cache()
@@ -0,0 +1,113 @@
+"""Book cache coherence across processes sharing one database file."""
+
+import multiprocessing
+import sqlite3
+
+import pytest
+
+import database
+from app import create_app
+
+GATSBY_ISBN = '9780743273565'  # sample book 1, 3 copies
+
+
+def _borrow(db_path, patron_id, book_id):
+    from services.library_service import borrow_book_by_patron
+
+    database.configure_pool(db_path)
+    success, message = borrow_book_by_patron(patron_id, book_id)
+    assert success, message
+
+
+def _raw_update(db_path, book_id, available):
+    conn = sqlite3.connect(db_path)
+    conn.execute('UPDATE books SET available_copies = ? WHERE id = ?', (available, book_id))
+    conn.commit()
+    conn.close()
+
+
+def in_other_process(target, *args):
+    """Run target(*args) in a fresh interpreter, like another gunicorn worker, and wait for it."""
+    process = multiprocessing.get_context('spawn').Process(target=target, args=args)
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+
+@pytest.fixture
+def app_db(isolated_db):
+    app = create_app(testing=True, config={'DATABASE': isolated_db, 'BOOK_CACHE_MAX_STALENESS': 3600})
+    yield app, isolated_db
+    database.configure_book_cache()
+    database.configure_pool('library.db')
+
+
+def available(client):
+    response = client.get(f'/api/search?q={GATSBY_ISBN}&type=isbn')
+    return response.get_json()['results'][0]['available_copies']
+
+
+def test_request_sees_borrow_made_by_another_process(app_db):
+    app, path = app_db
+    client = app.test_client()
+    assert available(client) == 3
+    assert available(client) == 3
+    assert database.get_book_cache_stats()['hits'] >= 1
+
+    in_other_process(_borrow, path, '111111', 1)
+
+    assert available(client) == 2
+    assert database.get_book_cache_stats()['foreign_writes'] == 1
+
+
+def test_raw_sql_write_in_another_process_is_caught(app_db):
+    app, path = app_db
+    database.get_all_books()
+
+    in_other_process(_raw_update, path, 1, 0)
+    database.revalidate_book_cache()
+
+    assert [b['available_copies'] for b in database.get_all_books() if b['id'] == 1] == [0]
+
+
+def test_own_writes_keep_the_cache(app_db):
+    database.get_book_by_id(1)
+    database.get_book_by_id(2)
+    database.revalidate_book_cache()
+
+    assert database.update_book_availability(1, -1)
+    with database.transaction():
+        database.update_book_availability(2, -1)
+    database.revalidate_book_cache()
+
+    stats = database.get_book_cache_stats()
+    assert stats['foreign_writes'] == 0
+    assert database.get_book_by_id(1)['available_copies'] == 2
+    assert database.get_book_by_id(2)['available_copies'] == 1
+
+
+def test_rolled_back_write_does_not_hide_a_foreign_one(app_db):
+    app, path = app_db
+    database.get_book_by_id(1)
+    database.revalidate_book_cache()
+    with database.transaction() as conn:
+        database.update_book_availability(2, -1)
+        conn.rollback()
+
+    # Moves catalog_version to the value our rolled back write had claimed
+    in_other_process(_raw_update, path, 1, 0)
+    database.revalidate_book_cache()
+
+    assert database.get_book_by_id(1)['available_copies'] == 0
+
+
+def test_reads_outside_requests_revalidate_after_max_staleness(app_db):
+    app, path = app_db
+    cache = database.configure_book_cache(max_staleness=3600)
+    assert database.get_book_by_id(1)['available_copies'] == 3
+
+    in_other_process(_raw_update, path, 1, 1)
+    assert database.get_book_by_id(1)['available_copies'] == 3  # within max_staleness
+
+    cache.max_staleness = 0
+    assert database.get_book_by_id(1)['available_copies'] == 1
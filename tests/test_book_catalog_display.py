@@ -73,7 +73,7 @@ def make_book(
 def test_catalog_renders_success_and_uses_catalog_template(app, client, monkeypatch):
     """
     R2: Route should render /catalog successfully and use the catalog template,
-    passing the books list from get_all_books().
+    passing the books list from get_books_page().
     """
     from routes import catalog_routes
 
@@ -83,7 +83,7 @@ def test_catalog_renders_success_and_uses_catalog_template(app, client, monkeypa
     ]
 
     # Patch the symbol used inside the route module
-    monkeypatch.setattr(catalog_routes, "get_all_books", lambda: sample_books)
+    monkeypatch.setattr(catalog_routes, "get_books_page", lambda *args, **kwargs: (sample_books, None, None))
 
     with captured_templates(app) as templates:
         resp = client.get("/catalog")
@@ -108,7 +108,7 @@ def test_catalog_handles_empty_list(app, client, monkeypatch):
     R2: When there are no books, the route should still render and pass an empty list.
     """
     from routes import catalog_routes
-    monkeypatch.setattr(catalog_routes, "get_all_books", lambda: [])
+    monkeypatch.setattr(catalog_routes, "get_books_page", lambda *args, **kwargs: ([], None, None))
 
     with captured_templates(app) as templates:
         resp = client.get("/catalog")
@@ -131,7 +131,7 @@ def test_catalog_availability_boundaries_reflected_in_context(app, client, monke
         make_book(1, "Available Book", "Auth A", "1111111111111", total=1, available=1),
         make_book(2, "Unavailable Book", "Auth B", "2222222222222", total=1, available=0),
     ]
-    monkeypatch.setattr(catalog_routes, "get_all_books", lambda: sample_books)
+    monkeypatch.setattr(catalog_routes, "get_books_page", lambda *args, **kwargs: (sample_books, None, None))
 
     with captured_templates(app) as templates:
         resp = client.get("/catalog")
@@ -155,7 +155,7 @@ def test_catalog_response_includes_titles_authors_isbns(app, client, monkeypatch
         make_book(10, "Dune", "Frank Herbert", "9780441013593", total=4, available=3),
         make_book(11, "1984", "George Orwell", "9780451524935", total=2, available=0),
     ]
-    monkeypatch.setattr(catalog_routes, "get_all_books", lambda: sample_books)
+    monkeypatch.setattr(catalog_routes, "get_books_page", lambda *args, **kwargs: (sample_books, None, None))
 
     resp = client.get("/catalog")
     assert resp.status_code == 200
@@ -180,7 +180,7 @@ def test_catalog_scales_with_many_books(app, client, monkeypatch):
     big_list = [make_book(i, f"Title {i}", f"Author {i}", f"{i:013d}", total=5, available=(i % 3))
                 for i in range(1, 201)]  # 200 books
 
-    monkeypatch.setattr(catalog_routes, "get_all_books", lambda: big_list)
+    monkeypatch.setattr(catalog_routes, "get_books_page", lambda *args, **kwargs: (big_list, None, None))
 
     with captured_templates(app) as templates:
         resp = client.get("/catalog")
@@ -27,27 +27,21 @@ def test_return_success_updates_return_date_increments_availability_and_reports_
     should return success, update return date, increment availability, and calculate/display late fees.
     """
 
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: borrowed)
-    borrowed = [
-        {
-            "book_id": 1,
-            "title": "Clean Code",
-            "author": "Robert C. Martin",
-            "borrow_date": datetime.now() - timedelta(days=20),
-            "due_date": datetime.now() - timedelta(days=6),  # overdue
-            "is_overdue": True,
-        }
-    ]
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: borrowed)
+    loan = {
+        "book_id": 1,
+        "title": "Clean Code",
+        "author": "Robert C. Martin",
+        "borrow_date": datetime.now() - timedelta(days=22),
+        "due_date": datetime.now() - timedelta(days=8),  # overdue => $4.50
+        "is_overdue": True,
+    }
+    monkeypatch.setattr(library_service, "get_active_loan", lambda pid, bid: loan if bid == 1 else None)
 
     monkeypatch.setattr(library_service, "get_book_by_id", lambda bid: fake_book(book_id=bid, title="Clean Code", available=0, total=1))
 
     monkeypatch.setattr(library_service, "update_borrow_record_return_date", lambda *args, **kwargs: True)
     monkeypatch.setattr(library_service, "update_book_availability", lambda *args, **kwargs: True)
 
-    monkeypatch.setattr(library_service, "calculate_late_fee_for_book",
-                        lambda patron_id, book_id: {"fee_amount": 4.50, "days_overdue": 8, "status": "ok"})
-
     success, msg = return_book_by_patron("123456", 1)
     assert success is True
     assert "Returned" in msg or "success" in msg.lower()
@@ -62,9 +56,9 @@ def test_return_fails_if_patron_does_not_have_this_book(monkeypatch):
     should return failure, no return date updated.
     """
 
-    borrowed = [{"book_id": 2, "title": "Other", "author": "A",
-                 "borrow_date": datetime.now(), "due_date": datetime.now() + timedelta(days=10), "is_overdue": False}]
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: borrowed)
+    other = {"book_id": 2, "title": "Other", "author": "A",
+             "borrow_date": datetime.now(), "due_date": datetime.now() + timedelta(days=10), "is_overdue": False}
+    monkeypatch.setattr(library_service, "get_active_loan", lambda pid, bid: other if bid == 2 else None)
 
     monkeypatch.setattr(library_service, "get_book_by_id", lambda bid: fake_book(book_id=bid, title="Clean Code", available=0, total=1))
 
@@ -78,7 +72,7 @@ def test_return_fails_if_book_not_found(monkeypatch):
     book not found
     should return failure, no return date updated.
     """
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: [])
+    monkeypatch.setattr(library_service, "get_active_loan", lambda pid, bid: None)
     monkeypatch.setattr(library_service, "get_book_by_id", lambda bid: None)
 
     success, msg = return_book_by_patron("123456", 999)
@@ -92,14 +86,13 @@ def test_return_propagates_db_errors(monkeypatch):
     should return failure, no return date updated.
     """
 
-    borrowed = [{"book_id": 1, "title": "Clean Code", "author": "A",
-                 "borrow_date": datetime.now(), "due_date": datetime.now() - timedelta(days=1), "is_overdue": True}]
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: borrowed)
+    loan = {"book_id": 1, "title": "Clean Code", "author": "A",
+            "borrow_date": datetime.now(), "due_date": datetime.now() - timedelta(days=1), "is_overdue": True}
+    monkeypatch.setattr(library_service, "get_active_loan", lambda pid, bid: loan)
     monkeypatch.setattr(library_service, "get_book_by_id", lambda bid: fake_book(book_id=bid, title="Clean Code", available=0, total=1))
 
     monkeypatch.setattr(library_service, "update_borrow_record_return_date", lambda *args, **kwargs: False)
     monkeypatch.setattr(library_service, "update_book_availability", lambda *args, **kwargs: True)
-    monkeypatch.setattr(library_service, "calculate_late_fee_for_book", lambda *args, **kwargs: {"fee_amount": 0.0, "days_overdue": 0, "status": "ok"})
 
     success, msg = return_book_by_patron("123456", 1)
     assert success is False
@@ -120,11 +113,30 @@ def test_return_validates_patron_id_format(monkeypatch):
     """
     \
     monkeypatch.setattr(library_service, "get_book_by_id", lambda bid: fake_book(book_id=bid))
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: [])
+    monkeypatch.setattr(library_service, "get_active_loan", lambda pid, bid: None)
     monkeypatch.setattr(library_service, "update_borrow_record_return_date", lambda *args, **kwargs: True)
     monkeypatch.setattr(library_service, "update_book_availability", lambda *args, **kwargs: True)
-    monkeypatch.setattr(library_service, "calculate_late_fee_for_book", lambda *args, **kwargs: {"fee_amount": 0.0, "days_overdue": 0, "status": "ok"})
 
     ok, msg = return_book_by_patron("12345", 1)
     assert ok is False
     assert "6 digits" in msg
+
+
+def test_return_reports_fee_for_the_loan_it_just_closed(isolated_db):
+    """
+    End to end against a real database: the fee must come from the loan row read
+    before it was closed, not from a second lookup that finds no active loan.
+    """
+    import database
+
+    database.insert_book("Overdue Book", "Author", "9990000000001", 1, 0)
+    book_id = database.get_book_by_isbn("9990000000001")["id"]
+    borrowed_at = datetime.now() - timedelta(days=24)
+    database.insert_borrow_record("123456", book_id, borrowed_at, borrowed_at + timedelta(days=14))
+
+    success, msg = return_book_by_patron("123456", book_id)
+
+    assert success is True
+    assert "$6.50 for 10 days overdue" in msg  # 7 * 0.50 + 3 * 1.00
+    assert database.get_active_loan("123456", book_id) is None
+    assert database.get_book_by_id(book_id)["available_copies"] == 1
@@ -0,0 +1,152 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+from database import transaction
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+
+def _add_book(copies, isbn="9990000000001"):
+    assert database.insert_book("Hot Title", "Popular Author", isbn, copies, copies)
+    return database.get_book_by_isbn(isbn)["id"]
+
+
+def test_transaction_commits_helper_writes_once(isolated_db):
+    with transaction():
+        assert database.insert_book("A", "Author", "9990000000001", 1, 1)
+        assert database.insert_book("B", "Author", "9990000000002", 1, 1)
+
+    assert len(database.get_all_books()) == 2
+    assert database.get_pool_stats()["in_use"] == 0
+
+
+def test_transaction_rolls_back_on_exception(isolated_db):
+    with pytest.raises(RuntimeError):
+        with transaction():
+            database.insert_book("A", "Author", "9990000000001", 1, 1)
+            raise RuntimeError("boom")
+
+    assert database.get_all_books() == []
+
+
+def test_failed_begin_releases_the_connection(isolated_db):
+    conn = database.get_db_connection()
+    conn.execute("PRAGMA busy_timeout = 0")
+    conn.close()
+    other = sqlite3.connect(isolated_db)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            with transaction():
+                pass
+    finally:
+        other.rollback()
+        other.close()
+
+    assert database.get_pool_stats()["in_use"] == 0
+    assert database.insert_book("A", "Author", "9990000000001", 1, 1)
+
+
+def test_borrow_reports_a_locked_database(isolated_db):
+    book_id = _add_book(copies=1)
+    conn = database.get_db_connection()
+    conn.execute("PRAGMA busy_timeout = 0")
+    conn.close()
+    other = sqlite3.connect(isolated_db)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        success, message = borrow_book_by_patron("123456", book_id)
+    finally:
+        other.rollback()
+        other.close()
+
+    assert success is False
+    assert message == "The library is busy, please try again."
+    assert database.get_pool_stats()["in_use"] == 0
+    assert database.get_patron_borrow_count("123456") == 0
+
+
+def test_return_reports_a_locked_database(isolated_db):
+    book_id = _add_book(copies=1)
+    assert borrow_book_by_patron("123456", book_id)[0]
+    conn = database.get_db_connection()
+    conn.execute("PRAGMA busy_timeout = 0")
+    conn.close()
+    other = sqlite3.connect(isolated_db)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        success, message = return_book_by_patron("123456", book_id)
+    finally:
+        other.rollback()
+        other.close()
+
+    assert success is False
+    assert message == "The library is busy, please try again."
+    assert database.get_pool_stats()["in_use"] == 0
+    assert database.get_active_loan("123456", book_id)
+
+
+def test_availability_never_goes_below_zero(isolated_db):
+    book_id = _add_book(copies=1)
+
+    assert database.update_book_availability(book_id, -1) is True
+    assert database.update_book_availability(book_id, -1) is False
+    assert database.get_book_by_id(book_id)["available_copies"] == 0
+
+
+def test_borrow_writes_record_and_decrements_in_one_commit(isolated_db):
+    book_id = _add_book(copies=2)
+
+    success, message = borrow_book_by_patron("123456", book_id)
+
+    assert success is True
+    assert database.get_book_by_id(book_id)["available_copies"] == 1
+    assert database.get_patron_borrow_count("123456") == 1
+
+
+def test_failed_availability_update_rolls_back_borrow_record(isolated_db, monkeypatch):
+    import services.library_service as library_service
+
+    book_id = _add_book(copies=1)
+    monkeypatch.setattr(library_service, "update_book_availability", lambda *args, **kwargs: False)
+
+    success, message = borrow_book_by_patron("123456", book_id)
+
+    assert success is False
+    assert "availability" in message
+    assert database.get_patron_borrow_count("123456") == 0
+
+
+def test_concurrent_borrows_never_oversell(isolated_db):
+    copies = 3
+    book_id = _add_book(copies=copies)
+    threads_count = 24
+    start = threading.Barrier(threads_count)
+    results = []
+    lock = threading.Lock()
+
+    def borrow(i):
+        start.wait()
+        outcome = borrow_book_by_patron(f"{200000 + i}", book_id)
+        with lock:
+            results.append(outcome)
+
+    threads = [threading.Thread(target=borrow, args=(i,)) for i in range(threads_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    successes = [msg for ok, msg in results if ok]
+    assert len(results) == threads_count
+    assert len(successes) == copies
+    assert all("not available" in msg for ok, msg in results if not ok)
+
+    conn = sqlite3.connect(isolated_db)
+    available = conn.execute("SELECT available_copies FROM books WHERE id = ?", (book_id,)).fetchone()[0]
+    loans = conn.execute("SELECT COUNT(*) FROM borrow_records WHERE book_id = ?", (book_id,)).fetchone()[0]
+    conn.close()
+    assert available == 0
+    assert loans == copies
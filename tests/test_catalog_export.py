@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+import sqlite3
+import tracemalloc
+
+import pytest
+
+import database
+
+
+@pytest.fixture(scope="module")
+def app():
+    from app import create_app
+    return create_app(testing=True)
+
+
+@pytest.fixture()
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture()
+def books_db(tmp_path):
+    """A bare books table, so large fills stay fast (no search triggers)."""
+    path = str(tmp_path / "export.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    """)
+    conn.commit()
+    conn.close()
+    database.configure_pool(path)
+    yield path
+    database.configure_pool("library.db")
+
+
+def _fill(path, count, start=0):
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)",
+        ((f"Title {i}", f"Author {i}", f"{i:013d}", 3, 2) for i in range(start, start + count)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _peak_export_bytes(client, export_format):
+    tracemalloc.start()
+    try:
+        resp = client.get(f"/api/catalog/export?format={export_format}", buffered=False)
+        total = sum(len(chunk) for chunk in resp.response)
+        resp.close()
+        return tracemalloc.get_traced_memory()[1], total
+    finally:
+        tracemalloc.stop()
+
+
+def test_ndjson_export_streams_every_book(books_db, app, client):
+    _fill(books_db, 2500)
+    conn = sqlite3.connect(books_db)
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES ('Ünïcode, \"quoted\"', 'A', 'x', 1, 1)")
+    conn.commit()
+    conn.close()
+
+    resp = client.get("/api/catalog/export?batch_size=1000")
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert resp.mimetype == "application/x-ndjson"
+
+    rows = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert len(rows) == 2501
+    assert rows[0] == {"id": 1, "title": "Title 0", "author": "Author 0", "isbn": "0000000000000",
+                       "total_copies": 3, "available_copies": 2}
+    assert rows[-1]["title"] == 'Ünïcode, "quoted"'
+
+
+def test_csv_export_has_header_and_quotes_fields(books_db, app, client):
+    _fill(books_db, 3)
+    conn = sqlite3.connect(books_db)
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES ('Eats, Shoots & Leaves', 'Lynne Truss', 'y', 1, 0)")
+    conn.commit()
+    conn.close()
+
+    resp = client.get("/api/catalog/export?format=csv")
+    assert resp.status_code == 200
+    assert resp.headers["Content-Disposition"] == "attachment; filename=catalog.csv"
+
+    rows = list(csv.reader(io.StringIO(resp.get_data(as_text=True))))
+    assert rows[0] == list(database.BOOK_COLUMNS)
+    assert len(rows) == 5
+    assert rows[-1][1:3] == ["Eats, Shoots & Leaves", "Lynne Truss"]
+
+
+def test_csv_export_of_empty_catalog_is_just_the_header(books_db, app, client):
+    rows = list(csv.reader(io.StringIO(client.get("/api/catalog/export?format=csv").get_data(as_text=True))))
+    assert rows == [list(database.BOOK_COLUMNS)]
+
+
+def test_unknown_format_is_rejected(app, client):
+    assert client.get("/api/catalog/export?format=xml").status_code == 400
+
+
+def test_export_memory_does_not_grow_with_catalog_size(books_db, app, client):
+    _fill(books_db, 2_000)
+    small_peak, small_bytes = _peak_export_bytes(client, "ndjson")
+
+    _fill(books_db, 18_000, start=2_000)
+    large_peak, large_bytes = _peak_export_bytes(client, "ndjson")
+
+    # Ten times the output, but peak allocation stays around one batch
+    assert large_bytes > 9 * small_bytes
+    assert large_peak < 2 * small_peak
@@ -0,0 +1,77 @@
+import re
+
+import pytest
+
+import database
+from app import create_app
+from routes.fragments import FragmentCache
+
+
+def make_client(path, **config):
+    app = create_app(testing=True, config={'DATABASE': path, **config})
+    return app, app.test_client()
+
+
+@pytest.fixture
+def path(isolated_db):
+    yield isolated_db
+    database.configure_pool('library.db')
+
+
+def normalized(html):
+    return re.sub(r'\s+', ' ', html.decode('utf-8'))
+
+
+def test_cached_rows_render_the_same_page(path):
+    database.insert_book('<b>Bold</b> & Co', 'Author', '7777777777777', 1, 1)
+    _, cached = make_client(path)
+    _, inline = make_client(path, CATALOG_ROW_CACHE_SIZE=0)
+
+    page = cached.get('/catalog').data
+    assert normalized(page) == normalized(inline.get('/catalog').data)
+    assert normalized(page) == normalized(cached.get('/catalog').data)
+    assert b'&lt;b&gt;Bold&lt;/b&gt; &amp; Co' in page
+
+
+def test_only_changed_rows_are_rendered_again(path):
+    app, client = make_client(path)
+    client.get('/catalog')
+    cache = app.extensions['catalog_row_fragments']
+    assert cache.stats()['misses'] == 3
+
+    client.get('/catalog')
+    assert cache.stats()['hits'] == 3
+
+    client.post('/borrow', data={'patron_id': '222222', 'book_id': '1'})
+    page = client.get('/catalog').data
+    stats = cache.stats()
+    assert stats['misses'] == 4
+    assert stats['hits'] == 5
+    assert b'2/3 Available' in page
+
+
+def test_one_cache_serves_every_request(path):
+    app, client = make_client(path)
+    cache = app.extensions['catalog_row_fragments']
+    client.get('/catalog')
+    client.get('/catalog?limit=2')
+    assert app.extensions['catalog_row_fragments'] is cache
+    assert cache.stats()['hits'] == 2
+
+
+def test_zero_size_renders_rows_inline(path):
+    app, client = make_client(path, CATALOG_ROW_CACHE_SIZE=0)
+    assert b'Borrow' in client.get('/catalog').data
+    assert 'catalog_row_fragments' not in app.extensions
+
+
+def test_fragment_cache_evicts_least_recently_used():
+    cache = FragmentCache(2)
+    cache.get_or_render('a', lambda: 'A')
+    cache.get_or_render('b', lambda: 'B')
+    cache.get_or_render('a', lambda: 'unused')
+    cache.get_or_render('c', lambda: 'C')
+
+    assert cache.get_or_render('a', lambda: 'A again') == 'A'
+    assert cache.get_or_render('b', lambda: 'B again') == 'B again'
+    assert cache.stats()['evictions'] == 2
@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+import database
+from services.catalog_import import import_books, main, read_csv_rows, read_ndjson_rows
+
+
+def row(isbn, title="Title", author="Author", total_copies="2"):
+    return {"title": title, "author": author, "isbn": isbn, "total_copies": total_copies}
+
+
+def test_valid_rows_are_inserted_in_chunks(isolated_db):
+    rows = [row(f"978000000{i:04d}", title=f"Book {i}") for i in range(7)]
+    checkpoints = []
+
+    report = import_books(rows, chunk_size=3, on_chunk=lambda r: checkpoints.append(r["last_row"]))
+
+    assert report["inserted"] == 7
+    assert report["errors"] == []
+    assert checkpoints == [3, 6, 7]
+    assert report["rows_per_second"] > 0
+    book = database.get_book_by_isbn("9780000000006")
+    assert book["title"] == "Book 6"
+    assert book["available_copies"] == book["total_copies"] == 2
+
+
+def test_invalid_rows_are_reported_with_add_book_messages(isolated_db):
+    rows = [
+        row("9780000000001"),
+        row("9780000000002", title="   "),
+        row("123"),
+        row("9780000000003", total_copies="0"),
+        row("9780000000004", total_copies="many"),
+        row("9780000000005", author="A" * 101),
+        {},
+    ]
+
+    report = import_books(rows)
+
+    assert report["inserted"] == 1
+    assert report["errors"] == [
+        (2, "Title is required."),
+        (3, "ISBN must be exactly 13 digits."),
+        (4, "Total copies must be a positive integer."),
+        (5, "Total copies must be a positive integer."),
+        (6, "Author must be less than 100 characters."),
+        (7, "Row could not be parsed."),
+    ]
+
+
+def test_rows_add_book_to_catalog_would_reject_are_rejected(isolated_db):
+    rows = [
+        row("9780000000001", total_copies="2.5"),
+        row("9780000000002", total_copies=2.5),
+        row("9780000000003", total_copies=True),
+        row("9780000000004", total_copies="true"),
+        row(" 9780000000005"),
+        row(9780000000006),
+        row("9780000000007", total_copies=3),
+    ]
+
+    report = import_books(rows)
+
+    assert report["inserted"] == 1
+    assert report["errors"] == [
+        (1, "Total copies must be a positive integer."),
+        (2, "Total copies must be a positive integer."),
+        (3, "Total copies must be a positive integer."),
+        (4, "Total copies must be a positive integer."),
+        (5, "ISBN must be exactly 13 digits."),
+        (6, "ISBN must be exactly 13 digits."),
+    ]
+    assert database.get_book_by_isbn("9780000000007")["total_copies"] == 3
+
+
+def test_duplicate_isbns_in_catalog_and_file_are_skipped(isolated_db):
+    database.insert_book("Existing", "Author", "9780000000001", 1, 1)
+    rows = [row("9780000000001"), row("9780000000002"), row("9780000000002", title="Again")]
+
+    report = import_books(rows)
+
+    assert report["inserted"] == 1
+    assert report["duplicates"] == 2
+    assert database.get_book_by_isbn("9780000000002")["title"] == "Title"
+
+
+def test_resume_skips_rows_committed_by_earlier_run(isolated_db):
+    rows = [row(f"978000000{i:04d}") for i in range(5)]
+    import_books(rows[:3])
+
+    report = import_books(rows, skip_rows=3)
+
+    assert report["rows_read"] == 2
+    assert report["inserted"] == 2
+    assert report["duplicates"] == 0
+    assert report["last_row"] == 5
+
+
+def test_readers_parse_csv_and_ndjson(tmp_path):
+    csv_path = tmp_path / "books.csv"
+    csv_path.write_text('title,author,isbn,total_copies\n"Eats, Shoots",Truss,9780000000001,2\n', encoding="utf-8")
+    ndjson_path = tmp_path / "books.ndjson"
+    ndjson_path.write_text(json.dumps(row("9780000000002")) + "\n\nnot json\n", encoding="utf-8")
+
+    assert list(read_csv_rows(str(csv_path))) == [row("9780000000001", title="Eats, Shoots", author="Truss")]
+    assert list(read_ndjson_rows(str(ndjson_path))) == [row("9780000000002"), {}]
+
+
+def test_cli_imports_file_and_clears_checkpoint(isolated_db, tmp_path, capsys):
+    path = tmp_path / "books.csv"
+    path.write_text("title,author,isbn,total_copies\nA,B,9780000000001,1\nC,D,bad,1\n", encoding="utf-8")
+
+    assert main([str(path), "--chunk-size", "1"]) == 0
+
+    out = capsys.readouterr().out
+    assert "row 2: ISBN must be exactly 13 digits." in out
+    assert "Imported 1 books" in out
+    assert not (tmp_path / "books.csv.checkpoint").exists()
+
+
+def test_cli_resumes_from_checkpoint(isolated_db, tmp_path, capsys):
+    path = tmp_path / "books.csv"
+    path.write_text("title,author,isbn,total_copies\nA,B,9780000000001,1\nC,D,9780000000002,1\n", encoding="utf-8")
+    (tmp_path / "books.csv.checkpoint").write_text("1")
+
+    assert main([str(path), "--resume"]) == 0
+
+    assert "Resuming after row 1" in capsys.readouterr().out
+    assert database.get_book_by_isbn("9780000000001") is None
+    assert database.get_book_by_isbn("9780000000002") is not None
@@ -0,0 +1,88 @@
+import pytest
+
+import database
+from database import decode_cursor, encode_cursor, get_books_page
+
+
+@pytest.fixture(scope="module")
+def app():
+    from app import create_app
+    return create_app(testing=True)
+
+
+@pytest.fixture()
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture()
+def shelf(isolated_db):
+    # Duplicate titles make sure ties are broken by id
+    titles = ["Alpha", "Bravo", "Bravo", "Charlie", "Delta", "Echo", "Foxtrot"]
+    for i, title in enumerate(titles):
+        assert database.insert_book(title, "Author", f"{i:013d}", 1, 1)
+    return titles
+
+
+def test_walk_forward_then_back_covers_catalog_in_order(shelf):
+    seen = []
+    books, next_cursor, prev_cursor = get_books_page(limit=3)
+    assert prev_cursor is None
+    pages = [books]
+    while next_cursor:
+        books, next_cursor, prev_cursor = get_books_page(limit=3, after=next_cursor)
+        assert prev_cursor is not None
+        pages.append(books)
+    for page in pages:
+        seen.extend(b["title"] for b in page)
+    assert seen == sorted(shelf)
+    assert [len(p) for p in pages] == [3, 3, 1]
+
+    # Step back from the last page
+    books, next_cursor, prev_cursor = get_books_page(limit=3, before=encode_cursor(pages[-1][0]))
+    assert books == pages[1]
+    assert next_cursor is not None and prev_cursor is not None
+
+    books, _, prev_cursor = get_books_page(limit=3, before=prev_cursor)
+    assert books == pages[0]
+    assert prev_cursor is None
+
+
+def test_page_size_is_clamped(shelf):
+    assert len(get_books_page(limit=0)[0]) == 1
+    books, next_cursor, _ = get_books_page(limit=10_000)
+    assert len(books) == len(shelf) and next_cursor is None
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    assert decode_cursor(encode_cursor({"title": "Ünïcode / Title", "id": 7})) == ("Ünïcode / Title", 7)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_api_walks_whole_catalog_with_cursors(shelf, app, client):
+    titles, after = [], None
+    while True:
+        resp = client.get("/api/books", query_string={"limit": 2, **({"after": after} if after else {})})
+        assert resp.status_code == 200
+        data = resp.get_json()
+        titles += [b["title"] for b in data["books"]]
+        after = data["next_cursor"]
+        if after is None:
+            break
+    assert titles == sorted(shelf)
+
+
+def test_api_rejects_invalid_cursor(app, client):
+    resp = client.get("/api/books?after=%%%")
+    assert resp.status_code == 400
+
+
+def test_catalog_page_links_to_next_and_previous(shelf, app, client):
+    html = client.get("/catalog?limit=3").get_data(as_text=True)
+    assert "Next &rarr;" in html and "Previous" not in html
+
+    _, next_cursor, _ = get_books_page(limit=3)
+    html = client.get(f"/catalog?limit=3&after={next_cursor}").get_data(as_text=True)
+    assert "Next &rarr;" in html and "&larr; Previous" in html
+    assert "Charlie" in html and "Alpha" not in html
@@ -0,0 +1,121 @@
+from datetime import date
+
+import pytest
+
+import database
+import routes.api_routes as api_routes
+import routes.catalog_routes as catalog_routes
+import routes.conditional as conditional
+from app import create_app
+
+
+@pytest.fixture
+def client(isolated_db):
+    app = create_app(testing=True, config={'DATABASE': isolated_db})
+    yield app.test_client()
+    database.configure_pool('library.db')
+
+
+def must_not_run(*args, **kwargs):
+    raise AssertionError('view body ran for a matching ETag')
+
+
+def test_catalog_answers_304_without_querying(client, monkeypatch):
+    first = client.get('/catalog')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+    etag = first.headers['ETag']
+
+    monkeypatch.setattr(catalog_routes, 'get_books_page', must_not_run)
+    monkeypatch.setattr(catalog_routes, 'render_template', must_not_run)
+    second = client.get('/catalog', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == etag
+    assert second.headers['Cache-Control'] == 'no-cache'
+
+
+def test_catalog_etag_changes_when_a_book_changes(client):
+    etag = client.get('/catalog').headers['ETag']
+    client.post('/borrow', data={'patron_id': '222222', 'book_id': '1'})
+    client.get('/catalog')  # shows the borrow's flash message
+
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_pending_flash_message_is_never_answered_with_304(client):
+    etag = client.get('/catalog').headers['ETag']
+    client.post('/borrow', data={'patron_id': '222222', 'book_id': 'abc'})  # flashes, changes nothing
+
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Invalid book ID.' in response.data
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert 'ETag' not in response.headers
+
+
+def test_api_search_answers_304_without_searching(client, monkeypatch):
+    url = '/api/search?q=gatsby&type=title'
+    first = client.get(url)
+    assert first.get_json()['count'] == 1
+
+    monkeypatch.setattr(api_routes, 'search_books_in_catalog', must_not_run)
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+def test_search_page_sends_cache_headers(client):
+    response = client.get('/search?q=gatsby&type=title')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert client.get('/search?q=gatsby&type=title',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_late_fee_etag_follows_loans_and_date(client, monkeypatch):
+    url = '/api/late_fee/123456/3'
+    etag = client.get(url).headers['ETag']
+
+    monkeypatch.setattr(api_routes, 'calculate_late_fee_for_book', must_not_run)
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    monkeypatch.undo()
+
+    # Fees grow overnight
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.fromordinal(date.today().toordinal() + 1)
+
+    monkeypatch.setattr(conditional, 'date', Tomorrow)
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+    monkeypatch.undo()
+
+    client.post('/return', data={'patron_id': '123456', 'book_id': '3'})
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_book_changes_do_not_touch_loan_etag(client):
+    url = '/api/late_fee/123456/3'
+    etag = client.get(url).headers['ETag']
+    database.insert_book('New Book', 'Author', '5555555555555', 1, 1)
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_etag_depends_on_query_string(client):
+    gatsby = client.get('/api/search?q=gatsby&type=title')
+    orwell = client.get('/api/search?q=orwell&type=author')
+    assert gatsby.headers['ETag'] != orwell.headers['ETag']
+
+    response = client.get('/api/search?q=orwell&type=author', headers={'If-None-Match': gatsby.headers['ETag']})
+    assert response.status_code == 200
+    assert response.get_json()['search_term'] == 'orwell'
+
+
+def test_etag_changes_with_app_version(isolated_db):
+    etags = []
+    for version in ('release-1', 'release-2'):
+        app = create_app(testing=True, config={'DATABASE': isolated_db, 'APP_VERSION': version})
+        etags.append(app.test_client().get('/catalog').headers['ETag'])
+    database.configure_pool('library.db')
+    assert etags[0] != etags[1]
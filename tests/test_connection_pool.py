@@ -0,0 +1,162 @@
+import os
+import threading
+
+import pytest
+
+import database
+from database import ConnectionPool
+
+
+def test_released_connection_is_reused(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+
+    first = pool.acquire()
+    first.close()
+    second = pool.acquire()
+    second.close()
+
+    assert first is second
+    stats = pool.stats()
+    assert stats["created"] == 1
+    assert stats["reused"] == 1
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1
+
+
+def test_nested_acquire_in_same_thread_shares_connection(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+
+    outer = pool.acquire()
+    inner = pool.acquire()
+    assert inner is outer
+    inner.close()
+
+    # Still checked out by the outer caller
+    assert pool.stats()["idle"] == 0
+    outer.close()
+    assert pool.stats()["idle"] == 1
+    assert pool.stats()["nested"] == 1
+
+
+def test_idle_connections_are_capped_at_max_size(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_size=2)
+    acquired = threading.Barrier(5)
+    done = threading.Event()
+
+    def worker():
+        conn = pool.acquire()
+        acquired.wait()
+        done.wait()
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        acquired.wait(timeout=5)
+        assert pool.stats()["in_use"] == 4
+    finally:
+        done.set()
+        for t in threads:
+            t.join()
+
+    stats = pool.stats()
+    assert stats["created"] == 4
+    assert stats["idle"] == 2
+    assert stats["in_use"] == 0
+
+
+def test_expired_idle_connections_are_evicted(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_idle_seconds=0)
+
+    first = pool.acquire()
+    first.close()
+    second = pool.acquire()
+    second.close()
+
+    assert first is not second
+    assert pool.stats()["evicted"] == 1
+
+
+def test_broken_idle_connection_fails_health_check(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+
+    conn = pool.acquire()
+    conn.close()
+    # Simulate a dead handle sitting in the idle list
+    pool._idle[0][0].discard()
+
+    fresh = pool.acquire()
+    assert fresh.execute("SELECT 1").fetchone()[0] == 1
+    fresh.close()
+    assert pool.stats()["health_check_failures"] == 1
+
+
+def test_rolled_back_on_release_when_transaction_left_open(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()
+
+    conn = pool.acquire()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    conn.close()
+
+
+def test_database_helpers_share_pooled_connections(isolated_db):
+    assert database.insert_book("Pooled", "Author", "1111111111111", 2, 2)
+    book = database.get_book_by_isbn("1111111111111")
+    assert database.get_book_by_id(book["id"])["title"] == "Pooled"
+    assert database.get_all_books()[0]["isbn"] == "1111111111111"
+
+    stats = database.get_pool_stats()
+    assert stats["database"] == isolated_db
+    assert stats["created"] == 1
+    assert stats["in_use"] == 0
+
+
+def test_create_app_configures_pool(tmp_path):
+    from app import create_app
+
+    path = str(tmp_path / "app.db")
+    try:
+        create_app(testing=True, config={"DATABASE": path, "DB_POOL_SIZE": 3})
+        stats = database.get_pool_stats()
+        assert stats["database"] == path
+        assert stats["max_size"] == 3
+        assert len(database.get_all_books()) == 3  # sample data went to the configured file
+    finally:
+        database.configure_pool("library.db")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_child_gets_its_own_pool(isolated_db):
+    parent_pool = database.get_pool()
+    held = database.get_db_connection()  # checked out across the fork
+    read_fd, write_fd = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            pool = database.get_pool()
+            conn = database.get_db_connection()
+            ok = (pool is not parent_pool and pool.database == isolated_db
+                  and pool.stats()["created"] == 1 and conn is not held
+                  and conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 0)
+            conn.close()
+            os.write(write_fd, b"ok" if ok else b"fail")
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    result = os.read(read_fd, 16)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    assert result == b"ok"
+
+    # The parent's pool and connection are untouched
+    assert database.get_pool() is parent_pool
+    assert held.execute("SELECT 1").fetchone()[0] == 1
+    held.close()
@@ -0,0 +1,76 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from services import fee_engine
+from services.fee_engine import compute_loan_fees, compute_patron_fee_totals, fee_cents_for_days
+from services.library_service import compute_late_fee
+
+AS_OF = datetime(2026, 3, 1, 12, 0, 0)
+
+def test_fee_cents_match_scalar_rule_for_every_day_count():
+    days = np.arange(-5, 101)
+    cents = fee_cents_for_days(days)
+    for d, c in zip(days, cents):
+        expected = compute_late_fee(AS_OF - timedelta(days=int(d)), AS_OF)['fee_amount']
+        assert c / 100 == expected
+
+def test_no_open_loans_gives_empty_totals(monkeypatch):
+    monkeypatch.setattr(fee_engine, "get_active_loan_due_dates", lambda: [])
+    totals = compute_patron_fee_totals(AS_OF)
+    assert totals == {'loans_scanned': 0, 'overdue_loans': 0, 'total_fees': 0.0, 'patrons': {}}
+
+def test_patron_totals_aggregate_overdue_loans(monkeypatch):
+    day = lambda ago: (AS_OF - timedelta(days=ago)).date().isoformat()
+    rows = [
+        ("111111", 1, day(3)),    # $1.50
+        ("111111", 2, day(10)),   # $6.50
+        ("111111", 3, day(-4)),   # not due yet
+        ("222222", 4, day(60)),   # capped at $15.00
+        ("333333", 5, day(0)),    # due today
+    ]
+    monkeypatch.setattr(fee_engine, "get_active_loan_due_dates", lambda: rows)
+    totals = compute_patron_fee_totals(AS_OF)
+
+    assert totals['loans_scanned'] == 5
+    assert totals['overdue_loans'] == 3
+    assert totals['total_fees'] == 23.00
+    assert totals['patrons'] == {
+        "111111": {'fee_amount': 8.00, 'overdue_loans': 2, 'max_days_overdue': 10},
+        "222222": {'fee_amount': 15.00, 'overdue_loans': 1, 'max_days_overdue': 60},
+    }
+
+def test_engine_agrees_with_per_book_calculation(isolated_db):
+    from services.library_service import calculate_late_fee_for_book
+
+    now = datetime.now()
+    conn = sqlite3.connect(isolated_db)
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 1, 0)',
+        [(f'Book {i}', 'Author', f'{9780000000000 + i}') for i in range(40)],
+    )
+    records = []
+    for i in range(40):
+        patron_id = f'{100000 + i % 4}'
+        due = now - timedelta(days=i - 5, hours=3)
+        records.append((patron_id, i + 1, (due - timedelta(days=14)).isoformat(), due.isoformat()))
+    conn.executemany(
+        'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+        records,
+    )
+    conn.commit()
+    conn.close()
+
+    loans = compute_loan_fees(now)
+    for patron_id, book_id, days, cents in zip(loans['patron_id'], loans['book_id'],
+                                               loans['days_overdue'], loans['fee_cents']):
+        scalar = calculate_late_fee_for_book(str(patron_id), int(book_id))
+        assert (int(days), cents / 100) == (scalar['days_overdue'], scalar['fee_amount'])
+
+    totals = compute_patron_fee_totals(now)
+    for patron_id, summary in totals['patrons'].items():
+        expected = sum(calculate_late_fee_for_book(patron_id, i + 1)['fee_amount']
+                       for i, record in enumerate(records) if record[0] == patron_id)
+        assert summary['fee_amount'] == pytest.approx(expected)
@@ -0,0 +1,104 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.fee_ledger import FEE_CAP_DAYS, check_fee_ledger, refresh_fee_ledger
+from services.library_service import (
+    calculate_late_fee_for_book, compute_late_fee, fee_ledger_is_current, get_patron_status_report,
+    return_book_by_patron, LATE_FEE_MAX
+)
+
+def add_loans(path, loans):
+    """Insert one book and one open loan per (patron_id, days_overdue) pair; returns the book ids."""
+    now = datetime.now()
+    conn = sqlite3.connect(path)
+    book_ids = []
+    for patron_id, days_overdue in loans:
+        cur = conn.execute(
+            'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 1, 0)',
+            (f'Book {patron_id}-{days_overdue}', 'Author', f'{patron_id}{days_overdue + 5000:07d}'),
+        )
+        due = now - timedelta(days=days_overdue)
+        conn.execute(
+            'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+            (patron_id, cur.lastrowid, (due - timedelta(days=14)).isoformat(), due.isoformat()),
+        )
+        book_ids.append(cur.lastrowid)
+    conn.commit()
+    conn.close()
+    return book_ids
+
+def test_cap_days_is_first_day_at_max_fee():
+    now = datetime.now()
+    assert compute_late_fee(now - timedelta(days=FEE_CAP_DAYS), now)['fee_amount'] == LATE_FEE_MAX
+    assert compute_late_fee(now - timedelta(days=FEE_CAP_DAYS - 1), now)['fee_amount'] < LATE_FEE_MAX
+
+def test_ledger_not_current_until_refreshed(isolated_db):
+    add_loans(isolated_db, [("123456", 3)])
+    assert not fee_ledger_is_current()
+    result = refresh_fee_ledger()
+    assert result['mode'] == 'full' and result['loans_priced'] == 1
+    assert fee_ledger_is_current()
+
+def test_fee_api_and_report_read_the_ledger(isolated_db, monkeypatch):
+    first, second, _ = add_loans(isolated_db, [("123456", 3), ("123456", 10), ("123456", -2)])
+    refresh_fee_ledger()
+
+    # Once current, no fee is recomputed from due dates
+    monkeypatch.setattr("services.library_service.compute_late_fee",
+                        lambda *a, **k: pytest.fail("fee recomputed"))
+
+    assert calculate_late_fee_for_book("123456", first) == {'fee_amount': 1.50, 'days_overdue': 3, 'status': 'ok'}
+    assert calculate_late_fee_for_book("123456", second)['fee_amount'] == 6.50
+    assert calculate_late_fee_for_book("654321", first)['status'] == 'no_active_loan'
+
+    report = get_patron_status_report("123456")
+    assert report['total_late_fees'] == 8.00
+    assert sorted(entry['fee_amount'] for entry in report['current_borrows']) == [0.0, 1.50, 6.50]
+
+def test_loans_created_after_the_refresh_are_priced_from_their_due_date(isolated_db):
+    add_loans(isolated_db, [("123456", 3)])
+    refresh_fee_ledger()
+
+    # Back-dated loan added after today's refresh: the ledger has no row for it yet
+    (late,) = add_loans(isolated_db, [("123456", 10)])
+    assert fee_ledger_is_current()
+    assert calculate_late_fee_for_book("123456", late) == {'fee_amount': 6.50, 'days_overdue': 10, 'status': 'ok'}
+    assert get_patron_status_report("123456")['total_late_fees'] == 8.00
+
+def test_incremental_refresh_only_reprices_loans_that_can_change(isolated_db):
+    add_loans(isolated_db, [("123456", 2), ("123456", 40), ("234567", -1)])
+    yesterday = datetime.now() - timedelta(days=1)
+    assert refresh_fee_ledger(yesterday)['loans_priced'] == 2
+
+    # New loan since the last run, overdue already (e.g. back-filled data)
+    add_loans(isolated_db, [("345678", 60)])
+    result = refresh_fee_ledger()
+    assert result['mode'] == 'incremental'
+    # The 2-day loan moved to 3 days; the 40-day loan is capped and skipped;
+    # the new loan is picked up by its id; the -1 day loan is due today (not overdue)
+    assert result['loans_priced'] == 2
+    assert check_fee_ledger() == []
+
+def test_returned_loan_leaves_the_ledger(isolated_db):
+    (book_id,) = add_loans(isolated_db, [("123456", 5)])
+    refresh_fee_ledger()
+    success, _ = return_book_by_patron("123456", book_id)
+    assert success
+    assert calculate_late_fee_for_book("123456", book_id)['status'] == 'no_active_loan'
+    assert check_fee_ledger() == []
+
+def test_checker_reports_drift(isolated_db):
+    (book_id,) = add_loans(isolated_db, [("123456", 5)])
+    refresh_fee_ledger()
+    conn = sqlite3.connect(isolated_db)
+    conn.execute('UPDATE fees SET fee_cents = 100')
+    conn.commit()
+    conn.close()
+
+    assert check_fee_ledger() == [
+        {'patron_id': "123456", 'book_id': book_id, 'ledger_fee': 1.00, 'expected_fee': 2.50}
+    ]
+    refresh_fee_ledger(full=True)
+    assert check_fee_ledger() == []
@@ -0,0 +1,74 @@
+import pytest
+
+import database
+import services.library_service as library_service
+from services.library_service import search_books_in_catalog
+
+
+def _add(title, author, isbn):
+    assert database.insert_book(title, author, isbn, 1, 1)
+
+
+@pytest.fixture()
+def catalog(isolated_db):
+    _add("Clean Code", "Robert C. Martin", "9780132350884")
+    _add("Great Expectations", "Charles Dickens", "9780141439563")
+    _add("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565")
+    _add("Refactoring", "Martin Fowler", "9780201485677")
+    return isolated_db
+
+
+def test_fulltext_index_is_used_and_never_loads_whole_catalog(catalog, monkeypatch):
+    def fail():
+        raise AssertionError("get_all_books should not be called")
+    monkeypatch.setattr(library_service, "get_all_books", fail)
+
+    results = search_books_in_catalog("GREAT", "title")
+    titles = [r["title"] for r in results]
+
+    assert set(titles) == {"Great Expectations", "The Great Gatsby"}
+    # Prefix match ranks first
+    assert titles[0] == "Great Expectations"
+
+
+def test_fulltext_matches_partial_words_like_substring_mode(catalog):
+    for term, field in [("actor", "title"), ("MARTIN", "author"), ("t C", "author"), ("ckens", "author")]:
+        fulltext = {b["id"] for b in search_books_in_catalog(term, field, mode="fulltext")}
+        substring = {b["id"] for b in search_books_in_catalog(term, field, mode="substring")}
+        assert fulltext == substring and fulltext
+
+
+def test_results_have_full_book_rows(catalog):
+    (book,) = search_books_in_catalog("gatsby", "title")
+    assert book["isbn"] == "9780743273565"
+    assert book["available_copies"] == 1
+
+
+def test_short_terms_fall_back_to_substring_scan(catalog):
+    assert {b["title"] for b in search_books_in_catalog("Gr", "title")} == {"Great Expectations", "The Great Gatsby"}
+
+
+def test_index_follows_inserted_and_renamed_books(catalog):
+    _add("Dune", "Frank Herbert", "9780441013593")
+    assert [b["title"] for b in search_books_in_catalog("dune", "title")] == ["Dune"]
+
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET title = 'Dune Messiah' WHERE isbn = '9780441013593'")
+    conn.commit()
+    conn.close()
+    assert [b["title"] for b in search_books_in_catalog("messiah", "title")] == ["Dune Messiah"]
+
+    # Availability changes do not touch the index
+    book_id = database.get_book_by_isbn("9780441013593")["id"]
+    assert database.update_book_availability(book_id, -1)
+    assert search_books_in_catalog("messiah", "title")[0]["available_copies"] == 0
+
+
+def test_quotes_in_search_term_are_literal(catalog):
+    _add('The "Quoted" Book', "Author", "9780000000001")
+    assert [b["isbn"] for b in search_books_in_catalog('"Quoted"', "title")] == ["9780000000001"]
+
+
+def test_invalid_mode_raises_value_error():
+    with pytest.raises(ValueError):
+        search_books_in_catalog("anything", "title", mode="fuzzy")
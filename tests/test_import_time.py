@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time allowed for the service layer, in microseconds
+IMPORT_BUDGET_US = 100_000
+
+# Heavy modules that only specific features need, imported lazily by them
+LAZY_MODULES = ('asyncio', 'numpy', 'flask', 'concurrent.futures')
+
+
+def run_import(module, cwd):
+    """Import a module in a fresh interpreter; returns {module name: cumulative microseconds}."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, env={**os.environ, 'PYTHONPATH': REPO_ROOT}, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_service_layer_import_stays_within_budget(tmp_path):
+    # Best of three, so a busy machine does not fail the build
+    runs = [run_import('services.library_service', tmp_path) for _ in range(3)]
+    best = min(run['services.library_service'] for run in runs)
+    assert best < IMPORT_BUDGET_US, f"import took {best / 1000:.1f}ms"
+    assert not [name for name in LAZY_MODULES if name in runs[0]]
+
+
+@pytest.mark.parametrize('module', ['database', 'library_service', 'app'])
+def test_import_does_not_touch_the_database(tmp_path, module):
+    run_import(module, tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_init_database_is_idempotent(isolated_db):
+    import database
+    from migrations import get_schema_version, LATEST_VERSION
+
+    database.init_database()
+    database.init_database()
+    conn = database.get_db_connection()
+    assert get_schema_version(conn) == LATEST_VERSION
+    conn.close()
@@ -0,0 +1,74 @@
+import sqlite3
+
+import database
+from migrations import LATEST_VERSION, MIGRATIONS, apply_migrations, get_schema_version
+
+
+def _plan(conn, sql, params):
+    return " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def test_init_database_brings_fresh_database_to_latest_version(isolated_db):
+    conn = sqlite3.connect(isolated_db)
+    assert get_schema_version(conn) == LATEST_VERSION
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+
+    assert "idx_borrow_records_active_patron" in indexes
+    assert "idx_borrow_records_book_return" in indexes
+
+
+def test_existing_database_is_upgraded_in_place_and_keeps_rows(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES ('Dune', 'Frank Herbert', '9780441013593', 1, 1)")
+    conn.execute("""
+        CREATE TABLE borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT
+        )
+    """)
+    conn.execute("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES ('123456', 1, 'a', 'b')")
+    conn.commit()
+    assert get_schema_version(conn) == 0
+
+    assert apply_migrations(conn) == [version for version, _, _ in MIGRATIONS]
+    assert get_schema_version(conn) == LATEST_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM borrow_records").fetchone()[0] == 1
+    # Books that predate the full-text index are searchable after the upgrade
+    assert conn.execute("SELECT rowid FROM books_fts WHERE books_fts MATCH 'dun'").fetchall() == [(1,)]
+
+    # Second run is a no-op
+    assert apply_migrations(conn) == []
+    conn.close()
+
+
+def test_hot_loan_queries_use_the_new_indexes(isolated_db):
+    conn = sqlite3.connect(isolated_db)
+
+    count_plan = _plan(conn, """
+        SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL
+    """, ("123456",))
+    return_plan = _plan(conn, """
+        UPDATE borrow_records SET return_date = ?
+        WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+    """, ("x", "123456", 1))
+    conn.close()
+
+    assert "idx_borrow_records_active_patron" in count_plan
+    assert "idx_borrow_records_active_patron" in return_plan
+    assert "SCAN borrow_records" not in count_plan
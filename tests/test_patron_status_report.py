@@ -32,13 +32,7 @@ def test_status_happy_path_two_current_borrows_and_fees(monkeypatch):
         borrowed_item(1, "Clean Code", days_overdue=8),
         borrowed_item(2, "Dune", days_overdue=0),
     ]
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: current)
-    monkeypatch.setattr(library_service, "get_patron_borrow_count", lambda pid: 2)
-
-    def fee_for(patron_id, book_id):
-        return {"fee_amount": 4.50, "days_overdue": 8, "status": "ok"} if book_id == 1 else \
-               {"fee_amount": 0.00, "days_overdue": 0, "status": "ok"}
-    monkeypatch.setattr(library_service, "calculate_late_fee_for_book", fee_for)
+    monkeypatch.setattr(library_service, "get_patron_loans", lambda pid, *args: (current, [], False))
 
     report = get_patron_status_report("123456")
     assert isinstance(report, dict)
@@ -57,10 +51,7 @@ def test_status_no_current_borrows_zero_fees_and_empty_history(monkeypatch):
     """
     R7: empty borrowed list => count=0, total late fees=0.00, history exists (may be empty).
     """
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: [])
-    monkeypatch.setattr(library_service, "get_patron_borrow_count", lambda pid: 0)
-    monkeypatch.setattr(library_service, "calculate_late_fee_for_book",
-                        lambda pid, bid: {"fee_amount": 0.0, "days_overdue": 0, "status": "ok"})
+    monkeypatch.setattr(library_service, "get_patron_loans", lambda pid, *args: ([], [], False))
 
     report = get_patron_status_report("123456")
     assert report["current_borrow_count"] == 0
@@ -76,10 +67,7 @@ def test_status_includes_overdue_flag_from_current_loans(monkeypatch):
         borrowed_item(1, "X", days_overdue=1),
         borrowed_item(2, "Y", days_overdue=0),
     ]
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: current)
-    monkeypatch.setattr(library_service, "get_patron_borrow_count", lambda pid: 2)
-    monkeypatch.setattr(library_service, "calculate_late_fee_for_book",
-                        lambda pid, bid: {"fee_amount": 0.5 if bid == 1 else 0.0, "days_overdue": 1 if bid == 1 else 0, "status": "ok"})
+    monkeypatch.setattr(library_service, "get_patron_loans", lambda pid, *args: (current, [], False))
 
     report = get_patron_status_report("123456")
     flags = [b.get("is_overdue") for b in report["current_borrows"]]
@@ -91,10 +79,7 @@ def test_status_validates_patron_id_format(monkeypatch):
     R7 should honor the global constraint: patron ID must be exactly 6 digits.
     Implementation may raise or return an error status; accept either.
     """
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: [])
-    monkeypatch.setattr(library_service, "get_patron_borrow_count", lambda pid: 0)
-    monkeypatch.setattr(library_service, "calculate_late_fee_for_book",
-                        lambda pid, bid: {"fee_amount": 0.0, "days_overdue": 0, "status": "ok"})
+    monkeypatch.setattr(library_service, "get_patron_loans", lambda pid, *args: ([], [], False))
 
     try:
         report = get_patron_status_report("12345")  # invalid
@@ -105,13 +90,42 @@ def test_status_validates_patron_id_format(monkeypatch):
 
 def test_status_history_key_is_present_and_list_type(monkeypatch):
     """
-    R7 requires a borrowing history in the report. If you later add a DB helper like
-    get_patron_borrow_history, wire it here. For now we only assert existence & type.
+    R7 requires a borrowing history in the report; with no returned loans it is an empty list.
     """
-    monkeypatch.setattr(library_service, "get_patron_borrowed_books", lambda pid: [])
-    monkeypatch.setattr(library_service, "get_patron_borrow_count", lambda pid: 0)
-    monkeypatch.setattr(library_service, "calculate_late_fee_for_book",
-                        lambda pid, bid: {"fee_amount": 0.0, "days_overdue": 0, "status": "ok"})
+    monkeypatch.setattr(library_service, "get_patron_loans", lambda pid, *args: ([], [], False))
 
     report = get_patron_status_report("123456")
     assert "history" in report and isinstance(report["history"], list)
+
+
+def test_status_history_pages_through_returned_loans(isolated_db):
+    """
+    R7: history lists returned loans (most recent first) with the fee charged at return,
+    one page at a time, alongside the current loans.
+    """
+    import database
+
+    now = datetime.now()
+    # (due days ago, returned days ago or None)
+    loans = [(20, 18), (15, 16), (12, 3), (5, 1), (8, None)]
+    for i, (due_ago, returned_ago) in enumerate(loans):
+        database.insert_book(f"Book {i}", "Author", f"978000000000{i}", 1, 1)
+        due = now - timedelta(days=due_ago)
+        database.insert_borrow_record("123456", i + 1, due - timedelta(days=14), due)
+        if returned_ago is not None:
+            database.update_borrow_record_return_date("123456", i + 1, now - timedelta(days=returned_ago))
+    database.insert_borrow_record("654321", 1, now, now + timedelta(days=14))  # another patron
+
+    first = get_patron_status_report("123456", history_limit=3)
+    assert [b["title"] for b in first["current_borrows"]] == ["Book 4"]
+    assert first["current_borrow_count"] == 1
+    assert first["total_late_fees"] == 4.50  # 8 days overdue
+    assert [h["title"] for h in first["history"]] == ["Book 3", "Book 2", "Book 1"]
+    assert [h["fee_amount"] for h in first["history"]] == [2.00, 5.50, 0.00]
+    assert [h["is_overdue"] for h in first["history"]] == [True, True, False]
+    assert first["history_has_more"] is True
+
+    second = get_patron_status_report("123456", history_limit=3, history_offset=3)
+    assert [h["title"] for h in second["history"]] == ["Book 0"]
+    assert second["history"][0]["fee_amount"] == 1.00
+    assert second["history_has_more"] is False
@@ -0,0 +1,144 @@
+import sqlite3
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+
+import database
+from services.library_service import pay_all_late_fees, refund_late_fee_payment
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture(scope="module")
+def app():
+    from app import create_app
+    return create_app(testing=True)
+
+
+@pytest.fixture
+def overdue_loans(isolated_db):
+    """Patron 123456 holds three books: 3 and 10 days overdue, and one not yet due."""
+    now = datetime.now()
+    conn = sqlite3.connect(isolated_db)
+    book_ids = []
+    for i, days_overdue in enumerate([3, 10, -4]):
+        cur = conn.execute(
+            'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 1, 0)',
+            (f'Book {i}', 'Author', f'{9780000000000 + i}'),
+        )
+        due = now - timedelta(days=days_overdue)
+        conn.execute(
+            'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+            ("123456", cur.lastrowid, (due - timedelta(days=14)).isoformat(), due.isoformat()),
+        )
+        book_ids.append(cur.lastrowid)
+    conn.commit()
+    conn.close()
+    return book_ids
+
+
+def gateway_mock():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_123456_1", "Payment of $8.00 processed successfully")
+    gateway.refund_payment.return_value = (True, "Refund processed")
+    return gateway
+
+
+def test_one_charge_for_all_overdue_books(overdue_loans):
+    gateway = gateway_mock()
+    success, message, transaction_id = pay_all_late_fees("123456", gateway)
+
+    assert success is True
+    assert "Payment successful" in message
+    assert transaction_id == "txn_123456_1"
+    gateway.process_payment.assert_called_once_with(
+        patron_id="123456",
+        amount=8.00,
+        description="Late fees for 2 books: 'Book 1' $6.50; 'Book 0' $1.50",  # borrow order
+    )
+
+
+def test_no_fees_or_bad_patron_does_not_call_gateway(overdue_loans):
+    gateway = gateway_mock()
+    assert pay_all_late_fees("654321", gateway) == (False, "No late fees to pay.", None)
+    assert pay_all_late_fees("12a456", gateway)[0] is False
+    gateway.process_payment.assert_not_called()
+
+
+def test_second_call_charges_nothing(overdue_loans):
+    gateway = gateway_mock()
+    assert pay_all_late_fees("123456", gateway)[0] is True
+
+    assert pay_all_late_fees("123456", gateway) == (False, "No late fees to pay.", None)
+    assert pay_all_late_fees("123456", gateway) == (False, "No late fees to pay.", None)
+    gateway.process_payment.assert_called_once()
+
+
+def test_refunded_fee_is_owed_again(overdue_loans):
+    first = overdue_loans[0]
+    gateway = gateway_mock()
+    gateway.process_payment.side_effect = [(True, "txn_123456_1", "ok"), (True, "txn_123456_2", "ok")]
+    _, _, transaction_id = pay_all_late_fees("123456", gateway)
+    assert refund_late_fee_payment(transaction_id, 1.00, gateway, book_id=first)[0] is True
+
+    assert pay_all_late_fees("123456", gateway)[0] is True
+    assert gateway.process_payment.call_args.kwargs["amount"] == 1.00
+
+
+def test_declined_payment_records_nothing(overdue_loans):
+    gateway = gateway_mock()
+    gateway.process_payment.return_value = (False, "", "Payment declined: amount exceeds limit")
+    assert pay_all_late_fees("123456", gateway) == (
+        False, "Payment failed: Payment declined: amount exceeds limit", None)
+    assert refund_late_fee_payment("txn_123456_1", 1.50, gateway, book_id=overdue_loans[0]) == (
+        False, "No late fee was paid for this book in that transaction.")
+
+
+def test_refund_individual_books_up_to_their_share(overdue_loans):
+    first, second, third = overdue_loans
+    gateway = gateway_mock()
+    _, _, transaction_id = pay_all_late_fees("123456", gateway)
+
+    assert refund_late_fee_payment(transaction_id, 1.50, gateway, book_id=first) == (True, "Refund processed")
+    assert refund_late_fee_payment(transaction_id, 0.50, gateway, book_id=first) == (
+        False, "Refund amount exceeds the late fee paid for this book.")
+    assert refund_late_fee_payment(transaction_id, 4.00, gateway, book_id=second)[0] is True
+    assert refund_late_fee_payment(transaction_id, 2.50, gateway, book_id=second)[0] is True
+    assert refund_late_fee_payment(transaction_id, 1.00, gateway, book_id=third) == (
+        False, "No late fee was paid for this book in that transaction.")
+    assert gateway.refund_payment.call_count == 3
+
+
+def test_failed_refund_releases_the_share(overdue_loans):
+    first = overdue_loans[0]
+    gateway = gateway_mock()
+    _, _, transaction_id = pay_all_late_fees("123456", gateway)
+
+    gateway.refund_payment.side_effect = ConnectionError("timeout")
+    assert refund_late_fee_payment(transaction_id, 1.50, gateway, book_id=first) == (
+        False, "Refund processing error: timeout")
+
+    gateway.refund_payment.side_effect = None
+    assert refund_late_fee_payment(transaction_id, 1.50, gateway, book_id=first)[0] is True
+
+
+def test_pay_all_route_returns_allocation(app, overdue_loans, monkeypatch):
+    monkeypatch.setattr("services.library_service.PaymentGateway", gateway_mock)
+    client = app.test_client()
+
+    resp = client.post("/api/late_fees/123456/pay")
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["transaction_id"] == "txn_123456_1"
+    assert data["total"] == 8.00
+    assert data["items"] == [{"book_id": overdue_loans[0], "amount": 1.50},
+                             {"book_id": overdue_loans[1], "amount": 6.50}]
+
+    assert client.post("/api/late_fees/654321/pay").status_code == 400
+
+
+def test_failed_refund_update_hands_the_connection_back():
+    # The shared test database is reset to the base schema, without fee_payment_items
+    with pytest.raises(sqlite3.OperationalError):
+        database.update_fee_payment_refund("txn_123456_1", 1, 100)
+    assert database.get_pool_stats()["in_use"] == 0
@@ -0,0 +1,308 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+from database import claim_outbox_entries, get_outbox_entry, insert_fee_payment_items, update_outbox_entry
+from services.payment_outbox import (
+    PaymentOutboxWorkers, enqueue_late_fee_payment, enqueue_late_fee_refund, get_payment_status
+)
+from services.payment_resilience import ResilientPaymentGateway
+
+
+class FakeGateway:
+    """Gateway with injected latency; scripted outcomes are consumed one per call."""
+
+    def __init__(self, latency=0.0, outcomes=()):
+        self.latency = latency
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _next(self, default):
+        time.sleep(self.latency)
+        with self.lock:
+            outcome = self.outcomes.pop(0) if self.outcomes else default
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def process_payment(self, patron_id, amount, description=""):
+        with self.lock:
+            self.calls.append(("payment", patron_id, amount))
+        return self._next((True, f"txn_{patron_id}_{len(self.calls)}", f"Payment of ${amount:.2f} processed successfully"))
+
+    def refund_payment(self, transaction_id, amount):
+        with self.lock:
+            self.calls.append(("refund", transaction_id, amount))
+        return self._next((True, f"Refund of ${amount:.2f} processed successfully."))
+
+
+@pytest.fixture
+def overdue_books(isolated_db):
+    """Twenty books, each borrowed by its own patron and 3 days overdue ($1.50)."""
+    now = datetime.now()
+    conn = sqlite3.connect(isolated_db)
+    loans = []
+    for i in range(20):
+        cur = conn.execute(
+            'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 1, 0)',
+            (f'Book {i}', 'Author', f'{9780000000000 + i}'),
+        )
+        patron_id = f'{200000 + i}'
+        conn.execute(
+            'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+            (patron_id, cur.lastrowid, (now - timedelta(days=17)).isoformat(), (now - timedelta(days=3)).isoformat()),
+        )
+        loans.append((patron_id, cur.lastrowid))
+    conn.commit()
+    conn.close()
+    return loans
+
+
+def workers_for(gateway, **kwargs):
+    kwargs.setdefault('base_backoff_seconds', 0)
+    return PaymentOutboxWorkers(gateway_factory=lambda: gateway, **kwargs)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_enqueue_returns_before_the_gateway_is_called(overdue_books):
+    patron_id, book_id = overdue_books[0]
+    started = time.perf_counter()
+    success, message, payment_id = enqueue_late_fee_payment(patron_id, book_id)
+
+    assert time.perf_counter() - started < 0.2
+    assert (success, message) == (True, "Payment of $1.50 queued.")
+    assert get_payment_status(payment_id)['status'] == 'pending'
+
+
+def test_enqueue_validates_like_pay_late_fees(overdue_books):
+    assert enqueue_late_fee_payment("12345", 1) == (False, "Invalid patron ID. Must be exactly 6 digits.", None)
+    assert enqueue_late_fee_payment("999999", 1) == (False, "No late fees to pay for this book.", None)
+    assert enqueue_late_fee_refund("bad", 1.0) == (False, "Invalid transaction ID.", None)
+
+
+def test_worker_pool_drains_queue_concurrently(overdue_books):
+    gateway = FakeGateway(latency=0.05)
+    ids = [enqueue_late_fee_payment(patron_id, book_id)[2] for patron_id, book_id in overdue_books]
+
+    workers = workers_for(gateway, workers=5, poll_seconds=0.01)
+    started = time.perf_counter()
+    workers.start()
+    try:
+        assert wait_for(lambda: all(get_payment_status(i)['status'] == 'succeeded' for i in ids))
+    finally:
+        workers.stop()
+    elapsed = time.perf_counter() - started
+
+    assert len(gateway.calls) == 20
+    # 20 calls of 50ms over 5 workers, well under the 1s a single worker needs
+    assert elapsed < 0.8
+    assert get_payment_status(ids[0])['transaction_id'].startswith("txn_")
+
+
+def test_idempotency_key_queues_one_call(overdue_books):
+    patron_id, book_id = overdue_books[0]
+    first = enqueue_late_fee_payment(patron_id, book_id, "form-42")
+    second = enqueue_late_fee_payment(patron_id, book_id, "form-42")
+    assert second == (True, "Payment already queued.", first[2])
+
+    gateway = FakeGateway()
+    assert workers_for(gateway).run_once(limit=10) == 1
+    assert len(gateway.calls) == 1
+
+
+def test_gateway_errors_are_retried_with_backoff(overdue_books, isolated_db):
+    patron_id, book_id = overdue_books[0]
+    _, _, payment_id = enqueue_late_fee_payment(patron_id, book_id)
+    gateway = FakeGateway(outcomes=[ConnectionError("timeout"), ConnectionError("timeout")])
+    workers = workers_for(gateway, base_backoff_seconds=30)
+
+    before = time.time()
+    assert workers.run_once() == 1
+    entry = get_outbox_entry(payment_id)
+    assert entry['status'] == 'pending'
+    assert entry['message'] == "Attempt 1 failed: timeout"
+    assert before + 15 <= entry['next_attempt_at'] <= time.time() + 30
+
+    # Not due yet
+    assert workers.run_once() == 0
+    assert workers.backoff_seconds(3) <= 120
+
+    # Skip the wait, and retry straight away from now on
+    workers.base_backoff_seconds = 0
+    conn = sqlite3.connect(isolated_db)
+    conn.execute('UPDATE payment_outbox SET next_attempt_at = 0')
+    conn.commit()
+    conn.close()
+    assert workers.run_once() == 1
+    assert workers.run_once() == 1
+    status = get_payment_status(payment_id)
+    assert (status['status'], status['attempts']) == ('succeeded', 3)
+
+
+def test_gives_up_after_max_attempts(overdue_books):
+    patron_id, book_id = overdue_books[0]
+    _, _, payment_id = enqueue_late_fee_payment(patron_id, book_id)
+    gateway = FakeGateway(outcomes=[ConnectionError("down")] * 5)
+    workers = workers_for(gateway, max_attempts=3)
+
+    while workers.run_once():
+        pass
+    status = get_payment_status(payment_id)
+    assert (status['status'], status['attempts']) == ('failed', 3)
+    assert status['message'] == "Gave up after 3 attempts: down"
+
+
+def test_decline_is_final(overdue_books):
+    patron_id, book_id = overdue_books[0]
+    _, _, payment_id = enqueue_late_fee_payment(patron_id, book_id)
+    gateway = FakeGateway(outcomes=[(False, "", "Payment declined: amount exceeds limit")])
+
+    workers = workers_for(gateway)
+    assert workers.run_once() == 1
+    assert workers.run_once() == 0
+    status = get_payment_status(payment_id)
+    assert (status['status'], status['attempts']) == ('failed', 1)
+    assert status['message'] == "Payment failed: Payment declined: amount exceeds limit"
+
+
+def test_failed_payment_can_be_queued_again(overdue_books):
+    patron_id, book_id = overdue_books[0]
+    _, _, payment_id = enqueue_late_fee_payment(patron_id, book_id)
+    gateway = FakeGateway(outcomes=[(False, "", "Payment declined: card expired")])
+    workers = workers_for(gateway)
+    workers.run_once()
+    assert get_payment_status(payment_id)['status'] == 'failed'
+
+    assert enqueue_late_fee_payment(patron_id, book_id) == (True, "Payment of $1.50 queued.", payment_id)
+    status = get_payment_status(payment_id)
+    assert (status['status'], status['attempts'], status['message']) == ('pending', 0, None)
+    assert workers.run_once() == 1
+    assert get_payment_status(payment_id)['status'] == 'succeeded'
+    assert enqueue_late_fee_payment(patron_id, book_id) == (False, "No late fees to pay for this book.", None)
+
+
+def test_failed_refund_can_be_queued_again(overdue_books):
+    insert_fee_payment_items("txn_200000_1", "200000", [(1, 150)], datetime.now())
+    _, _, refund_id = enqueue_late_fee_refund("txn_200000_1", 1.50, book_id=1)
+    workers = workers_for(FakeGateway(outcomes=[(False, "Gateway busy")]))
+    workers.run_once()
+    assert get_payment_status(refund_id)['status'] == 'failed'
+
+    assert enqueue_late_fee_refund("txn_200000_1", 1.50, book_id=1) == (True, "Refund of $1.50 queued.", refund_id)
+    # The share is reserved again while queued
+    assert enqueue_late_fee_refund("txn_200000_1", 0.50, book_id=1)[0] is False
+    workers.run_once()
+    assert get_payment_status(refund_id)['status'] == 'succeeded'
+
+
+def test_charge_that_cannot_be_recorded_is_not_charged_again(overdue_books, monkeypatch):
+    patron_id, book_id = overdue_books[0]
+    _, _, payment_id = enqueue_late_fee_payment(patron_id, book_id)
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr("services.payment_outbox.insert_payment", locked)
+    gateway = FakeGateway()
+    workers = workers_for(gateway, lease_seconds=0)
+    assert workers.run_once() == 1
+
+    status = get_payment_status(payment_id)
+    assert status['status'] == 'succeeded'
+    assert status['transaction_id'] == f"txn_{patron_id}_1"
+    assert "could not be recorded: database is locked" in status['message']
+    assert workers.run_once() == 0
+    assert len(gateway.calls) == 1
+
+
+def test_timed_out_charge_is_parked_for_review(overdue_books):
+    patron_id, book_id = overdue_books[0]
+    _, _, payment_id = enqueue_late_fee_payment(patron_id, book_id)
+    slow = FakeGateway(latency=0.3)
+    gateway = ResilientPaymentGateway(slow, max_deadline=0.05)
+    workers = workers_for(gateway)
+    try:
+        assert workers.run_once() == 1
+    finally:
+        gateway.close()
+
+    status = get_payment_status(payment_id)
+    assert (status['status'], status['attempts']) == ('review', 1)
+    assert status['message'].startswith("Outcome unknown, check with the payment provider")
+    # Neither a worker nor the same request charges it again
+    assert claim_outbox_entries(1, time.time() + 3600, lease_seconds=60) == []
+    assert enqueue_late_fee_payment(patron_id, book_id) == (True, "Payment already queued.", payment_id)
+    assert len(slow.calls) == 1
+
+
+def test_expired_lease_is_claimed_again(overdue_books):
+    patron_id, book_id = overdue_books[0]
+    _, _, payment_id = enqueue_late_fee_payment(patron_id, book_id)
+
+    # A worker claims the entry and dies without finishing
+    assert len(claim_outbox_entries(1, time.time(), lease_seconds=0)) == 1
+    assert get_payment_status(payment_id)['status'] == 'processing'
+
+    gateway = FakeGateway()
+    assert workers_for(gateway).run_once() == 1
+    assert get_payment_status(payment_id)['status'] == 'succeeded'
+
+
+def test_failed_book_refund_releases_its_share(overdue_books):
+    insert_fee_payment_items("txn_200000_1", "200000", [(1, 150), (2, 650)], datetime.now())
+    success, message, refund_id = enqueue_late_fee_refund("txn_200000_1", 6.50, book_id=2)
+    assert (success, message) == (True, "Refund of $6.50 queued.")
+    # The share is reserved while queued
+    assert enqueue_late_fee_refund("txn_200000_1", 1.00, book_id=2)[0] is False
+    # Same request again is the same entry
+    assert enqueue_late_fee_refund("txn_200000_1", 6.50, book_id=2) == (True, "Refund already queued.", refund_id)
+
+    gateway = FakeGateway(outcomes=[(False, "Invalid refund amount")])
+    workers_for(gateway).run_once()
+    assert get_payment_status(refund_id)['status'] == 'failed'
+    assert enqueue_late_fee_refund("txn_200000_1", 1.00, book_id=2)[0] is True
+
+
+def test_failed_outbox_update_releases_the_write_lock(overdue_books):
+    _, _, entry_id = enqueue_late_fee_payment(*overdue_books[0])
+    with pytest.raises(sqlite3.IntegrityError):
+        update_outbox_entry(entry_id, None, "no status")
+    assert database.get_pool_stats()["in_use"] == 0
+
+    # Another thread can still write
+    results = []
+    thread = threading.Thread(target=lambda: results.append(update_outbox_entry(entry_id, 'failed', 'done')))
+    thread.start()
+    thread.join()
+    assert results == [None]
+    assert get_outbox_entry(entry_id)['status'] == 'failed'
+
+
+def test_queue_and_poll_routes(overdue_books):
+    from app import create_app
+    client = create_app(testing=True).test_client()
+    patron_id, book_id = overdue_books[0]
+
+    resp = client.post(f"/api/late_fees/{patron_id}/{book_id}/pay", headers={"Idempotency-Key": "abc"})
+    assert resp.status_code == 202
+    data = resp.get_json()
+    assert resp.headers["Location"] == data["status_url"] == f"/api/payments/{data['payment_id']}"
+
+    assert client.get(data["status_url"]).get_json()["status"] == "pending"
+    workers_for(FakeGateway()).run_once()
+    assert client.get(data["status_url"]).get_json()["status"] == "succeeded"
+
+    assert client.get("/api/payments/999").status_code == 404
+    assert client.post("/api/payments/refunds", json={"transaction_id": "bad", "amount": 1}).status_code == 400
@@ -0,0 +1,186 @@
+import threading
+import time
+
+import pytest
+
+from services.library_service import pay_late_fees
+from services.payment_resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitOpenError, GatewayTimeout, GatewayUnavailable, RateLimitExceeded,
+    ResilientPaymentGateway
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyGateway:
+    """Fake provider: each method's latency and behaviour can be changed mid-test."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.verify_latencies = []   # consumed one per verify call, then self.latency
+        self.outage = False
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _enter(self, latency=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency if latency is None else latency)
+        if self.outage:
+            raise ConnectionError("provider unavailable")
+
+    def process_payment(self, patron_id, amount, description=""):
+        self._enter()
+        if amount > 1000:
+            return False, "", "Payment declined: amount exceeds limit"
+        return True, f"txn_{patron_id}_1", f"Payment of ${amount:.2f} processed successfully"
+
+    def refund_payment(self, transaction_id, amount):
+        self._enter()
+        return True, "Refund processed"
+
+    def verify_payment_status(self, transaction_id):
+        with self.lock:
+            latency = self.verify_latencies.pop(0) if self.verify_latencies else None
+        self._enter(latency)
+        return {"transaction_id": transaction_id, "status": "completed"}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_passes_results_through_and_declines_do_not_trip(clock):
+    inner = FlakyGateway()
+    gateway = ResilientPaymentGateway(inner, failure_threshold=2, clock=clock)
+
+    assert gateway.process_payment("123456", 5.0, "Late fees") == (
+        True, "txn_123456_1", "Payment of $5.00 processed successfully")
+    for _ in range(3):
+        assert gateway.process_payment("123456", 5000.0)[0] is False
+    assert gateway.refund_payment("txn_123456_1", 5.0) == (True, "Refund processed")
+    assert gateway.breaker.state == CLOSED
+    assert gateway.metrics()['successes'] == 5
+
+
+def test_slow_call_fails_at_its_deadline(clock):
+    inner = FlakyGateway(latency=0.5)
+    gateway = ResilientPaymentGateway(inner, max_deadline=0.05, clock=clock)
+
+    started = time.perf_counter()
+    with pytest.raises(GatewayTimeout):
+        gateway.process_payment("123456", 5.0)
+    assert time.perf_counter() - started < 0.3
+    assert gateway.metrics()['timeouts'] == 1
+
+
+def test_timeout_is_not_reported_as_a_call_that_was_not_made():
+    # Callers retry GatewayUnavailable; a timed-out charge may have gone through
+    assert not issubclass(GatewayTimeout, GatewayUnavailable)
+    assert issubclass(CircuitOpenError, GatewayUnavailable)
+    assert issubclass(RateLimitExceeded, GatewayUnavailable)
+
+
+def test_deadline_adapts_to_observed_latency(clock):
+    gateway = ResilientPaymentGateway(FlakyGateway(latency=0.01), max_deadline=2.0, min_deadline=0.05,
+                                      min_samples=10, clock=clock)
+    assert gateway.deadline('process_payment') == 2.0
+    for _ in range(10):
+        gateway.process_payment("123456", 1.0)
+    assert 0.05 <= gateway.deadline('process_payment') < 0.2
+
+
+def test_breaker_opens_on_outage_and_recovers_through_half_open(clock):
+    inner = FlakyGateway()
+    inner.outage = True
+    gateway = ResilientPaymentGateway(inner, failure_threshold=3, reset_timeout=30, clock=clock)
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            gateway.process_payment("123456", 5.0)
+    assert gateway.breaker.state == OPEN
+
+    # Rejected without touching the provider
+    with pytest.raises(CircuitOpenError):
+        gateway.process_payment("123456", 5.0)
+    assert inner.calls == 3
+
+    # Trial call after the reset timeout fails: open again
+    clock.now += 30
+    with pytest.raises(ConnectionError):
+        gateway.process_payment("123456", 5.0)
+    assert gateway.breaker.state == OPEN
+
+    # Provider back: the next trial closes the breaker
+    inner.outage = False
+    clock.now += 30
+    assert gateway.breaker.allow() and gateway.breaker.state == HALF_OPEN
+    assert not gateway.breaker.allow()   # one trial at a time
+    gateway.breaker.release()
+    assert gateway.process_payment("123456", 5.0)[0] is True
+    assert gateway.breaker.state == CLOSED
+    assert gateway.metrics()['rejected_open'] == 1
+
+
+def test_timeouts_count_as_failures(clock):
+    gateway = ResilientPaymentGateway(FlakyGateway(latency=0.3), max_deadline=0.02,
+                                      failure_threshold=2, clock=clock)
+    for _ in range(2):
+        with pytest.raises(GatewayTimeout):
+            gateway.refund_payment("txn_123456_1", 1.0)
+    with pytest.raises(CircuitOpenError):
+        gateway.refund_payment("txn_123456_1", 1.0)
+
+
+def test_hedged_verify_returns_the_faster_answer(clock):
+    inner = FlakyGateway(latency=0.01)
+    inner.verify_latencies = [0.5]   # first request stalls
+    gateway = ResilientPaymentGateway(inner, hedge_after=0.05, max_deadline=1.0, clock=clock)
+
+    started = time.perf_counter()
+    assert gateway.verify_payment_status("txn_123456_1")["status"] == "completed"
+    assert time.perf_counter() - started < 0.3
+
+    metrics = gateway.metrics()
+    assert (metrics['hedged'], metrics['hedge_wins']) == (1, 1)
+    assert inner.calls == 2
+
+    # A fast first answer is not hedged
+    gateway.verify_payment_status("txn_123456_1")
+    assert gateway.metrics()['hedged'] == 1
+
+
+def test_token_bucket_limits_call_rate(clock):
+    inner = FlakyGateway()
+    gateway = ResilientPaymentGateway(inner, rate=1, burst=2, clock=clock)
+
+    gateway.process_payment("123456", 1.0)
+    gateway.process_payment("123456", 1.0)
+    with pytest.raises(RateLimitExceeded):
+        gateway.process_payment("123456", 1.0)
+    assert inner.calls == 2
+
+    clock.now += 1
+    assert gateway.process_payment("123456", 1.0)[0] is True
+    assert gateway.metrics()['rate_limited'] == 1
+
+
+def test_pay_late_fees_fails_fast_when_circuit_open(clock, mocker):
+    mocker.patch("services.library_service.calculate_late_fee_for_book",
+                 return_value={"fee_amount": 5.0, "days_overdue": 3, "status": "ok"})
+    mocker.patch("services.library_service.get_book_by_id", return_value={"id": 1, "title": "Test Book"})
+    inner = FlakyGateway(latency=0.5)
+    gateway = ResilientPaymentGateway(inner, failure_threshold=1, clock=clock)
+    gateway.breaker.record_failure()
+
+    started = time.perf_counter()
+    success, message, txn = pay_late_fees("123456", 1, gateway)
+    assert time.perf_counter() - started < 0.1
+    assert (success, message, txn) == (False, "Payment processing error: Payment gateway circuit open", None)
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from services.payment_verification import PaymentVerifier
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingGateway:
+    """verify_payment_status with injected latency; 'txn_pending_*' IDs are not settled yet."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def verify_payment_status(self, transaction_id):
+        with self.lock:
+            self.calls.append(transaction_id)
+        time.sleep(self.latency)
+        if transaction_id == "txn_broken":
+            raise ConnectionError("reset by peer")
+        if not transaction_id.startswith("txn_"):
+            return {"status": "not_found", "message": "Transaction not found"}
+        status = "pending" if transaction_id.startswith("txn_pending") else "completed"
+        return {"transaction_id": transaction_id, "status": status}
+
+
+def test_settled_status_is_served_from_cache():
+    gateway = CountingGateway()
+    verifier = PaymentVerifier(gateway)
+
+    assert verifier.verify("txn_123456_1")["status"] == "completed"
+    assert verifier.verify("txn_123456_1")["status"] == "completed"
+    assert gateway.calls == ["txn_123456_1"]
+    stats = verifier.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_unsettled_and_unknown_are_always_rechecked():
+    gateway = CountingGateway()
+    verifier = PaymentVerifier(gateway)
+    for _ in range(2):
+        verifier.verify("txn_pending_1")
+        verifier.verify("bogus")
+    assert len(gateway.calls) == 4
+    assert verifier.stats()["entries"] == 0
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    gateway = CountingGateway()
+    verifier = PaymentVerifier(gateway, ttl_seconds=60, clock=clock)
+
+    verifier.verify("txn_123456_1")
+    clock.now = 59
+    verifier.verify("txn_123456_1")
+    clock.now = 60
+    verifier.verify("txn_123456_1")
+    assert len(gateway.calls) == 2
+    assert verifier.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    gateway = CountingGateway()
+    verifier = PaymentVerifier(gateway, max_entries=2)
+    verifier.verify("txn_a")
+    verifier.verify("txn_b")
+    verifier.verify("txn_a")   # b is now least recently used
+    verifier.verify("txn_c")
+
+    gateway.calls.clear()
+    verifier.verify_many(["txn_a", "txn_b", "txn_c"])
+    assert gateway.calls == ["txn_b"]
+    assert verifier.stats()["evictions"] == 2
+
+
+def test_verify_many_fans_out_and_only_pays_for_new_transactions():
+    gateway = CountingGateway(latency=0.05)
+    verifier = PaymentVerifier(gateway, max_concurrency=50)
+    day_one = [f"txn_{i:06d}_1" for i in range(100)]
+
+    started = time.perf_counter()
+    results = verifier.verify_many(day_one + day_one[:10])   # duplicates checked once
+    # 100 calls of 50ms, 50 at a time, instead of 5s one by one
+    assert time.perf_counter() - started < 1.0
+    assert list(results) == day_one
+    assert len(gateway.calls) == 100
+
+    day_two = day_one + [f"txn_{i:06d}_2" for i in range(10)]
+    verifier.verify_many(day_two)
+    assert len(gateway.calls) == 110
+    stats = verifier.stats()
+    assert stats["hits"] == 100
+    assert stats["gateway_calls"] == 110
+
+
+def test_verify_many_reports_errors_per_transaction():
+    verifier = PaymentVerifier(CountingGateway())
+    results = verifier.verify_many(["txn_ok_1", "txn_broken"])
+    assert results["txn_ok_1"]["status"] == "completed"
+    assert results["txn_broken"] == {"transaction_id": "txn_broken", "status": "error", "message": "reset by peer"}
+    assert verifier.stats()["entries"] == 1
@@ -0,0 +1,174 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+
+import database
+from database import get_payment_balance, insert_payment
+from services.library_service import (
+    get_patron_status_report, pay_all_late_fees, pay_late_fees, refund_late_fee_payment
+)
+from services.payment_outbox import PaymentOutboxWorkers, enqueue_late_fee_payment
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture
+def overdue_books(isolated_db):
+    """Patron 123456 holds two books, 3 days ($1.50) and 10 days ($6.50) overdue."""
+    now = datetime.now()
+    conn = sqlite3.connect(isolated_db)
+    book_ids = []
+    for i, days_overdue in enumerate([3, 10]):
+        cur = conn.execute(
+            'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 1, 0)',
+            (f'Book {i}', 'Author', f'{9780000000000 + i}'),
+        )
+        due = now - timedelta(days=days_overdue)
+        conn.execute(
+            'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+            ("123456", cur.lastrowid, (due - timedelta(days=14)).isoformat(), due.isoformat()),
+        )
+        book_ids.append(cur.lastrowid)
+    conn.commit()
+    conn.close()
+    return book_ids
+
+
+def gateway_mock(transaction_id="txn_123456_1"):
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, transaction_id, "Payment processed successfully")
+    gateway.refund_payment.return_value = (True, "Refund processed")
+    return gateway
+
+
+def test_payment_is_recorded_and_shown_on_status_report(overdue_books):
+    gateway = gateway_mock()
+    success, _, transaction_id = pay_late_fees("123456", overdue_books[1], gateway)
+    assert success
+
+    assert get_payment_balance(transaction_id) == {'patron_id': "123456", 'paid_cents': 650, 'refunded_cents': 0}
+    report = get_patron_status_report("123456")
+    assert [(p['transaction_id'], p['kind'], p['book_id'], p['amount']) for p in report['payments']] == [
+        (transaction_id, 'payment', overdue_books[1], 6.50)
+    ]
+
+
+def test_refund_is_checked_against_recorded_payment_without_gateway(overdue_books):
+    gateway = gateway_mock()
+    _, _, transaction_id = pay_late_fees("123456", overdue_books[0], gateway)
+
+    assert refund_late_fee_payment(transaction_id, 2.00, gateway) == (False, "Refund amount exceeds the amount paid.")
+    assert refund_late_fee_payment(transaction_id, 1.00, gateway) == (True, "Refund processed")
+    assert refund_late_fee_payment(transaction_id, 0.75, gateway) == (False, "Refund amount exceeds the amount paid.")
+    assert refund_late_fee_payment(transaction_id, 0.50, gateway)[0] is True
+    assert gateway.refund_payment.call_count == 2
+
+    payments = get_patron_status_report("123456")['payments']
+    assert [(p['kind'], p['amount']) for p in payments] == [('refund', 0.50), ('refund', 1.00), ('payment', 1.50)]
+
+
+def test_failed_refund_is_not_recorded(overdue_books):
+    gateway = gateway_mock()
+    _, _, transaction_id = pay_late_fees("123456", overdue_books[0], gateway)
+    gateway.refund_payment.return_value = (False, "Invalid refund amount")
+
+    assert refund_late_fee_payment(transaction_id, 1.50, gateway) == (False, "Refund failed: Invalid refund amount")
+    assert get_payment_balance(transaction_id)['refunded_cents'] == 0
+
+
+def test_unrecorded_transaction_falls_back_to_per_book_maximum(overdue_books):
+    gateway = gateway_mock()
+    assert refund_late_fee_payment("txn_999999_1", 20.00, gateway) == (
+        False, "Refund amount exceeds maximum late fee.")
+    assert refund_late_fee_payment("txn_999999_1", 10.00, gateway)[0] is True
+    assert get_payment_balance("txn_999999_1") is None
+
+
+def test_combined_payment_refundable_up_to_its_total(overdue_books):
+    gateway = gateway_mock()
+    _, _, transaction_id = pay_all_late_fees("123456", gateway)
+
+    assert get_payment_balance(transaction_id)['paid_cents'] == 800
+    assert refund_late_fee_payment(transaction_id, 1.50, gateway, book_id=overdue_books[0])[0] is True
+    assert refund_late_fee_payment(transaction_id, 6.50, gateway, book_id=overdue_books[1])[0] is True
+    assert refund_late_fee_payment(transaction_id, 0.01, gateway, book_id=overdue_books[1]) == (
+        False, "Refund amount exceeds the late fee paid for this book.")
+    assert get_payment_balance(transaction_id)['refunded_cents'] == 800
+
+
+def test_combined_payment_is_refunded_per_book(overdue_books):
+    gateway = gateway_mock()
+    _, _, transaction_id = pay_all_late_fees("123456", gateway)
+
+    assert refund_late_fee_payment(transaction_id, 8.00, gateway) == (
+        False, "This payment covers several books; give the book to refund.")
+    gateway.refund_payment.assert_not_called()
+    assert get_payment_balance(transaction_id)['refunded_cents'] == 0
+
+
+def test_late_fee_is_charged_once_across_per_book_and_combined_payments(overdue_books):
+    first, second = overdue_books
+    gateway = gateway_mock()
+    gateway.process_payment.side_effect = [(True, "txn_123456_1", "ok"), (True, "txn_123456_2", "ok")]
+
+    assert pay_late_fees("123456", second, gateway)[0] is True
+    assert pay_all_late_fees("123456", gateway)[0] is True
+    assert gateway.process_payment.call_args.kwargs["amount"] == 1.50
+    assert pay_late_fees("123456", second, gateway) == (False, "No late fees to pay for this book.", None)
+    assert pay_late_fees("123456", first, gateway) == (False, "No late fees to pay for this book.", None)
+    assert pay_all_late_fees("123456", gateway) == (False, "No late fees to pay.", None)
+    assert gateway.process_payment.call_count == 2
+
+
+def test_refunded_per_book_payment_is_owed_again(overdue_books):
+    gateway = gateway_mock()
+    gateway.process_payment.side_effect = [(True, "txn_123456_1", "ok"), (True, "txn_123456_2", "ok")]
+    _, _, transaction_id = pay_late_fees("123456", overdue_books[1], gateway)
+    assert refund_late_fee_payment(transaction_id, 2.00, gateway)[0] is True
+
+    assert pay_late_fees("123456", overdue_books[1], gateway)[0] is True
+    assert gateway.process_payment.call_args.kwargs["amount"] == 2.00
+
+
+def test_outbox_worker_records_the_payment(overdue_books):
+    _, _, payment_id = enqueue_late_fee_payment("123456", overdue_books[0])
+    PaymentOutboxWorkers(gateway_factory=lambda: gateway_mock("txn_123456_9")).run_once()
+    assert get_payment_balance("txn_123456_9") == {'patron_id': "123456", 'paid_cents': 150, 'refunded_cents': 0}
+
+
+def test_unmigrated_database_records_nothing():
+    # The shared test database is reset to the base schema, without the payments table
+    assert insert_payment("txn_123456_1", 'payment', "123456", 150) is None
+    assert get_payment_balance("txn_123456_1") is None
+    assert database.get_pool_stats()["in_use"] == 0
+
+
+def test_failed_insert_releases_the_write_lock(overdue_books):
+    with pytest.raises(sqlite3.IntegrityError):
+        insert_payment("txn_123456_1", 'bogus', "123456", 150)
+    assert database.get_pool_stats()["in_use"] == 0
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+        database.insert_book("Other", "Author", "9780000000099", 1, 1)))
+    thread.start()
+    thread.join()
+    assert results == [True]
+
+
+@pytest.mark.parametrize("pay", [
+    lambda gateway, book_ids: pay_late_fees("123456", book_ids[0], gateway),
+    lambda gateway, book_ids: pay_all_late_fees("123456", gateway),
+])
+def test_charge_that_cannot_be_recorded_returns_its_transaction_id(overdue_books, monkeypatch, pay):
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr("services.library_service.insert_payment", locked)
+
+    success, message, transaction_id = pay(gateway_mock(), overdue_books)
+
+    assert success is False
+    assert transaction_id == "txn_123456_1"
+    assert "txn_123456_1 went through but could not be recorded: database is locked" in message
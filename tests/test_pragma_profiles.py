@@ -0,0 +1,65 @@
+import pytest
+
+import database
+from database import ConnectionPool
+
+
+def _pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_default_profile_uses_wal_and_normal_sync(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "wal.db"))
+    conn = pool.acquire()
+
+    assert _pragma(conn, "journal_mode") == "wal"
+    assert _pragma(conn, "synchronous") == 1  # NORMAL
+    assert _pragma(conn, "temp_store") == 2  # MEMORY
+    assert _pragma(conn, "busy_timeout") == 5000
+    assert _pragma(conn, "cache_size") == -16000
+    conn.close()
+
+
+def test_legacy_profile_keeps_rollback_journal(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "legacy.db"), pragma_profile="legacy")
+    conn = pool.acquire()
+
+    assert _pragma(conn, "journal_mode") == "delete"
+    assert _pragma(conn, "synchronous") == 2  # FULL
+    conn.close()
+
+
+def test_unknown_profile_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ConnectionPool(str(tmp_path / "x.db"), pragma_profile="turbo")
+
+
+def test_readers_see_last_commit_while_writer_holds_lock(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "wal.db"))
+    writer = pool.acquire()
+    writer.execute("CREATE TABLE t (x INTEGER)")
+    writer.execute("INSERT INTO t VALUES (1)")
+    writer.commit()
+
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("UPDATE t SET x = 2")
+
+    # A second connection in another pool reads the committed value without waiting
+    reader_pool = ConnectionPool(str(tmp_path / "wal.db"))
+    reader = reader_pool.acquire()
+    assert reader.execute("SELECT x FROM t").fetchone()[0] == 1
+
+    writer.commit()
+    assert reader.execute("SELECT x FROM t").fetchone()[0] == 2
+    reader.close()
+    writer.close()
+
+
+def test_create_app_selects_profile_from_config(tmp_path):
+    from app import create_app
+
+    try:
+        create_app(testing=True, config={"DATABASE": str(tmp_path / "app.db"), "DB_PRAGMA_PROFILE": "durable"})
+        assert database.get_pool_stats()["pragma_profile"] == "durable"
+    finally:
+        database.configure_pool("library.db")
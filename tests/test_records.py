@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+from app import create_app
+from database import Book, Loan
+from services.library_service import get_patron_status_report, search_books_in_catalog
+
+
+@pytest.fixture
+def client(isolated_db):
+    app = create_app(testing=True, config={'DATABASE': isolated_db})
+    yield app.test_client()
+    database.configure_pool('library.db')
+
+
+def add_loan(patron_id, book_id, borrowed_days_ago, returned_days_ago=None):
+    borrowed = datetime.now() - timedelta(days=borrowed_days_ago)
+    database.insert_borrow_record(patron_id, book_id, borrowed, borrowed + timedelta(days=14))
+    if returned_days_ago is not None:
+        database.update_borrow_record_return_date(patron_id, book_id,
+                                                  datetime.now() - timedelta(days=returned_days_ago))
+
+
+def test_book_reads_like_the_old_row_dict(isolated_db):
+    database.insert_book('Dune', 'Frank Herbert', '9780441013593', 3, 2)
+    book = database.get_book_by_isbn('9780441013593')
+
+    assert isinstance(book, Book)
+    assert book.title == book['title'] == book.get('title') == 'Dune'
+    assert book == {'id': book.id, 'title': 'Dune', 'author': 'Frank Herbert', 'isbn': '9780441013593',
+                    'total_copies': 3, 'available_copies': 2}
+    assert list(book) == list(database.BOOK_COLUMNS)
+    assert 'isbn' in book and 'missing' not in book
+    assert book.get('missing', 'default') == 'default'
+    with pytest.raises(KeyError):
+        book['missing']
+    with pytest.raises(TypeError):
+        book['title'] = 'Changed'
+    with pytest.raises(AttributeError):
+        book.title = 'Changed'
+    assert not hasattr(book, '__dict__')
+
+
+def test_read_helpers_return_books(isolated_db):
+    database.insert_book('Dune', 'Frank Herbert', '9780441013593', 3, 2)
+
+    assert all(isinstance(book, Book) for book in database.get_all_books())
+    books, _, _ = database.get_books_page(10)
+    assert [book.title for book in books] == ['Dune']
+    assert search_books_in_catalog('Du', 'title') == books
+
+
+def test_loan_dates_are_parsed_on_access(isolated_db):
+    database.insert_book('Dune', 'Frank Herbert', '9780441013593', 3, 2)
+    add_loan('111111', 1, borrowed_days_ago=30, returned_days_ago=10)
+    add_loan('111111', 1, borrowed_days_ago=20)
+
+    current, history, has_more = database.get_patron_loans('111111')
+    loan, returned = current[0], history[0]
+    assert isinstance(loan, Loan) and not has_more
+    assert loan._due_date == loan['due_date'].isoformat()
+    assert loan.due_date - loan.borrow_date == timedelta(days=14)
+    assert loan.return_date is None and loan.is_overdue
+    # Returned 4 days after it was due
+    assert isinstance(returned.return_date, datetime) and returned['is_overdue']
+    assert dict(loan)['title'] == 'Dune'
+    with pytest.raises(AttributeError):
+        loan._return_date = loan._due_date
+    assert loan.return_date is None
+
+
+def test_status_report_entries_are_dicts_with_fees(client):
+    report = get_patron_status_report('123456')
+
+    entry = report['current_borrows'][0]
+    assert isinstance(entry, dict)
+    assert entry['book_id'] == 3 and entry['fee_amount'] == 0.0
+    assert database.get_patron_borrowed_books('123456')[0].get('fee_amount') is None
+
+
+def test_json_routes_serialize_books_as_objects(client):
+    books = client.get('/api/books?limit=1').get_json()['books']
+    assert books == [dict(database.get_books_page(1)[0][0])]
+
+    results = client.get('/api/search?q=Gatsby&type=title').get_json()['results']
+    assert results[0]['title'] == 'The Great Gatsby'
+    assert set(results[0]) == set(database.BOOK_COLUMNS)
@@ -0,0 +1,93 @@
+import http.client
+import os
+import runpy
+import signal
+import sqlite3
+import time
+import urllib.parse
+
+import pytest
+
+import database
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_gunicorn_settings_come_from_environment(monkeypatch):
+    monkeypatch.setenv("PORT", "8123")
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    monkeypatch.setenv("GUNICORN_THREADS", "8")
+    settings = runpy.run_path(os.path.join(REPO_ROOT, "gunicorn.conf.py"))
+
+    assert settings["bind"] == "0.0.0.0:8123"
+    assert settings["workers"] == 3
+    assert settings["threads"] == 8
+    assert settings["worker_class"] == "gthread"
+    assert settings["preload_app"] is False
+
+
+def test_master_prepares_the_database_with_the_configured_profile(monkeypatch, tmp_path):
+    path = str(tmp_path / "legacy.db")
+    monkeypatch.setenv("LIBRARY_DATABASE", path)
+    monkeypatch.setenv("LIBRARY_DB_PRAGMA_PROFILE", "legacy")
+    settings = runpy.run_path(os.path.join(REPO_ROOT, "gunicorn.conf.py"))
+    try:
+        settings["on_starting"](None)
+        assert database.get_pool_stats()["pragma_profile"] == "legacy"
+        conn = sqlite3.connect(path)
+        # The default profile would have switched the file to WAL for good
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        conn.close()
+    finally:
+        database.configure_pool("library.db")
+
+
+def test_create_app_reads_database_from_environment(monkeypatch, tmp_path):
+    from app import create_app
+
+    path = str(tmp_path / "env.db")
+    monkeypatch.setenv("LIBRARY_DATABASE", path)
+    try:
+        app = create_app(testing=True)
+        assert app.config["DATABASE"] == path
+        assert database.get_pool_stats()["database"] == path
+    finally:
+        database.configure_pool("library.db")
+
+
+def request(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"} if body else {}
+    conn.request(method, path, body, headers)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.status
+
+
+def test_gunicorn_serves_with_several_workers_and_reloads(tmp_path):
+    pytest.importorskip("gunicorn")
+    from benchmarks.bench_wsgi_workers import free_port, start_server, stop_server
+
+    path = str(tmp_path / "served.db")
+    port = free_port()
+    server = start_server(port, workers=2, threads=2, db_path=path)
+    try:
+        assert request(port, "GET", "/catalog") == 200
+        assert request(port, "GET", "/api/search?q=gatsby&type=title") == 200
+        body = urllib.parse.urlencode({"patron_id": "123456", "book_id": 1})
+        assert request(port, "POST", "/borrow", body) == 302
+
+        # Graceful reload: new workers take over and keep serving
+        server.send_signal(signal.SIGHUP)
+        time.sleep(1)
+        assert request(port, "GET", "/catalog") == 200
+    finally:
+        stop_server(server)
+
+    conn = sqlite3.connect(path)
+    borrowed = conn.execute(
+        "SELECT COUNT(*) FROM borrow_records WHERE patron_id = '123456' AND book_id = 1"
+    ).fetchone()[0]
+    conn.close()
+    assert borrowed == 1
@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Settings come from the environment: LIBRARY_DATABASE (SQLite file) and
+LIBRARY_DB_PRAGMA_PROFILE (see database.PRAGMA_PROFILES). Worker and thread
+counts are set in gunicorn.conf.py.
+"""
+
+from app import create_app
+
+app = create_app()